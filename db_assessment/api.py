@@ -14,14 +14,27 @@
 
 import logging
 import os
+import shutil
 from dataclasses import dataclass
-from tempfile import TemporaryDirectory
 from typing import Optional
 
-from flask import Flask, request
+from flask import Flask, jsonify, request
 from werkzeug.utils import secure_filename
 
-from db_assessment.optimusprime import runMain
+from db_assessment.assessment_run import AssessmentRun
+from db_assessment.blob_store import (
+    BlobStore,
+    MissingBlobsError,
+    getBlobScope,
+    isBlobHash,
+)
+from db_assessment.job_queue import JobQueue
+from db_assessment.upload_sessions import (
+    UPLOAD_PART_SIZE,
+    UploadError,
+    UploadLimitError,
+    UploadSessions,
+)
 
 app = Flask(__name__)
 logger = logging.getLogger(__name__)
@@ -42,11 +55,46 @@ class UserConfig:
     fromdataframe: bool = False
     consolidatelogs: bool = False
     consolidatedataframes: bool = False
+    compactframes: bool = False
     importcomment: str = ""
     filterbysqlversion: str = ""
     filterbydbversion: str = ""
     loadtype: str = "WRITE_APPEND"
+    loadformat: str = "CSV"
+    schematypes: str = "STRING"
     skipvalidations: bool = False
+    incremental: bool = False
+    resume: Optional[str] = None
+    parallelloads: int = 1
+    mergeloads: bool = False
+    parseworkers: int = 1
+    lazyload: bool = False
+    evictframes: bool = False
+    partitionworkers: int = 1
+    ruleworkers: int = 1
+    viewworkers: int = 8
+    parsecache: bool = False
+    parsecachedir: Optional[str] = None
+    parsecachemaxmb: int = 2048
+    purgeparsecache: bool = False
+    resumable: bool = False
+
+
+def getUploadConfig(jobDir, request_data):
+    return UserConfig(
+        fileslocation=jobDir,
+        dataset=request_data.get("dataset", None),
+        collectionid=request_data.get("collectionId", None),
+        projectname=request_data.get("projectId", None),
+    )
+
+
+# Imports run in the background, so an upload does not wait for the Big Query jobs of other uploads
+jobQueue = JobQueue(AssessmentRun)
+# Resumable uploads from -remote. Each upload becomes a job once it is complete
+uploadSessions = UploadSessions()
+# Files already received by this API, by content. -remote only uploads the files missing from it
+blobStore = BlobStore()
 
 
 @app.route("/api/loadAssessment", methods=["POST"])
@@ -54,19 +102,176 @@ def loadAssessment():
     app.logger.info(f"{len(request.files)} files uploaded")
     if len(request.files) <= 0:
         return "No files uploaded", 400
-    with TemporaryDirectory() as tmpDir:
-        for file in request.files.values():
-            app.logger.info(f"saved {file.filename}")
-            filePath = os.path.join(tmpDir, secure_filename(file.filename))
-            app.logger.info(f"saved {file.filename} as {filePath}")
-            file.save(filePath)
-
-        request_data = request.form
-        config = UserConfig(
-            fileslocation=tmpDir,
-            dataset=request_data.get("dataset", None),
-            collectionid=request_data.get("collectionId", None),
-            projectname=request_data.get("projectId", None),
+    jobDir = jobQueue.newJobDir()
+    for file in request.files.values():
+        filePath = os.path.join(jobDir, secure_filename(file.filename))
+        file.save(filePath)
+        app.logger.info(f"saved {file.filename} as {filePath}")
+
+    config = getUploadConfig(jobDir, request.form)
+    job = jobQueue.submit(jobDir, config)
+    app.logger.info(f"job {job.jobId} queued")
+    return (
+        jsonify({"jobId": job.jobId, "status": job.status}),
+        202,
+        {"Location": f"/api/jobs/{job.jobId}"},
+    )
+
+
+@app.route("/api/uploads", methods=["POST"])
+def newUpload():
+    request_data = request.get_json(silent=True) or {}
+    try:
+        size = int(request_data.get("size", 0))
+    except (TypeError, ValueError):
+        size = 0
+    if size <= 0:
+        return "The upload size is required", 400
+    manifest = request_data.get("manifest")
+    if manifest is not None and (
+        not isinstance(manifest, list)
+        or not all(
+            isinstance(entry, dict)
+            and "name" in entry
+            and isBlobHash(entry.get("sha256"))
+            for entry in manifest
         )
-        runMain(config)
-    return "", 201
+    ):
+        return "The manifest must be a list of files with their name and sha256", 400
+    jobDir = jobQueue.newJobDir()
+    try:
+        uploadSession = uploadSessions.newSession(jobDir, size, request_data)
+    except UploadLimitError as limitErr:
+        shutil.rmtree(jobDir, ignore_errors=True)
+        return str(limitErr), 413 if size > uploadSessions.maxUploadBytes else 429
+    app.logger.info(f"upload {uploadSession.uploadId} of {size} bytes started")
+    return (
+        jsonify(
+            {"uploadId": uploadSession.uploadId, "partSize": UPLOAD_PART_SIZE}
+        ),
+        201,
+    )
+
+
+@app.route("/api/blobs/missing", methods=["POST"])
+def getMissingBlobs():
+    request_data = request.get_json(silent=True) or {}
+    hashes = request_data.get("hashes")
+    if not isinstance(hashes, list) or not all(isBlobHash(h) for h in hashes):
+        return "The sha256 hashes of the files are required", 400
+    # Only the files uploaded for the same project and dataset are used
+    scope = getBlobScope(request_data.get("projectId"), request_data.get("dataset"))
+    return jsonify({"missing": blobStore.getMissing(scope, hashes)}), 200
+
+
+@app.route("/api/uploads/<uploadId>", methods=["GET"])
+def getUpload(uploadId):
+    uploadSession = uploadSessions.getSession(uploadId)
+    if uploadSession is None:
+        return "Upload not found", 404
+    return jsonify(uploadSession.getStatus()), 200
+
+
+@app.route("/api/uploads/<uploadId>/parts/<int:offset>", methods=["PUT"])
+def putUploadPart(uploadId, offset):
+    uploadSession = uploadSessions.getSession(uploadId)
+    if uploadSession is None:
+        return "Upload not found", 404
+    try:
+        uploadSession.addPart(offset, request.get_data())
+    except UploadError as uploadErr:
+        return str(uploadErr), 400
+    return "", 204
+
+
+@app.route("/api/uploads/<uploadId>/complete", methods=["POST"])
+def completeUpload(uploadId):
+    # Only one request completes an upload, so it is queued once. A repeated request (I.E: a retry after a lost response)
+    # gets the same job or error
+    uploadSession, outcome = uploadSessions.startCompletion(uploadId)
+    if outcome is not None:
+        return getCompletionResponse(outcome)
+    if uploadSession is None:
+        return "Upload not found", 404
+    try:
+        outcome = finishUpload(uploadSession)
+    except UploadError as uploadErr:
+        # Missing parts can still be sent and the upload completed again
+        uploadSessions.cancelCompletion(uploadSession)
+        return str(uploadErr), 409
+    except Exception:
+        uploadSessions.cancelCompletion(uploadSession)
+        raise
+    uploadSessions.finishCompletion(uploadSession, outcome)
+    return getCompletionResponse(outcome)
+
+
+def finishUpload(uploadSession):
+    # Queues the job of a received upload. Returns the outcome of the upload ({"jobId"} or {"error"}).
+    # Raises UploadError if it can still be completed later
+    try:
+        uploadSession.complete()
+    except UploadError as uploadErr:
+        if not uploadSession.extracted or uploadSession.error is None:
+            raise
+        # A broken archive cannot be fixed, so that upload is discarded
+        uploadSession.abort()
+        return {"error": str(uploadErr)}
+    if "manifest" in uploadSession.form:
+        try:
+            blobStore.prepareJobFiles(
+                getBlobScope(
+                    uploadSession.form.get("projectId"),
+                    uploadSession.form.get("dataset"),
+                ),
+                uploadSession.form["manifest"],
+                uploadSession.jobDir,
+                uploadSession.extractedFiles,
+            )
+        except MissingBlobsError as blobsErr:
+            # Evicted since -remote asked for the missing files. The client uploads them again
+            uploadSession.abort()
+            return {"error": str(blobsErr), "missing": blobsErr.hashes}
+    app.logger.info(
+        f"upload {uploadSession.uploadId} extracted {len(uploadSession.extractedFiles)} files"
+    )
+    config = getUploadConfig(uploadSession.jobDir, uploadSession.form)
+    job = jobQueue.submit(uploadSession.jobDir, config)
+    app.logger.info(f"job {job.jobId} queued")
+    return {"jobId": job.jobId}
+
+
+def getCompletionResponse(outcome):
+    # The response of a complete request. The job status is the current one
+    if "jobId" not in outcome:
+        if "missing" in outcome:
+            return jsonify(outcome), 409
+        return outcome["error"], 409
+    job = jobQueue.getJob(outcome["jobId"])
+    return (
+        jsonify(
+            {
+                "jobId": outcome["jobId"],
+                "status": job.status if job is not None else None,
+            }
+        ),
+        202,
+        {"Location": f"/api/jobs/{outcome['jobId']}"},
+    )
+
+
+@app.route("/api/uploads/<uploadId>", methods=["DELETE"])
+def abortUpload(uploadId):
+    uploadSession = uploadSessions.removeSession(uploadId)
+    if uploadSession is None:
+        return "Upload not found", 404
+    uploadSession.abort()
+    return "", 204
+
+
+@app.route("/api/jobs/<jobId>", methods=["GET"])
+def getJob(jobId):
+    job = jobQueue.getJob(jobId)
+    if job is None:
+        return "Job not found", 404
+    return jsonify(job.asDict()), 200
@@ -0,0 +1,90 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# One import of an Optimus Prime assessment, usable as a library.
+# An AssessmentRun has its own configuration, load date, scratch directory (the run directory where the opdbt__ files are
+# written: a temporary directory deleted at the end of the run, or <fileslocation>/.opruns/<runid> with -resumable) and import results. Fatal errors are raised as AssessmentError instead of exiting,
+# so several runs can share a process (I.E: the API job queue). The Big Query clients are the thread safe pooled clients per project.
+
+import copy
+import datetime
+
+from db_assessment import collection_archive, optimusprime
+
+
+class AssessmentError(Exception):
+    # Fatal error of an assessment run. The message is the one printed by the command line
+    pass
+
+
+class NoCollectionFilesError(AssessmentError):
+    pass
+
+
+class UnsupportedCollectionError(AssessmentError):
+    # Mixed database or SQL script versions, or versions without table schemas in transformers.json
+    pass
+
+
+class RunNotFoundError(AssessmentError):
+    # The run id given to -resume does not exist
+    pass
+
+
+class InvalidOptionsError(AssessmentError):
+    pass
+
+
+class AssessmentRun:
+    def __init__(self, config):
+
+        self.config = config
+        # Options used by the pipeline. The run changes some of them (I.E: the scratch location), so the caller's
+        # config can be reused or shared by other runs
+        self.args = copy.copy(config)
+        # Load date of all rows imported by this run (LOADTOBQDATE, operrors LOADDATE)
+        self.loadDate = datetime.datetime.now()
+        self.scratchDir = None
+        self.runJournal = None
+        # {table: {COLUMN: type}} found by -schematypes INFER in the parsed files
+        self.inferredSchemaTypes = {}
+        self.results = []
+        # When True the run stops after the rules of the execution group 1 without using Big Query and keeps the
+        # dataframes in rulesDataFrames (I.E: tests/test_compact_frames.py)
+        self.rulesOnly = False
+        self.rulesDataFrames = None
+
+    def setRunJournal(self, runJournal):
+        # The files generated by Optimus Prime are written to the run directory, not to the shared files location
+
+        self.runJournal = runJournal
+        self.scratchDir = runJournal.runDir
+        self.args.scratchlocation = runJournal.runDir
+
+    def run(self):
+        # Returns the ImportResult list of the run. Raises AssessmentError on fatal errors
+
+        succeeded = False
+
+        try:
+            self.results = optimusprime.runAssessment(self) or []
+            succeeded = True
+        finally:
+            # Decompressed streams kept to read the collected files in tar.gz archives
+            collection_archive.closeArchives()
+            # Files of the run that cannot be used by -resume
+            if self.runJournal is not None:
+                self.runJournal.finishRun(succeeded)
+
+        return self.results
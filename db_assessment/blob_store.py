@@ -0,0 +1,218 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Content addressed store of the collected files received by the API.
+# -remote sends the SHA-256 of its files first and only uploads the files the store does not have. The job directory is
+# then filled with the uploaded files and copies of the stored ones. The least recently used files are deleted above
+# OP_API_BLOB_MAX_MB. Files are copied in and out (never linked) because the import rewrites the collected files.
+# The files are stored by scope (the project and dataset of the upload), so an upload can only use the files uploaded for
+# the same project and dataset.
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_BLOB_DIR = os.path.join(tempfile.gettempdir(), "opblobs")
+DEFAULT_BLOB_MAX_MB = 2048
+BLOB_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class MissingBlobsError(Exception):
+    # Files of a manifest that are not in the store (never uploaded or evicted since they were asked for)
+
+    def __init__(self, hashes):
+
+        super().__init__(
+            "{} files of the manifest are not stored anymore".format(len(hashes))
+        )
+        self.hashes = hashes
+
+
+def getFileHash(fileName):
+
+    fileHash = hashlib.sha256()
+
+    with open(fileName, "rb") as hashedFile:
+        for block in iter(lambda: hashedFile.read(HASH_BLOCK_SIZE), b""):
+            fileHash.update(block)
+
+    return fileHash.hexdigest()
+
+
+def isBlobHash(blobHash):
+
+    return isinstance(blobHash, str) and BLOB_HASH_PATTERN.match(blobHash) is not None
+
+
+def getBlobScope(projectId, dataset):
+    # Name of the directory of the files uploaded for a project and dataset
+
+    return hashlib.sha256(
+        json.dumps([str(projectId), str(dataset)]).encode("utf-8")
+    ).hexdigest()
+
+
+class BlobStore:
+    def __init__(self, blobDir=None, maxBytes=None):
+
+        self.blobDir = blobDir or os.getenv("OP_API_BLOB_DIR", DEFAULT_BLOB_DIR)
+        self.maxBytes = maxBytes or (
+            int(os.getenv("OP_API_BLOB_MAX_MB", DEFAULT_BLOB_MAX_MB)) * 1024 * 1024
+        )
+        self.lock = threading.Lock()
+        # {(scope, hash): size} from the least to the most recently used
+        self.blobs = OrderedDict()
+        # {(scope, hash): number of copies in progress}. Pinned blobs are not evicted
+        self.pins = {}
+        self.totalBytes = 0
+
+        os.makedirs(self.blobDir, exist_ok=True)
+
+        # Blobs kept from a previous API process, in their last use order
+        storedBlobs = []
+        for scopeEntry in os.scandir(self.blobDir):
+            if not scopeEntry.is_dir() or not isBlobHash(scopeEntry.name):
+                continue
+            for entry in os.scandir(scopeEntry.path):
+                if entry.is_file() and isBlobHash(entry.name):
+                    storedBlobs.append(
+                        (
+                            entry.stat().st_mtime,
+                            (scopeEntry.name, entry.name),
+                            entry.stat().st_size,
+                        )
+                    )
+
+        for mtime, blobKey, size in sorted(storedBlobs):
+            self.blobs[blobKey] = size
+            self.totalBytes += size
+
+    def getBlobFileName(self, blobKey):
+
+        return os.path.join(self.blobDir, *blobKey)
+
+    def getMissing(self, scope, hashes):
+        # Hashes not in the store for the scope. The stored ones are marked as used, so they are not the next to be evicted
+
+        missing = []
+
+        with self.lock:
+            for blobHash in hashes:
+                if (scope, blobHash) in self.blobs:
+                    self.blobs.move_to_end((scope, blobHash))
+                elif blobHash not in missing:
+                    missing.append(blobHash)
+
+        return missing
+
+    def addFile(self, scope, fileName):
+        # Stores a copy of a received file. Returns its hash
+
+        blobKey = (scope, getFileHash(fileName))
+
+        with self.lock:
+            if blobKey in self.blobs:
+                self.blobs.move_to_end(blobKey)
+                return blobKey[1]
+
+        os.makedirs(os.path.join(self.blobDir, scope), exist_ok=True)
+
+        # Copied under a temporary name, so a blob is never read while it is written
+        tmpBlobFileName = self.getBlobFileName(blobKey) + ".tmp." + str(
+            threading.get_ident()
+        )
+        shutil.copyfile(fileName, tmpBlobFileName)
+        os.replace(tmpBlobFileName, self.getBlobFileName(blobKey))
+
+        with self.lock:
+            if blobKey not in self.blobs:
+                self.blobs[blobKey] = os.path.getsize(self.getBlobFileName(blobKey))
+                self.totalBytes += self.blobs[blobKey]
+            self.blobs.move_to_end(blobKey)
+            self.evictBlobs()
+
+        return blobKey[1]
+
+    def copyBlob(self, scope, blobHash, fileName):
+        # Copies a stored file to fileName. Returns False if the blob is not in the store
+
+        blobKey = (scope, blobHash)
+
+        with self.lock:
+            if blobKey not in self.blobs:
+                return False
+            self.blobs.move_to_end(blobKey)
+            # Pinned, so the blob is not evicted while it is copied. Other uploads can use the store meanwhile
+            self.pins[blobKey] = self.pins.get(blobKey, 0) + 1
+
+        try:
+            shutil.copyfile(self.getBlobFileName(blobKey), fileName)
+            os.utime(self.getBlobFileName(blobKey))
+        finally:
+            with self.lock:
+                self.pins[blobKey] -= 1
+                if self.pins[blobKey] == 0:
+                    del self.pins[blobKey]
+                self.evictBlobs()
+
+        return True
+
+    def evictBlobs(self):
+        # Deletes the least recently used blobs above maxBytes. Pinned blobs and the last blob stored are always kept
+
+        for blobKey in list(self.blobs)[:-1]:
+
+            if self.totalBytes <= self.maxBytes:
+                break
+
+            if blobKey in self.pins:
+                continue
+
+            self.totalBytes -= self.blobs.pop(blobKey)
+
+            try:
+                os.remove(self.getBlobFileName(blobKey))
+            except OSError:
+                None
+
+    def prepareJobFiles(self, scope, manifest, jobDir, uploadedFiles):
+        # Stores the uploaded files and copies the other files of the manifest to the job directory.
+        # Raises MissingBlobsError with the hashes that are not in the store
+        from werkzeug.utils import secure_filename
+
+        for fileName in uploadedFiles:
+            self.addFile(scope, os.path.join(jobDir, fileName))
+
+        missing = []
+
+        for manifestEntry in manifest:
+
+            fileName = secure_filename(os.path.basename(str(manifestEntry["name"])))
+
+            if fileName == "" or fileName in uploadedFiles:
+                continue
+
+            if not self.copyBlob(
+                scope, str(manifestEntry["sha256"]), os.path.join(jobDir, fileName)
+            ):
+                missing.append(str(manifestEntry["sha256"]))
+
+        if len(missing) > 0:
+            raise MissingBlobsError(missing)
@@ -0,0 +1,451 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Collected files read straight from the compressed collections (.tar.gz, .tgz, .zip and .gz), without extracting them.
+# An archive is used like a directory: the member opdb__dbsummary__<...>.log of /data/coll.tar.gz is the file
+# /data/coll.tar.gz/opdb__dbsummary__<...>.log and a single file opdb__<...>.log.gz holds opdb__<...>.log.
+# The members of a tar.gz are read straight from their own decompressed stream of the archive, so threads do not share a
+# stream and no member is copied to memory or disk. The decompressed streams are kept idle at the end of the last member
+# read, so the members read in archive order decompress the archive only once. The files written by Optimus Prime go to
+# the scratch location.
+
+import fnmatch
+import glob
+import gzip
+import io
+import os
+import posixpath
+import struct
+import tarfile
+import threading
+import zipfile
+from functools import lru_cache
+from typing import NamedTuple
+
+TAR_ARCHIVE_SUFFIXES = (".tar.gz", ".tgz")
+ZIP_ARCHIVE_SUFFIXES = (".zip",)
+GZIP_ARCHIVE_SUFFIXES = (".gz",)
+
+# Errors of unreadable or broken archives
+ARCHIVE_ERRORS = (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile)
+
+# Archives whose members are kept listed
+MAX_LISTED_ARCHIVES = 64
+# Idle decompressed streams of tar.gz archives kept to read the next members
+MAX_IDLE_ARCHIVE_STREAMS = 8
+
+# Tar members already listed, by archive
+_tarMembersLock = threading.Lock()
+_tarMembers = {}
+# {member name: size} of the archives already listed
+_archiveFileSizesLock = threading.Lock()
+_archiveFileSizes = {}
+# [(archive, decompressed stream)] not used by any reader
+_archiveStreamsLock = threading.Lock()
+_archiveStreams = []
+
+
+class CollectionFileStat(NamedTuple):
+    st_size: int
+    st_mtime_ns: int
+
+
+def isCollectionArchive(fileName):
+
+    return str(fileName).lower().endswith(
+        TAR_ARCHIVE_SUFFIXES + ZIP_ARCHIVE_SUFFIXES + GZIP_ARCHIVE_SUFFIXES
+    )
+
+
+@lru_cache(maxsize=4096)
+def getArchiveMember(fileName):
+    # Returns (archive, member) for a file inside an archive or None for a regular file
+
+    fileName = str(fileName)
+    archiveName = fileName
+
+    while True:
+
+        parentName = os.path.dirname(archiveName)
+
+        if parentName == archiveName or parentName == "":
+            return None
+
+        archiveName = parentName
+
+        if isCollectionArchive(archiveName) and os.path.isfile(archiveName):
+            return archiveName, os.path.relpath(fileName, archiveName).replace(
+                os.sep, "/"
+            )
+
+
+def getWritableLocation(filesLocation):
+    # Directory for the files written next to the collected files (I.E: the run journals). The directory of an archive
+
+    if isCollectionArchive(filesLocation) and os.path.isfile(str(filesLocation)):
+        return os.path.dirname(os.path.abspath(str(filesLocation)))
+
+    return filesLocation
+
+
+def getTarMembers(archiveName):
+    # {member name: TarInfo} of the regular files of a tar.gz. The archive is listed once
+
+    archiveStat = os.stat(archiveName)
+    archiveKey = (os.path.abspath(archiveName), archiveStat.st_mtime_ns)
+
+    with _tarMembersLock:
+        if archiveKey in _tarMembers:
+            return _tarMembers[archiveKey]
+
+    with tarfile.open(archiveName, "r:gz") as archive:
+        members = {
+            posixpath.normpath(member.name): member
+            for member in archive.getmembers()
+            if member.isfile()
+        }
+
+    with _tarMembersLock:
+        _tarMembers[archiveKey] = members
+        # The oldest listed archive is forgotten. I.E: the API lists a new archive for each upload
+        if len(_tarMembers) > MAX_LISTED_ARCHIVES:
+            del _tarMembers[next(iter(_tarMembers))]
+
+    return members
+
+
+def getGzipSize(archiveName):
+    # Uncompressed size of a .gz file from its trailer (modulo 4GB, like gzip -l)
+
+    with open(archiveName, "rb") as archiveFile:
+        archiveFile.seek(-4, os.SEEK_END)
+        return struct.unpack("<I", archiveFile.read(4))[0]
+
+
+def listArchiveFiles(archiveName):
+    # Returns [(file name, size)] for the regular files of an archive
+
+    archiveName = str(archiveName)
+    lowerName = archiveName.lower()
+
+    if lowerName.endswith(TAR_ARCHIVE_SUFFIXES):
+        return [
+            (os.path.join(archiveName, memberName), member.size)
+            for memberName, member in getTarMembers(archiveName).items()
+        ]
+
+    if lowerName.endswith(ZIP_ARCHIVE_SUFFIXES):
+        with zipfile.ZipFile(archiveName) as archive:
+            return [
+                (os.path.join(archiveName, member.filename), member.file_size)
+                for member in archive.infolist()
+                if not member.is_dir()
+            ]
+
+    return [
+        (
+            os.path.join(archiveName, os.path.basename(archiveName)[: -len(".gz")]),
+            getGzipSize(archiveName),
+        )
+    ]
+
+
+def getArchiveFileSizes(archiveName):
+    # {member name: size} of the regular files of an archive. The archive is listed once, not once for each of its files
+
+    archiveStat = os.stat(archiveName)
+    archiveKey = (os.path.abspath(archiveName), archiveStat.st_mtime_ns)
+
+    with _archiveFileSizesLock:
+        if archiveKey in _archiveFileSizes:
+            return _archiveFileSizes[archiveKey]
+
+    fileSizes = {
+        os.path.relpath(fileName, archiveName).replace(os.sep, "/"): size
+        for fileName, size in listArchiveFiles(archiveName)
+    }
+
+    with _archiveFileSizesLock:
+        _archiveFileSizes[archiveKey] = fileSizes
+        if len(_archiveFileSizes) > MAX_LISTED_ARCHIVES:
+            del _archiveFileSizes[next(iter(_archiveFileSizes))]
+
+    return fileSizes
+
+
+def getArchiveFilesByPattern(filePattern):
+    # Files inside the archives found in the directory of the pattern (or in the archive given as directory)
+
+    patternDir = os.path.dirname(str(filePattern))
+    patternName = os.path.basename(str(filePattern))
+
+    if isCollectionArchive(patternDir) and os.path.isfile(patternDir):
+        archiveNames = [patternDir]
+    else:
+        archiveNames = [
+            archiveName
+            for archiveName in glob.glob(os.path.join(patternDir, "*"))
+            if isCollectionArchive(archiveName) and os.path.isfile(archiveName)
+        ]
+
+    fileList = []
+
+    for archiveName in sorted(archiveNames):
+        try:
+            archiveFiles = listArchiveFiles(archiveName)
+        except ARCHIVE_ERRORS as archiveErr:
+            print(
+                "\nWARNING: The archive {} could not be read and it will be skipped. Error: {}\n".format(
+                    archiveName, archiveErr
+                )
+            )
+            continue
+
+        fileList.extend(
+            fileName
+            for fileName, size in archiveFiles
+            if fnmatch.fnmatch(os.path.basename(fileName), patternName)
+        )
+
+    return fileList
+
+
+def getCollectionFileStat(fileName):
+    # Size and modification time of a collected file. Archive members have the modification time of their archive
+
+    archiveMember = getArchiveMember(fileName)
+
+    if archiveMember is None:
+        fileStat = os.stat(fileName)
+        return CollectionFileStat(fileStat.st_size, fileStat.st_mtime_ns)
+
+    archiveName, memberName = archiveMember
+    fileSizes = getArchiveFileSizes(archiveName)
+
+    if memberName not in fileSizes:
+        raise FileNotFoundError(
+            "{} was not found in {}".format(memberName, archiveName)
+        )
+
+    return CollectionFileStat(fileSizes[memberName], os.stat(archiveName).st_mtime_ns)
+
+
+class ArchiveMemberFile(io.RawIOBase):
+    # Binary stream of an archive member. The Big Query client only uploads streams opened in rb mode
+
+    mode = "rb"
+
+    def __init__(self, fileName, memberFile):
+
+        self.name = fileName
+        self._memberFile = memberFile
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        # The tar.gz, zip and gz members can all seek (backward seeks decompress the member again)
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._memberFile.seek(offset, whence)
+
+    def tell(self):
+        return self._memberFile.tell()
+
+    def readinto(self, buffer):
+        data = self._memberFile.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._memberFile.close()
+        super().close()
+
+
+def takeArchiveStream(archiveName, offset):
+    # Decompressed stream of a tar.gz for the data at offset. The idle stream closest before the offset is reused,
+    # so it only decompresses the data in between. Otherwise a new stream reads the archive from the beginning
+
+    archiveName = os.path.abspath(archiveName)
+
+    with _archiveStreamsLock:
+        streamIndex = None
+        for index, (streamArchiveName, stream) in enumerate(_archiveStreams):
+            if (
+                streamArchiveName == archiveName
+                and stream.tell() <= offset
+                and (
+                    streamIndex is None
+                    or stream.tell() > _archiveStreams[streamIndex][1].tell()
+                )
+            ):
+                streamIndex = index
+
+        if streamIndex is not None:
+            return _archiveStreams.pop(streamIndex)[1]
+
+    return gzip.open(archiveName, "rb")
+
+
+def releaseArchiveStream(archiveName, stream):
+    # Keeps the stream for the next member. The oldest idle stream is closed
+
+    with _archiveStreamsLock:
+        _archiveStreams.append((os.path.abspath(archiveName), stream))
+        closedStreams = _archiveStreams[:-MAX_IDLE_ARCHIVE_STREAMS]
+        del _archiveStreams[:-MAX_IDLE_ARCHIVE_STREAMS]
+
+    for streamArchiveName, closedStream in closedStreams:
+        closedStream.close()
+
+
+def closeArchives():
+    # Closes the idle decompressed streams
+
+    with _archiveStreamsLock:
+        closedStreams = list(_archiveStreams)
+        del _archiveStreams[:]
+
+    for streamArchiveName, closedStream in closedStreams:
+        closedStream.close()
+
+
+class TarMemberStream:
+    # Data of a tar.gz member read from a decompressed stream of the archive. The stream is taken at the first read.
+    # Seeking forward decompresses up to the new position and seeking backward takes another stream
+
+    def __init__(self, archiveName, member):
+
+        self._archiveName = archiveName
+        self._member = member
+        self._position = 0
+        self._stream = None
+
+    def read(self, size=-1):
+        remainingBytes = self._member.size - self._position
+
+        if size is None or size < 0 or size > remainingBytes:
+            size = remainingBytes
+
+        if size <= 0:
+            return b""
+
+        try:
+            dataOffset = self._member.offset_data + self._position
+
+            if self._stream is None:
+                self._stream = takeArchiveStream(self._archiveName, dataOffset)
+
+            if self._stream.tell() != dataOffset:
+                # A forward seek decompresses up to the data
+                self._stream.seek(dataOffset)
+
+            data = self._stream.read(size)
+
+            if not data:
+                raise EOFError(
+                    "Unexpected end of data reading {} from {}".format(
+                        self._member.name, self._archiveName
+                    )
+                )
+
+        except BaseException:
+            # A broken stream is not kept for other members
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
+            raise
+
+        self._position += len(data)
+
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._member.size
+
+        if offset < 0:
+            raise ValueError("negative seek position {}".format(offset))
+
+        if self._stream is not None and offset < self._position:
+            # The stream cannot go back. The next read takes another one
+            releaseArchiveStream(self._archiveName, self._stream)
+            self._stream = None
+
+        self._position = offset
+
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if self._stream is not None:
+            releaseArchiveStream(self._archiveName, self._stream)
+            self._stream = None
+
+
+def openArchiveMember(archiveName, memberName):
+
+    lowerName = archiveName.lower()
+
+    if lowerName.endswith(TAR_ARCHIVE_SUFFIXES):
+        members = getTarMembers(archiveName)
+        if memberName not in members:
+            raise FileNotFoundError(
+                "{} was not found in {}".format(memberName, archiveName)
+            )
+        return TarMemberStream(archiveName, members[memberName])
+
+    if lowerName.endswith(ZIP_ARCHIVE_SUFFIXES):
+        # The member keeps the zip file open until it is closed
+        with zipfile.ZipFile(archiveName) as archive:
+            return archive.open(memberName)
+
+    return gzip.open(archiveName, "rb")
+
+
+def openCollectionFile(fileName, mode="r"):
+    # Opens a collected file for reading (mode r or rb), decompressing it when it is inside an archive
+
+    archiveMember = getArchiveMember(fileName)
+
+    if archiveMember is None:
+        return open(fileName, mode)
+
+    memberFile = io.BufferedReader(
+        ArchiveMemberFile(str(fileName), openArchiveMember(*archiveMember))
+    )
+
+    if "b" in mode:
+        return memberFile
+
+    return io.TextIOWrapper(memberFile)
+
+
+def readCollectionCSV(fileName, **readCsvArgs):
+    # pd.read_csv for collected files. Regular files are given to pandas by name, so they are read as before
+
+    import pandas as pd
+
+    if getArchiveMember(fileName) is None:
+        return pd.read_csv(fileName, **readCsvArgs)
+
+    with openCollectionFile(fileName, "rb") as csvFile:
+        return pd.read_csv(csvFile, **readCsvArgs)
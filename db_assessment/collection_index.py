@@ -0,0 +1,214 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Catalog of the files collected by the Optimus Prime SQL scripts.
+# The -fileslocation directory is scanned once and each opdb__<table>__<dbver>_<sqlver>_<host>.<db>.<inst>.<ts>.log
+# name is parsed once into a CollectionFile. Filtering by collection id, SQL version and database version, version checks
+# and grouping by table are then done over the parsed records.
+
+import os
+from functools import lru_cache
+from typing import NamedTuple
+
+from db_assessment import collection_archive
+
+# Only the files generated by the collection SQL scripts (opdb__) and their consolidations (opalldb__, -consolidatelogs)
+# are indexed. I.E: opdbt__ files are generated by Optimus Prime
+COLLECTION_FILE_PREFIX = "opdb__"
+CONSOLIDATED_FILE_PREFIX = "opalldb__"
+COLLECTION_FILE_SUFFIX = ".log"
+
+
+class CollectionFile(NamedTuple):
+    fileName: str
+    tableName: str
+    collectionKey: str
+    dbversion: str
+    sqlversion: str
+    hostName: str
+    dbName: str
+    instanceName: str
+    timestamp: str
+    size: int
+
+
+def parseCollectionFileName(fileName, size=0):
+    # Returns the CollectionFile for a collected file name or None if the name does not follow the collection pattern
+
+    baseName = os.path.basename(fileName)
+
+    if not baseName.startswith(
+        (COLLECTION_FILE_PREFIX, CONSOLIDATED_FILE_PREFIX)
+    ) or not baseName.endswith(
+        COLLECTION_FILE_SUFFIX
+    ):
+        return None
+
+    nameParts = baseName.split("__", 2)
+
+    if len(nameParts) < 3:
+        return None
+
+    tableName, collectionKey = nameParts[1], nameParts[2]
+
+    # Old SQL script versions do not have the <dbver>_<sqlver>_ prefix
+    keyParts = collectionKey.split("_", 2)
+    if len(keyParts) < 3:
+        keyParts = ["", "", collectionKey]
+
+    # Host names can have dots, so the source is split from the right
+    sourceParts = keyParts[2][: -len(COLLECTION_FILE_SUFFIX)].rsplit(".", 3)
+    sourceParts = [""] * (4 - len(sourceParts)) + sourceParts
+
+    return CollectionFile(
+        fileName,
+        tableName,
+        collectionKey,
+        keyParts[0],
+        keyParts[1],
+        sourceParts[0],
+        sourceParts[1],
+        sourceParts[2],
+        sourceParts[3],
+        size,
+    )
+
+
+@lru_cache(maxsize=None)
+def getTableName(fileName):
+    # Table name of a file named <type>__<table>__<...>. I.E: opdb__dbsummary__190_2.0.3_host.db.inst.ts.log
+
+    nameParts = os.path.basename(str(fileName)).split("__")
+
+    if len(nameParts) < 2:
+        return None
+
+    return nameParts[1]
+
+
+class CollectionIndex:
+    # Collected files found in a directory, indexed by file name and by table
+
+    def __init__(self, filesLocation):
+
+        self.filesLocation = str(filesLocation)
+        self.files = []
+        self.filesByName = {}
+        self.filesByTable = {}
+
+        # -fileslocation can also be a compressed collection
+        if collection_archive.isCollectionArchive(
+            self.filesLocation
+        ) and os.path.isfile(self.filesLocation):
+            self.addArchiveFiles(self.filesLocation)
+            return
+
+        if not os.path.isdir(self.filesLocation):
+            return
+
+        # A single directory scan. The file sizes come with the directory entries
+        with os.scandir(self.filesLocation) as entries:
+            for entry in entries:
+
+                if not entry.is_file():
+                    continue
+
+                if collection_archive.isCollectionArchive(entry.name):
+                    self.addArchiveFiles(os.path.join(self.filesLocation, entry.name))
+                    continue
+
+                collectionFile = parseCollectionFileName(
+                    os.path.join(self.filesLocation, entry.name), entry.stat().st_size
+                )
+
+                if collectionFile is not None:
+                    self.addFile(collectionFile)
+
+    def addArchiveFiles(self, archiveName):
+        # The collected files inside an archive are indexed without extracting them
+
+        try:
+            archiveFiles = collection_archive.listArchiveFiles(archiveName)
+        except collection_archive.ARCHIVE_ERRORS as archiveErr:
+            print(
+                "\nWARNING: The archive {} could not be read and it will be skipped. Error: {}\n".format(
+                    archiveName, archiveErr
+                )
+            )
+            return
+
+        for fileName, size in archiveFiles:
+
+            collectionFile = parseCollectionFileName(fileName, size)
+
+            if collectionFile is not None:
+                self.addFile(collectionFile)
+
+    def addFile(self, collectionFile):
+
+        self.files.append(collectionFile)
+        self.filesByName[collectionFile.fileName] = collectionFile
+        self.filesByTable.setdefault(collectionFile.tableName.lower(), []).append(
+            collectionFile
+        )
+
+    def getFile(self, fileName):
+
+        return self.filesByName.get(fileName)
+
+    def getTableFiles(self, tableName):
+
+        return list(self.filesByTable.get(str(tableName).lower(), []))
+
+    def selectFiles(self, collectionId, sqlVersion=None, dbVersions=None):
+        # Files of the collection id (suffix of the file names), optionally filtered by SQL version and database versions.
+        # Versions are prefixes like in the file patterns used before: -filterbydbversion 12 selects 121 and 122
+
+        collectionSuffix = str(collectionId).replace(" ", "") + COLLECTION_FILE_SUFFIX
+
+        selectedFiles = [
+            collectionFile
+            for collectionFile in self.files
+            if os.path.basename(collectionFile.fileName).endswith(collectionSuffix)
+        ]
+
+        if sqlVersion:
+            selectedFiles = [
+                collectionFile
+                for collectionFile in selectedFiles
+                if collectionFile.sqlversion.startswith(str(sqlVersion))
+            ]
+
+        if dbVersions:
+            # Files are listed once per database version, in the order of the versions
+            selectedFiles = [
+                collectionFile
+                for dbversion in dbVersions
+                for collectionFile in selectedFiles
+                if collectionFile.dbversion.startswith(
+                    str(dbversion).strip().replace(".", "")
+                )
+            ]
+
+        return selectedFiles
+
+
+def getDbVersions(collectionFiles):
+
+    return set(collectionFile.dbversion for collectionFile in collectionFiles)
+
+
+def getSqlVersions(collectionFiles):
+
+    return set(collectionFile.sqlversion for collectionFile in collectionFiles)
@@ -0,0 +1,272 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Liveness of the dataframes used by the transformers.json rules, used by -evictframes.
+# Before the rules of an execution group run, each dataframe gets the number of rules that still read or write it.
+# When no rule uses a dataframe anymore it is evicted: dropped when the data is imported from the CSV files, or spilled to
+# an uncompressed Feather file (in the scratch location) that the -fromdataframe import reads back memory mapped, one table at a time.
+
+import os
+import tempfile
+import threading
+
+from db_assessment import rules_engine
+
+# Dataframes used after the rules. I.E: OPKEYLOG by the invalid files log
+KEEP_FRAMES = frozenset(("OPKEYLOG",))
+SPILL_DIRECTORY = ".opspill"
+
+
+def isEvictFrames(args):
+
+    return bool(getattr(args, "evictframes", False))
+
+
+class SpilledDataFrame:
+    # Dataframe written to a Feather file. It takes the place of the dataframe in the dataframes Hash Table
+
+    def __init__(self, fileName, rows):
+
+        self.fileName = fileName
+        self.rows = rows
+
+    def __len__(self):
+
+        return self.rows
+
+    def load(self):
+
+        import pyarrow.feather as feather
+
+        return feather.read_table(self.fileName, memory_map=True).to_pandas()
+
+
+def getDataFrame(dataFrames, dataFrameName):
+    # Returns a dataframe from the dataframes Hash Table, reading it back if it was spilled
+
+    df = dataFrames[dataFrameName]
+
+    if isinstance(df, SpilledDataFrame):
+        return df.load()
+
+    return df
+
+
+def removeSpilledFrames(dataFrames):
+    # Deletes the Feather files of the spilled dataframes once they are imported
+
+    spillDirs = set()
+
+    for dataFrameName in list(dataFrames):
+
+        if isinstance(dataFrames[dataFrameName], SpilledDataFrame):
+
+            spillDirs.add(os.path.dirname(dataFrames[dataFrameName].fileName))
+
+            try:
+                os.remove(dataFrames[dataFrameName].fileName)
+            except OSError:
+                None
+
+            del dataFrames[dataFrameName]
+
+    for spillDir in spillDirs:
+        try:
+            os.rmdir(spillDir)
+        except OSError:
+            None
+
+
+def newSpillDir(args):
+    # Directory for the Feather files of the dataframes spilled by one caller, in the scratch location
+
+    spillRoot = os.path.join(
+        str(rules_engine.getScratchLocation(args)), SPILL_DIRECTORY
+    )
+    os.makedirs(spillRoot, exist_ok=True)
+
+    return tempfile.mkdtemp(dir=spillRoot)
+
+
+def spillDataFrame(df, dataFrameName, spillDir):
+    # Writes the dataframe to an uncompressed Feather file, so it can be memory mapped when it is read back.
+    # Returns the SpilledDataFrame or None if it could not be written
+
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    fileName = os.path.join(spillDir, str(dataFrameName).lower() + ".feather")
+
+    try:
+        feather.write_feather(
+            df.reset_index(drop=True), fileName, compression="uncompressed"
+        )
+    except (pa.ArrowException, TypeError, ValueError) as spillErr:
+        print(
+            "\nWARNING: The dataframe {} could not be spilled to disk and it is kept in memory. Error: {}".format(
+                dataFrameName, spillErr
+            )
+        )
+        return None
+
+    return SpilledDataFrame(fileName, len(df))
+
+
+def getFrameLiveness(sorted_keys, executionGroup, transformerRules, args):
+    # Returns the FrameLiveness of the rules of an execution group or None when there is nothing to evict.
+    # All dataframes are kept if the dataframes used by a rule cannot be known from its expressions
+
+    if not isEvictFrames(args):
+        return None
+
+    frameLiveness = FrameLiveness(args)
+
+    if not frameLiveness.addRules(sorted_keys, executionGroup, transformerRules):
+        print(
+            "\nWARNING: The dataframes used by the transformers.json rules could not be found from their expressions. No dataframe will be evicted (-evictframes).\n"
+        )
+        return None
+
+    # Groups without python rules (I.E: views) do not use the dataframes
+    if len(frameLiveness.ruleFrames) == 0:
+        return None
+
+    return frameLiveness
+
+
+class FrameLiveness:
+    # Remaining uses of the dataframes by the rules of an execution group
+
+    def __init__(self, args):
+
+        self.args = args
+        self.lock = threading.RLock()
+        self.dataFrameGroups = {}
+        # {rule: dataframe groups read or written by the rule}
+        self.ruleFrames = {}
+        # {dataframe group: number of rules that still use it}
+        self.remainingUses = {}
+        self.keepFrames = set(KEEP_FRAMES)
+        self.spillDir = None
+
+    def getFrameGroup(self, dataFrameName):
+        # ADD_OR_UPDATE_COLUMN rules store the same dataframe under two names, so they are evicted together
+
+        dataFrameName = str(dataFrameName).upper()
+
+        return self.dataFrameGroups.get(dataFrameName, dataFrameName)
+
+    def addRules(self, sorted_keys, executionGroup, transformerRules):
+        # Counts the uses of each dataframe. Returns False when the dataframes of an enabled python rule cannot be known
+
+        self.dataFrameGroups = rules_engine.getRuleDataFrameGroups(
+            sorted_keys, transformerRules
+        )
+
+        for ruleItem in sorted_keys:
+
+            if str(transformerRules[ruleItem]["status"]).upper() != "ENABLED":
+                continue
+
+            if (
+                str(transformerRules[ruleItem]["action_details"]["type"]).upper()
+                not in rules_engine.RULE_PYTHON_TYPES
+            ):
+                continue
+
+            ruleDataFrames = rules_engine.getRuleDataFrameNames(
+                transformerRules[ruleItem]
+            )
+
+            if ruleDataFrames is None:
+                return False
+
+            frameGroups = set(
+                self.getFrameGroup(dataFrameName)
+                for dataFrameName in ruleDataFrames[0] | ruleDataFrames[1]
+            )
+
+            if (
+                str(transformerRules[ruleItem]["execution_group"]).upper()
+                != str(executionGroup).upper()
+            ):
+                # Dataframes used by the rules of other execution groups are kept
+                self.keepFrames.update(frameGroups)
+                continue
+
+            self.ruleFrames[ruleItem] = frameGroups
+
+            for frameGroup in frameGroups:
+                self.remainingUses[frameGroup] = (
+                    self.remainingUses.get(frameGroup, 0) + 1
+                )
+
+        return True
+
+    def ruleFinished(self, ruleItem, dataFrames):
+        # Called after each rule, executed or skipped. Evicts the dataframes that no remaining rule uses
+
+        with self.lock:
+
+            for frameGroup in self.ruleFrames.get(ruleItem, ()):
+                self.remainingUses[frameGroup] -= 1
+
+            self.evictDeadFrames(dataFrames)
+
+    def evictDeadFrames(self, dataFrames):
+
+        with self.lock:
+
+            for dataFrameName in list(dataFrames):
+
+                if isinstance(dataFrames[dataFrameName], SpilledDataFrame):
+                    continue
+
+                frameGroup = self.getFrameGroup(dataFrameName)
+
+                if (
+                    frameGroup in self.keepFrames
+                    or self.remainingUses.get(frameGroup, 0) > 0
+                ):
+                    continue
+
+                self.evictFrame(dataFrames, dataFrameName)
+
+    def evictFrame(self, dataFrames, dataFrameName):
+
+        if not self.args.fromdataframe:
+            # The data is imported from the CSV files, so the dataframe is not needed anymore
+            del dataFrames[dataFrameName]
+            print(" Evicted the dataframe {}".format(dataFrameName))
+            return
+
+        spilledFrame = self.spillFrame(dataFrames[dataFrameName], dataFrameName)
+
+        if spilledFrame is not None:
+            dataFrames[dataFrameName] = spilledFrame
+            print(
+                " Spilled the dataframe {} to {}".format(
+                    dataFrameName, spilledFrame.fileName
+                )
+            )
+        else:
+            # The dataframe stays in memory and it is not tried again
+            self.keepFrames.add(self.getFrameGroup(dataFrameName))
+
+    def spillFrame(self, df, dataFrameName):
+
+        if self.spillDir is None:
+            self.spillDir = newSpillDir(self.args)
+
+        return spillDataFrame(df, dataFrameName, self.spillDir)
@@ -13,24 +13,76 @@
 # limitations under the License.
 
 
+import csv
 import datetime
+import decimal
 import glob
+import hashlib
+import io
 
 # Basic python built-in libraries to enable read, write and manipulate files in the OS
 import os
 import re
-
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import google.auth
 import pandas as pd
+import requests.adapters
 from beautifultable import BeautifulTable
-from google.api_core.exceptions import Conflict
+from google.api_core.exceptions import Conflict, GoogleAPIError
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import bigquery
 
-from db_assessment import rules_engine, set_client_info
+from db_assessment import (
+    collection_archive,
+    collection_index,
+    frame_liveness,
+    import_ledger,
+    rules_engine,
+    set_client_info,
+)
 from db_assessment.version import __version__
 
-ct = datetime.datetime.now()
+# Big Query clients shared by the whole import by (project, usage tracking). Clients are thread safe
+bigqueryClients = {}
+bigqueryClientsLock = threading.Lock()
+
+# Connections kept open by each shared Big Query client. It covers the parallel load jobs and view creations
+BIGQUERY_HTTP_POOL_SIZE = 32
+
+# Seconds to wait between two polling rounds of the running Big Query load jobs
+LOAD_JOB_POLL_INTERVAL = 2
+
+# Bytes read at a time from each file when merging files into a single load job
+MERGED_LOAD_BLOCK_SIZE = 1024 * 1024
 
-client = None  # Declare this at the top after import statements
+# Compression of the Parquet files uploaded with -loadformat PARQUET
+PARQUET_COMPRESSION = "snappy"
+
+# Parquet files larger than this are written to a temporary file instead of memory while they are uploaded
+PARQUET_SPOOL_BYTES = 64 * 1024 * 1024
+
+# Big Query NUMERIC precision (38 digits) and scale (9 decimal digits)
+NUMERIC_SCALE = decimal.Decimal("1e-9")
+NUMERIC_CONTEXT = decimal.Context(prec=38, rounding=decimal.ROUND_HALF_UP)
+
+# Big Query types converted from text by the Parquet loads. Any other type is loaded as text
+PARQUET_TYPED_FIELD_TYPES = (
+    "INTEGER",
+    "INT64",
+    "FLOAT",
+    "FLOAT64",
+    "NUMERIC",
+    "DECIMAL",
+    "TIMESTAMP",
+    "BOOLEAN",
+    "BOOL",
+)
 
 # Messages handling
 import logging
@@ -38,11 +90,43 @@ import logging
 logging.getLogger().setLevel(level=logging.INFO)
 
 
-def get_bigqueryClient():
-    global client
-    if not client:
-        client = bigquery.Client(client_info=set_client_info.get_http_client_info())
-    return client
+def get_bigqueryClient(gcpProjectName=None, trackUsage=True):
+    # Returns the shared Big Query client for the project. trackUsage adds the Optimus Prime client_info to track the tool usage
+
+    clientKey = (gcpProjectName, bool(trackUsage))
+
+    with bigqueryClientsLock:
+
+        if clientKey not in bigqueryClients:
+
+            # Credentials are resolved once per client and all its requests go through the same connection pool
+            credentials, defaultProject = google.auth.default(
+                scopes=bigquery.Client.SCOPE
+            )
+            httpSession = AuthorizedSession(credentials)
+            httpAdapter = requests.adapters.HTTPAdapter(
+                pool_connections=BIGQUERY_HTTP_POOL_SIZE,
+                pool_maxsize=BIGQUERY_HTTP_POOL_SIZE,
+            )
+            httpSession.mount("https://", httpAdapter)
+
+            # Without -projectname the project from the environment is used like bigquery.Client() does
+            clientProject = gcpProjectName or defaultProject
+
+            if trackUsage:
+                # Construct a BigQuery client object with API Call to track Tool usage
+                bigqueryClients[clientKey] = bigquery.Client(
+                    project=clientProject,
+                    credentials=credentials,
+                    client_info=set_client_info.get_http_client_info(),
+                    _http=httpSession,
+                )
+            else:
+                bigqueryClients[clientKey] = bigquery.Client(
+                    project=clientProject, credentials=credentials, _http=httpSession
+                )
+
+        return bigqueryClients[clientKey]
 
 
 def getVersion():
@@ -61,18 +145,24 @@ def consolidateLos(args, transformersTablesSchema):
     # Counting all processed files
     fileCounter = 0
 
+    # Collected files found in the directory passed in -fileslocation (default dbResults)
+    collectionIndex = collection_index.CollectionIndex(
+        getattr(args, "fileslocation")
+    )
+
     # For all expected tables we will look for related OS files. So, we will process all files related to a given expected tableName, then move to the next
     for tableName in tableSchemas:
 
         fileCounter = fileCounter + 1
 
-        # Using the expected tableName to look for files in the OS in the directory passed in -fileslocation (default dbResults)
-        csvFilesLocationPattern = (
-            str(getattr(args, "fileslocation")) + "/opdb*" + str(tableName) + "*.log"
-        )
-
-        # Generating a list with all found OS filenames
-        fileList = getAllFilesByPattern(csvFilesLocationPattern)
+        # Generating a list with all found OS filenames for the expected tableName. Previous consolidations are not consolidated again
+        fileList = [
+            collectionFile.fileName
+            for collectionFile in collectionIndex.getTableFiles(tableName)
+            if os.path.basename(collectionFile.fileName).startswith(
+                collection_index.COLLECTION_FILE_PREFIX
+            )
+        ]
 
         # To control how many files are being processed and identify the first processed file since it needs to bring the headers
         fileTableCounter = 0
@@ -84,7 +174,7 @@ def consolidateLos(args, transformersTablesSchema):
             fileTableCounter = fileTableCounter + 1
 
             # Final table name from the CSV file names
-            tableName = getObjNameFromFiles(fileName, "__", 1)
+            tableName = collection_index.getTableName(fileName)
 
             # Filename to be used to name consolidated file
             targetFileNameConsolidated = (
@@ -149,11 +239,12 @@ def consolidateLos(args, transformersTablesSchema):
 
 
 def createOptimusPrimeViewsTransformers(
-    gcpProjectName, bqDataset, view_name, view_query
+    gcpProjectName, bqDataset, view_name, view_query, client=None
 ):
     # This function intents to create all views found in the opViews directory. The views creation must follow opConfig/transformers.json
 
-    client = bigquery.Client()
+    if client is None:
+        client = get_bigqueryClient(gcpProjectName, False)
 
     if gcpProjectName is None:
         # In case projectname is not provided in the arguments
@@ -163,9 +254,6 @@ def createOptimusPrimeViewsTransformers(
         # If projectname is provided in the arguments
         view_id = str(gcpProjectName) + "." + str(bqDataset) + "." + view_name
 
-    # Creating the JOB to create view in Big Query
-    view = bigquery.Table(view_id)
-
     # Extracting the view text and replacing the string ${dataset}/${projectname} by the proper dataset independent of case sensitive
     pattern = re.compile(re.escape("${dataset}"), re.IGNORECASE)
     view_query = pattern.sub(str(bqDataset), view_query)
@@ -174,20 +262,19 @@ def createOptimusPrimeViewsTransformers(
     # source_id = 'optimusprime-migrations.consolidate_test.dbsummary'
     # view_query = f"SELECT pkey, dbid FROM `{source_id}`"
 
-    view.view_query = view_query
+    # A single DDL statement creates the view or replaces the one from a previous run
+    view_ddl = "CREATE OR REPLACE VIEW `{}` AS\n{}".format(view_id, view_query)
 
     try:
         # Make an API request to create the view.
-        view = client.create_table(view)
-        print("Created {}: {}".format(view.table_type, str(view.reference)))
+        client.query(view_ddl).result()
+        print("Created VIEW: {}".format(view_id))
         print("\n")
-    except Conflict as error:
-        print("View {} already exists.\n".format(str(view.reference)))
-        # view = client.update_table(view, ['view_query'])
-        return False
-    except:
+    except GoogleAPIError as viewErr:
         print(
-            "View {} count not be created. See DDL below:\n".format(str(view.reference))
+            "View {} could not be created because of the error {}. See DDL below:\n".format(
+                view_id, viewErr
+            )
         )
         print(view_query)
         return False
@@ -195,6 +282,116 @@ def createOptimusPrimeViewsTransformers(
     return True
 
 
+def getViewWorkers(args):
+
+    return max(int(getattr(args, "viewworkers", 8) or 1), 1)
+
+
+def getViewTier(ruleName):
+    # Views are created in tiers given by the rule name prefix: 2-0-..., 2-100-..., 2-1000-...
+
+    viewTier = re.match(r"^\d+-(\d+)-", str(ruleName))
+
+    if viewTier is None:
+        return 0
+
+    return int(viewTier.group(1))
+
+
+def createOptimusPrimeViewsInTiers(gcpProjectName, bqDataset, viewDefinitions, args):
+    # Creates the views from transformers.json tier by tier. All views of a tier are created at the same time.
+    # viewDefinitions is the list of (rule name, view name, view query) in priority order.
+    # When more than one rule creates the same view only the first one is used, like when existing views were skipped
+
+    viewTiers = {}
+    viewNames = set()
+
+    for ruleName, viewName, viewQuery in viewDefinitions:
+
+        if str(viewName).lower() in viewNames:
+            print(
+                'The rule "{}" is being skipped because the view {} is already created by another rule.\n'.format(
+                    ruleName, viewName
+                )
+            )
+            continue
+
+        viewNames.add(str(viewName).lower())
+        viewTiers.setdefault(getViewTier(ruleName), []).append((viewName, viewQuery))
+
+    client = get_bigqueryClient(gcpProjectName, False)
+
+    # {tier: [view names]} of the views not created, also the ones skipped because they use them
+    failedViews = {}
+
+    with ThreadPoolExecutor(max_workers=getViewWorkers(args)) as executor:
+
+        # The views of a tier can only use views of the previous tiers
+        for viewTier in sorted(viewTiers):
+
+            tierViews = []
+
+            for viewName, viewQuery in viewTiers[viewTier]:
+
+                failedDependencies = getViewDependencies(
+                    viewQuery,
+                    [
+                        failedView
+                        for tierFailedViews in failedViews.values()
+                        for failedView in tierFailedViews
+                    ],
+                )
+
+                if len(failedDependencies) > 0:
+                    print(
+                        "View {} is skipped because it uses the views that could not be created: {}\n".format(
+                            viewName, ", ".join(failedDependencies)
+                        )
+                    )
+                    failedViews.setdefault(viewTier, []).append(viewName)
+                    continue
+
+                tierViews.append((viewName, viewQuery))
+
+            viewResults = executor.map(
+                lambda viewDefinition: createOptimusPrimeViewsTransformers(
+                    gcpProjectName,
+                    bqDataset,
+                    viewDefinition[0],
+                    viewDefinition[1],
+                    client,
+                ),
+                tierViews,
+            )
+
+            for (viewName, viewQuery), viewCreated in zip(tierViews, viewResults):
+                if not viewCreated:
+                    failedViews.setdefault(viewTier, []).append(viewName)
+
+    for viewTier in sorted(failedViews):
+        print(
+            "\nWARNING: The views of the tier {} not created: {}\n".format(
+                viewTier, ", ".join(failedViews[viewTier])
+            )
+        )
+
+    return len(failedViews) == 0
+
+
+def getViewDependencies(viewQuery, viewNames):
+    # Views from viewNames used by a view query (I.E: ${dataset}.vdbsummary)
+
+    return [
+        viewName
+        for viewName in viewNames
+        if re.search(
+            r"(?<![\w$]){}(?!\w)".format(re.escape(str(viewName))),
+            viewQuery,
+            re.IGNORECASE,
+        )
+    ]
+
+
 def createOptimusPrimeViewsFromOS(gcpProjectName, bqDataset):
     # This function intents to create all views found in the opViews directory. The views creation must follow opViews/<filename> order
 
@@ -216,11 +413,13 @@ def createOptimusPrimeViewsFromOS(gcpProjectName, bqDataset):
 
     else:
 
-        client = bigquery.Client()
+        client = get_bigqueryClient(gcpProjectName, False)
 
         # Sorting list to make sure the proper view creation
         fileList.sort()
 
+        viewsCreated = True
+
         # Looping to iterate all view files found in the OS to be created. Also, to extract the proper view name out of them.
         for viewFileName in fileList:
 
@@ -235,38 +434,39 @@ def createOptimusPrimeViewsFromOS(gcpProjectName, bqDataset):
                 )
             )
 
-            if gcpProjectName is None:
-                # In case projectname is not provided in the arguments
-                view_id = str(client.project) + "." + str(bqDataset) + "." + view_name
-            else:
-                # If projectname is provided in the arguments
-                view_id = str(gcpProjectName) + "." + str(bqDataset) + "." + view_name
-
-            # Creating the JOB to create view in Big Query
-            view = bigquery.Table(view_id)
-
-            # Extracting the view text and replacing the string ${dataset} by the proper dataset
             with open(viewFileName, "r") as view_content:
-                view.view_query = view_content.read().replace(
-                    "${dataset}", str(bqDataset)
-                )
+                view_query = view_content.read()
 
-            try:
-                # Make an API request to create the view.
-                view = client.create_table(view)
-                print("Created {}: {}".format(view.table_type, str(view.reference)))
-                print("\n")
-            except Conflict as error:
-                print("View {} already exists.\n".format(str(view.reference)))
+            # Like the views from transformers.json, the views of a previous run are replaced
+            viewsCreated = (
+                createOptimusPrimeViewsTransformers(
+                    gcpProjectName, bqDataset, view_name, view_query, client
+                )
+                and viewsCreated
+            )
 
-        return True
+        return viewsCreated
 
 
 def getAllFilesByPattern(filePattern):
     # This function intends to get the name of all files in the OS and return a list of strings
 
-    # Get all matching files and creates a list returning it
-    return glob.glob(filePattern)
+    # Get all matching files and creates a list returning it. The files inside the archives found are included
+    return glob.glob(filePattern) + collection_archive.getArchiveFilesByPattern(
+        filePattern
+    )
+
+
+def getFileContentHash(fileName):
+    # Returns the SHA-256 of the file content reading it in blocks
+
+    fileHash = hashlib.sha256()
+
+    with collection_archive.openCollectionFile(fileName, "rb") as f:
+        for block in iter(lambda: f.read(MERGED_LOAD_BLOCK_SIZE), b""):
+            fileHash.update(block)
+
+    return fileHash.hexdigest()
 
 
 def importAllDataframeToBQ(
@@ -277,6 +477,7 @@ def importAllDataframeToBQ(
     dbAssessmentDataframes,
     transformersParameters,
     importresults,
+    runJournal=None,
 ):
 
     # Tracking tableNames Imported to Big Query
@@ -308,10 +509,23 @@ def importAllDataframeToBQ(
 
                 continue
 
+            # Dataframes already imported by the run being resumed
+            journalKey = "dataframe::" + str(tableName).lower()
+            if runJournal is not None and runJournal.isFileLoaded(journalKey):
+                print(
+                    "The dataframe {} is being SKIPPED because it was already imported by the run {}.".format(
+                        tableName, runJournal.runId
+                    )
+                )
+                tablesImported[str(tableName).lower()] = "IMPORTED_FROM_DATAFRAME"
+                continue
+
+            # Dataframes spilled by -evictframes are read back one at a time
+            df = frame_liveness.getDataFrame(dbAssessmentDataframes, tableName)
+
             if str(tableName).lower() == "opkeylog":
-                df = dbAssessmentDataframes[tableName]
                 df["CMNT"] = transformersParameters["importcomment"]
-                df["LOADTOBQDATE"] = ct
+                df["LOADTOBQDATE"] = getLoadDate(transformersParameters)
                 df["JOBPARAMS"] = str(vars(args))
 
             # Import the given CSV fileName into
@@ -320,13 +534,15 @@ def importAllDataframeToBQ(
                 bqDataset,
                 str(tableName).lower(),
                 tableSchemas,
-                dbAssessmentDataframes[tableName],
+                df,
                 transformersParameters,
                 args,
                 importresults,
             )
             if sucessImport:
                 tablesImported[str(tableName).lower()] = "IMPORTED_FROM_DATAFRAME"
+                if runJournal is not None:
+                    runJournal.recordLoadedFile(journalKey, len(df))
 
         return True, tablesImported, importresults
 
@@ -382,6 +598,13 @@ def importDataframeToBQ(
             df,
         )
 
+        if rules_engine.isSchemaTypeInference(args):
+            transformersTablesSchemaDataframe[
+                str(tableName).lower()
+            ] = rules_engine.applyInferredBQDataTypes(
+                transformersTablesSchemaDataframe[str(tableName).lower()], df
+            )
+
         tableSchemas = getBQJobConfig(transformersTablesSchemaDataframe, "DATAFRAME")
 
         schema = tableSchemas[str(tableName).lower()]
@@ -410,20 +633,18 @@ def importDataframeToBQ(
         )
         return False, importresults
 
-    try:
-        df = df.astype(str)
-    except:
-        print(
-            '\nWARNING: The dataframe "{}" could not be converted to STRING.'.format(
-                tableName
+    if not isParquetLoad(args):
+        try:
+            df = df.astype(str)
+        except:
+            print(
+                '\nWARNING: The dataframe "{}" could not be converted to STRING.'.format(
+                    tableName
+                )
             )
-        )
 
-    if str(tableName).lower() == "opkeylog":
-        # Construct a BigQuery client object with API Call to track Tool usage
-        client = bigquery.Client(client_info=set_client_info.get_http_client_info())
-    else:
-        client = bigquery.Client()
+    # The OPKEYLOG import tracks the tool usage
+    client = get_bigqueryClient(gcpProjectName, str(tableName).lower() == "opkeylog")
 
     # Adding Project and Dataset based on arguments
     # table_id to the ID of the table to create.
@@ -457,15 +678,22 @@ def importDataframeToBQ(
         # source_format = file_format
     )
 
-    job = client.load_table_from_dataframe(
-        df, table_id, job_config=job_config
-    )  # Make an API request.
+    if isParquetLoad(args):
+        # The columns are converted to the schema types and uploaded as compressed Parquet
+        job_config.source_format = bigquery.SourceFormat.PARQUET
+        parquetBuffer, job_config.schema = getParquetBufferFromDataframe(df, schema)
+        job = client.load_table_from_file(
+            parquetBuffer, table_id, job_config=job_config
+        )  # Make an API request.
+    else:
+        job = client.load_table_from_dataframe(
+            df, table_id, job_config=job_config
+        )  # Make an API request.
     job.result()  # Wait for the job to complete.
 
-    table = client.get_table(table_id)  # Make an API request.
     print(
         "Loaded {} rows and {} columns to {}".format(
-            table.num_rows, len(table.schema), table_id
+            job.output_rows, len(schema), table_id
         )
     )
 
@@ -484,8 +712,15 @@ def importDataframeToBQ(
     return True, importresults
 
 
+def getLoadDate(transformersParameters):
+    # Load date of the run (set by its AssessmentRun), so all rows imported by the same run have the same LOADTOBQDATE
+
+    return transformersParameters.get("loaddate") or datetime.datetime.now()
+
+
 def adddetails(fileName, args, params, tableHeader):
-    df = pd.read_csv(
+    # Returns the file written to the scratch location. The collected file is left as it is, so it can be imported again
+    df = collection_archive.readCollectionCSV(
         fileName,
         sep=str(args.sep),
         skiprows=2,
@@ -497,14 +732,16 @@ def adddetails(fileName, args, params, tableHeader):
     )
     if params["importcomment"]:
         df["CMNT"] = params["importcomment"]
-    df["LOADTOBQDATE"] = ct
+    df["LOADTOBQDATE"] = getLoadDate(params)
     df["JOBPARAMS"] = str(vars(args))
-    df.to_csv(fileName, index=False, sep=str(args.sep))
-    line = ""
-    with open(fileName, "r+") as f:
-        content = f.read()
-        f.seek(0, 0)
-        f.write(line.rstrip("\r\n") + "\n" + content)
+    fileName = os.path.join(
+        str(rules_engine.getScratchLocation(args)), os.path.basename(fileName)
+    )
+    # Writing the empty first line and the data in one go instead of writing, reading and writing the file again
+    with open(fileName, "w") as f:
+        f.write("\n")
+        df.to_csv(f, index=False, sep=str(args.sep))
+    return fileName
 
 
 def importAllCSVsToBQ(
@@ -516,6 +753,7 @@ def importAllCSVsToBQ(
     transformersParameters,
     args,
     importresults,
+    runJournal=None,
 ):
     # This function receives a list of files to import to Big Query, then it calls importCSVToBQ to import table/file by table/file
 
@@ -527,6 +765,14 @@ def importAllCSVsToBQ(
 
     fileList.sort()
 
+    # Files to be imported when the load jobs are scheduled in parallel
+    loadFiles = []
+
+    # With -incremental the files already imported with the same content are skipped
+    importLedger = None
+    if import_ledger.isIncrementalImport(args):
+        importLedger = import_ledger.ImportLedger(gcpProjectName, bqDataset)
+
     # Getting the name of the target table_name to import the data based on the filename from OS
     for fileName in fileList:
 
@@ -534,23 +780,67 @@ def importAllCSVsToBQ(
         autoDetect = "True"
 
         # Final table name from the CSV file names
-        tableName = getObjNameFromFiles(fileName, "__", 1)
+        tableName = collection_index.getTableName(fileName)
 
         importTable = True
         doNotImportList = [
             table.strip().lower() for table in transformersParameters["do_not_import"]
         ]
 
+        # Files already imported by the run being resumed
+        if runJournal is not None and runJournal.isFileLoaded(fileName):
+            print(
+                "\nThe filename {} is being SKIPPED because it was already imported by the run {}.".format(
+                    fileName, runJournal.runId
+                )
+            )
+            importresults = populateLoadJobBT(
+                tableName,
+                [fileName],
+                {fileName: runJournal.getLoadedRows(fileName)},
+                importresults,
+                args,
+            )
+            continue
+
+        if (
+            importLedger is not None
+            and tableName.lower() not in doNotImportList
+            and importLedger.getFileStatus(fileName, tableName)
+            == import_ledger.FILE_UNCHANGED
+        ):
+            print(
+                "\nThe filename {} is being SKIPPED because it was already imported with the same content (-incremental).".format(
+                    fileName
+                )
+            )
+            continue
+
         if str(tableName).lower() == "opkeylog":
             ##skipLeadingRows=1
             tableHeaders = rules_engine.getDFHeadersFromTransformers(
                 str(tableName).lower(), transformersTablesSchema
             )
             tableHeader = [header.upper() for header in tableHeaders]
-            adddetails(fileName, args, transformersParameters, tableHeader)
+            detailsFileName = adddetails(
+                fileName, args, transformersParameters, tableHeader
+            )
+            if importLedger is not None:
+                importLedger.addSourceFile(detailsFileName, fileName)
+            fileName = detailsFileName
 
         if tableName.lower() not in doNotImportList:
 
+            if (
+                getParallelLoads(args) > 1
+                or getattr(args, "mergeloads", False)
+                or isParquetLoad(args)
+                or importLedger is not None
+            ):
+                # The file is imported later on by importCSVsToBQParallel
+                loadFiles.append((tableName, fileName))
+                continue
+
             # Import the given CSV fileName into
             print("\nThe filename {} is being imported to Big Query.".format(fileName))
 
@@ -564,6 +854,7 @@ def importAllCSVsToBQ(
                 tableSchemas,
                 args,
                 importresults,
+                runJournal,
             )
 
         else:
@@ -574,60 +865,575 @@ def importAllCSVsToBQ(
                 )
             )
 
+    if importLedger is not None:
+        # The rows of the PKEYs found in new and changed files are replaced
+        loadFiles = getIncrementalLoadFiles(
+            loadFiles, importLedger, skipLeadingRows, tableSchemas, args
+        )
+
+    if len(loadFiles) > 0:
+
+        if getattr(args, "mergeloads", False):
+            # One load job per target table with all of its files
+            loadUnits = groupLoadFilesByTable(loadFiles)
+        else:
+            # One load job per file
+            loadUnits = [(tableName, [fileName]) for tableName, fileName in loadFiles]
+
+        importresults = importCSVsToBQParallel(
+            gcpProjectName,
+            bqDataset,
+            loadUnits,
+            skipLeadingRows,
+            tableSchemas,
+            args,
+            importresults,
+            importLedger,
+            runJournal,
+        )
+
+    if importLedger is not None:
+        importLedger.save()
+
     return True, importresults
 
 
-def importCSVToBQ(
+def getIncrementalLoadFiles(
+    loadFiles, importLedger, skipLeadingRows, tableSchemas, args
+):
+    # Deletes from each table the rows of the PKEYs found in the files to be imported, so new and changed collections replace the previous import.
+    # The files of a table whose rows could not be deleted are not imported to avoid duplicated rows
+
+    incrementalLoadFiles = []
+
+    for tableName, fileNames in groupLoadFilesByTable(loadFiles):
+
+        tableHeader = [schemaField.name for schemaField in tableSchemas.get(tableName, [])]
+        tablePkeys = set()
+
+        for fileName in fileNames:
+            filePkeys = import_ledger.getFilePkeys(
+                fileName,
+                tableHeader,
+                skipLeadingRows,
+                getLoadFieldDelimiter(tableName, args),
+            )
+            importLedger.addFile(fileName, filePkeys)
+            tablePkeys.update(filePkeys)
+
+        if importLedger.deleteTablePkeys(tableName, tablePkeys):
+            incrementalLoadFiles.extend(
+                [(tableName, fileName) for fileName in fileNames]
+            )
+        else:
+            print(
+                'The files of the table "{}" are being SKIPPED to avoid duplicated rows. They will be imported by the next run.\n'.format(
+                    tableName
+                )
+            )
+
+    return incrementalLoadFiles
+
+
+def groupLoadFilesByTable(loadFiles):
+    # Groups a list of (tableName, fileName) by target table keeping the file order. Returns a list of (tableName, [fileNames])
+
+    tableFiles = {}
+
+    for tableName, fileName in loadFiles:
+        tableFiles.setdefault(tableName, []).append(fileName)
+
+    return list(tableFiles.items())
+
+
+class MergedCSVStream(io.RawIOBase):
+    # Read only stream with the data of several Optimus Prime files of the same table, one after the other.
+    # The leading lines (empty line and CSV header) of each file are dropped while reading, so no consolidated file is written to disk.
+    # Only one block of one file is kept in memory at a time and the number of data lines of each file is counted in rowCounts.
+    # The resumable upload seeks back to the last byte received by Big Query when a chunk fails. The stream goes back to
+    # any position already read by reopening the file of that position, so the chunk is sent again
+
+    def __init__(self, fileNames, skipLeadingRows):
+        self.fileNames = list(fileNames)
+        self.skipLeadingRows = skipLeadingRows
+        self.rowCounts = {fileName: 0 for fileName in self.fileNames}
+        # [stream position, offset of the data in the file, length or None while it is read, 1 if a line end was added]
+        # of every file opened, in the same order as fileNames
+        self._segments = []
+        self._fileIndex = -1
+        self._currentFile = None
+        self._lastByte = b"\n"
+        self._buffer = b""
+        # Stream position of the next byte returned and of the byte after the buffer
+        self._position = 0
+        self._readPosition = 0
+        # The lines are counted only once, also when the stream goes back
+        self._countedPosition = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+
+        if whence == io.SEEK_CUR:
+            offset = self._position + offset
+        elif whence == io.SEEK_END:
+            # The length is only known once all files are read
+            while self._buffer or self._fillBuffer():
+                self._position = self._readPosition
+                self._buffer = b""
+            offset = self._position + offset
+
+        if offset < 0:
+            raise ValueError("Negative seek position {}".format(offset))
+
+        if offset < self._position:
+            self._reopenAt(offset)
+        elif offset <= self._readPosition:
+            self._buffer = self._buffer[offset - self._position :]
+            self._position = offset
+        else:
+            # Forward beyond the buffer. The data in between is read and dropped
+            while self._position < offset and self.read(
+                min(offset - self._position, MERGED_LOAD_BLOCK_SIZE)
+            ):
+                pass
+
+        return self._position
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def readall(self):
+        return self.read(-1)
+
+    def read(self, size=-1):
+        # Returns exactly size bytes unless the end of the last file is reached
+        chunks = []
+        remaining = size
+
+        while size is None or size < 0 or remaining > 0:
+
+            if not self._buffer and not self._fillBuffer():
+                break
+
+            if size is None or size < 0:
+                chunk = self._buffer
+            else:
+                chunk = self._buffer[:remaining]
+                remaining = remaining - len(chunk)
+
+            self._buffer = self._buffer[len(chunk) :]
+            chunks.append(chunk)
+
+        data = b"".join(chunks)
+        self._position = self._position + len(data)
+
+        return data
+
+    def close(self):
+        self._closeCurrentFile()
+        super().close()
+
+    def _closeCurrentFile(self):
+        if self._currentFile is not None:
+            self._currentFile.close()
+            self._currentFile = None
+
+    def _openFile(self, fileIndex, fileOffset=None):
+        # Opens a file at the given offset of the file or, the first time, after its leading lines
+
+        self._fileIndex = fileIndex
+        self._currentFile = collection_archive.openCollectionFile(
+            self.fileNames[fileIndex], "rb"
+        )
+        self._lastByte = b"\n"
+
+        if fileOffset is not None:
+            skipFileBytes(self._currentFile, fileOffset)
+            return
+
+        # Skipping the leading lines of the file
+        dataOffset = 0
+        for lineNumber in range(self.skipLeadingRows):
+            dataOffset = dataOffset + len(self._currentFile.readline())
+
+        self._segments.append([self._readPosition, dataOffset, None, 0])
+
+    def _reopenAt(self, position):
+        # Goes back to a position already read
+
+        self._closeCurrentFile()
+
+        for fileIndex, (start, dataOffset, length, addedLineEnd) in enumerate(
+            self._segments
+        ):
+            if length is None or position < start + length:
+                break
+
+        self._position = position
+        self._readPosition = position
+        self._buffer = b""
+
+        if length is not None and position - start >= length - addedLineEnd:
+            # Only the line end added after the file is left
+            self._fileIndex = fileIndex
+            self._buffer = b"\n"
+            self._readPosition = position + 1
+            return
+
+        self._openFile(fileIndex, dataOffset + position - start)
+
+    def _addToBuffer(self, block):
+        # Counts the lines not counted before and moves the read position
+
+        newBytes = block[max(self._countedPosition - self._readPosition, 0) :]
+        self.rowCounts[self.fileNames[self._fileIndex]] += newBytes.count(b"\n")
+
+        self._buffer = block
+        self._readPosition = self._readPosition + len(block)
+        self._countedPosition = max(self._countedPosition, self._readPosition)
+
+    def _fillBuffer(self):
+        # Loads the next block of data into the buffer. Returns False when all files were read
+
+        while True:
+
+            if self._currentFile is None:
+
+                if self._fileIndex + 1 >= len(self.fileNames):
+                    return False
+
+                if self._fileIndex + 1 < len(self._segments):
+                    # Going forward again after a seek to a file read before
+                    self._openFile(
+                        self._fileIndex + 1, self._segments[self._fileIndex + 1][1]
+                    )
+                else:
+                    self._openFile(self._fileIndex + 1)
+
+            block = self._currentFile.read(MERGED_LOAD_BLOCK_SIZE)
+
+            if block:
+                self._lastByte = block[-1:]
+                self._addToBuffer(block)
+                return True
+
+            self._closeCurrentFile()
+
+            segment = self._segments[self._fileIndex]
+            addLineEnd = self._lastByte != b"\n"
+
+            if segment[2] is None:
+                segment[2] = self._readPosition - segment[0] + int(addLineEnd)
+                segment[3] = int(addLineEnd)
+
+            # Making sure the last line of a file is not glued to the first line of the next one
+            if addLineEnd:
+                self._lastByte = b"\n"
+                self._addToBuffer(b"\n")
+                return True
+
+
+def getCSVRecordCounts(fileNames, skipLeadingRows, fieldDelimiter, lineCounts):
+    # Number of CSV records of each file after its leading lines. Line ends inside quoted values do not start a new record.
+    # The line counts are kept when the files cannot be read as CSV
+
+    if len(fieldDelimiter) != 1:
+        return lineCounts
+
+    recordCounts = {}
+
+    try:
+        for fileName in fileNames:
+
+            with collection_archive.openCollectionFile(fileName, "rb") as csvFile:
+
+                for lineNumber in range(skipLeadingRows):
+                    csvFile.readline()
+
+                recordCounts[fileName] = sum(
+                    1
+                    for record in csv.reader(
+                        io.TextIOWrapper(
+                            csvFile, encoding="utf-8", errors="replace", newline=""
+                        ),
+                        delimiter=fieldDelimiter,
+                    )
+                    if record
+                )
+
+    except (OSError, csv.Error) as countErr:
+        print(
+            "\nWARNING: The rows of each file could not be counted. Error: {}\n".format(
+                countErr
+            )
+        )
+        return lineCounts
+
+    return recordCounts
+
+
+def skipFileBytes(openFile, offset):
+    # Moves an open file to an offset, reading the data before it when the file cannot seek
+
+    if openFile.seekable():
+        openFile.seek(offset)
+        return
+
+    while offset > 0:
+        block = openFile.read(min(offset, MERGED_LOAD_BLOCK_SIZE))
+        if not block:
+            break
+        offset = offset - len(block)
+
+
+def getParallelLoads(args):
+    # Number of Big Query load jobs allowed to run at the same time. -parallelloads 1 keeps the one by one import
+
+    try:
+        return max(int(getattr(args, "parallelloads", 1)), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def importCSVsToBQParallel(
     gcpProjectName,
     bqDataset,
-    tableName,
-    fileName,
+    loadUnits,
     skipLeadingRows,
-    autoDetect,
     tableSchemas,
     args,
     importresults,
+    importLedger=None,
+    runJournal=None,
 ):
-    # This function will import the CSV file into the Big Query using the proper project.dataset.tablename
-    # A Big Query Job is created for it
+    # This function submits the load jobs for a list of (tableName, [fileNames]) keeping up to -parallelloads jobs running in Big Query.
+    # A single file is uploaded as it is, several files of the same table are streamed as one upload by MergedCSVStream.
+    # All running jobs are polled together and the result of each file is reported into importresults as soon as its job finishes
 
-    # Getting table schema
-    try:
-        schema = tableSchemas[tableName]
-    except KeyError:
-        # In case there is not expected table schema found in getBQJobConfig function
-        print(
-            '\nWARNING: The filename "{}" could not be imported to Big Query.'.format(
-                fileName
-            )
+    maxParallelLoads = getParallelLoads(args)
+
+    print(
+        "\nImporting {} files to Big Query with {} load jobs and up to {} parallel load jobs\n".format(
+            sum([len(fileNames) for tableName, fileNames in loadUnits]),
+            len(loadUnits),
+            maxParallelLoads,
         )
-        print(
-            'The table name "{}" cannot be imported because it does not have table schema in transformers.json. So, it will be skipped.\n'.format(
-                tableName
+    )
+
+    pendingLoads = deque(loadUnits)
+    runningLoads = []
+
+    while pendingLoads or runningLoads:
+
+        # Filling up the free slots with new load jobs
+        while pendingLoads and len(runningLoads) < maxParallelLoads:
+
+            tableName, fileNames = pendingLoads.popleft()
+            fileName = ", ".join(fileNames)
+
+            # Getting table schema
+            try:
+                schema = tableSchemas[tableName]
+            except KeyError:
+                # In case there is not expected table schema found in getBQJobConfig function
+                print(
+                    '\nWARNING: The filename "{}" could not be imported to Big Query.'.format(
+                        fileName
+                    )
+                )
+                print(
+                    'The table name "{}" cannot be imported because it does not have table schema in transformers.json. So, it will be skipped.\n'.format(
+                        tableName
+                    )
+                )
+                continue
+
+            # The OPKEYLOG import tracks the tool usage
+            client = get_bigqueryClient(
+                gcpProjectName, str(tableName).lower() == "opkeylog"
             )
-        )
-        return False
 
-    if str(tableName).lower() == "opkeylog":
-        # Construct a BigQuery client object with API Call to track Tool usage
-        client = bigquery.Client(
-            client_info=set_client_info.get_http_client_info(), project=gcpProjectName
+            table_id = getLoadTableId(client, gcpProjectName, bqDataset, tableName)
+
+            print("\nThe filename {} is being imported to Big Query.".format(fileName))
+
+            # Rows of each file when they are counted before the upload
+            fileRowCounts = None
+
+            try:
+                if isParquetLoad(args):
+                    # The files are converted to a single compressed Parquet upload
+                    source_file, fileRowCounts, schema = getParquetBufferFromFiles(
+                        fileNames,
+                        schema,
+                        skipLeadingRows,
+                        getLoadFieldDelimiter(tableName, args),
+                    )
+                    job_config = getLoadJobConfig(
+                        tableName,
+                        schema,
+                        skipLeadingRows,
+                        args,
+                        bigquery.SourceFormat.PARQUET,
+                    )
+                elif getattr(args, "mergeloads", False):
+                    # The leading rows are dropped by the stream for every file
+                    source_file = MergedCSVStream(fileNames, skipLeadingRows)
+                    fileRowCounts = source_file.rowCounts
+                    job_config = getLoadJobConfig(tableName, schema, 0, args)
+                else:
+                    source_file = collection_archive.openCollectionFile(
+                        fileNames[0], "rb"
+                    )
+                    job_config = getLoadJobConfig(
+                        tableName, schema, skipLeadingRows, args
+                    )
+
+                with source_file:
+                    load_job = client.load_table_from_file(
+                        source_file, table_id, job_config=job_config
+                    )
+            except Exception as importErr:
+                print(
+                    '\n FAILED: Optimus Prime could not import the filename "{}" into "{}" because of the error "{}".\n'.format(
+                        fileName, table_id, importErr
+                    )
+                )
+                print("   Table Schema = {}".format(schema))
+                importresults = populateLoadJobBT(
+                    tableName, fileNames, None, importresults, args
+                )
+                continue
+
+            runningLoads.append(
+                (load_job, tableName, fileNames, fileRowCounts, table_id)
+            )
+
+        if not runningLoads:
+            continue
+
+        # Polling all running load jobs
+        stillRunning = []
+        for runningLoad in runningLoads:
+
+            load_job, tableName, fileNames, fileRowCounts, table_id = runningLoad
+
+            try:
+                if not load_job.done():
+                    stillRunning.append(runningLoad)
+                    continue
+                load_job.result()
+            except Exception as genericLoadErr:
+                print(
+                    '\n FAILED: Optimus Prime could not import the filename "{}" into "{}" because of the error "{}".\n'.format(
+                        ", ".join(fileNames), table_id, genericLoadErr
+                    )
+                )
+                importresults = populateLoadJobBT(
+                    tableName, fileNames, None, importresults, args
+                )
+                continue
+
+            print("Loaded {} rows into: {}".format(load_job.output_rows, table_id))
+
+            if fileRowCounts is None:
+                fileRowCounts = {fileNames[0]: load_job.output_rows or 0}
+            elif sum(fileRowCounts.values()) != (load_job.output_rows or 0):
+                # Quoted values with line ends (I.E: SQL text) were counted as rows by the merged upload
+                fileRowCounts = getCSVRecordCounts(
+                    fileNames,
+                    skipLeadingRows,
+                    getLoadFieldDelimiter(tableName, args),
+                    fileRowCounts,
+                )
+
+            importresults = populateLoadJobBT(
+                tableName, fileNames, fileRowCounts, importresults, args
+            )
+
+            if importLedger is not None:
+                for loadedFileName in fileNames:
+                    importLedger.recordFile(loadedFileName, tableName)
+
+            if runJournal is not None:
+                for loadedFileName in fileNames:
+                    runJournal.recordLoadedFile(
+                        loadedFileName, fileRowCounts.get(loadedFileName, 0)
+                    )
+
+        # Nothing finished in this round, so wait before polling again
+        if len(stillRunning) == len(runningLoads):
+            time.sleep(LOAD_JOB_POLL_INTERVAL)
+
+        runningLoads = stillRunning
+
+    return importresults
+
+
+def populateLoadJobBT(tableName, fileNames, fileRowCounts, importresults, args):
+    # Reports the result of one load job for each one of its files. fileRowCounts of None means the load job FAILED
+
+    for fileName in fileNames:
+
+        if fileRowCounts is None:
+            rowsimported = -1
+        else:
+            rowsimported = fileRowCounts.get(fileName, 0)
+
+        importresults = populateBT(
+            tableName,
+            "isFile",
+            "importDataframeToBQ",
+            fileName,
+            "fromloadjob",
+            rowsimported,
+            importresults,
+            args,
         )
-    else:
-        # Construct a BigQuery client object.
-        client = bigquery.Client(project=gcpProjectName)
 
+    return importresults
+
+
+def getLoadTableId(client, gcpProjectName, bqDataset, tableName):
     # Adding Project and Dataset based on arguments
     # table_id to the ID of the table to create.
+
     if gcpProjectName is not None:
-        table_id = str(gcpProjectName) + "." + str(bqDataset) + "." + str(tableName)
+        return str(gcpProjectName) + "." + str(bqDataset) + "." + str(tableName)
 
     # In case projectname was passed as argument. Then, it tries to get the default project for the [service] account being used
-    else:
-        table_id = str(client.project) + "." + str(bqDataset) + "." + str(tableName)
+    return str(client.project) + "." + str(bqDataset) + "." + str(tableName)
+
+
+def getLoadFieldDelimiter(tableName, args):
+    # Separator of the CSV files for a given table
+
+    # OP Internal Configuration Files
+    if str(tableName).lower() in (
+        "optimusconfig_bms_machinesizes",
+        "optimusconfig_network_to_gcp",
+    ):
+        return ","
+
+    return str(args.sep)
+
+
+def getLoadJobConfig(
+    tableName, schema, skipLeadingRows, args, sourceFormat=bigquery.SourceFormat.CSV
+):
+    # Big Query load job configuration used to import Optimus Prime files
 
     schema_updateOptions = []
-    field_delimiter = str(args.sep)
     write_disposition = str(args.loadtype).upper()
 
     if str(tableName).lower() == "opkeylog":
@@ -640,19 +1446,355 @@ def importCSVToBQ(
         "optimusconfig_network_to_gcp",
     ):
         write_disposition = "WRITE_TRUNCATE"
-        field_delimiter = ","
 
-    job_config = bigquery.LoadJobConfig(
+    if sourceFormat == bigquery.SourceFormat.PARQUET:
+        # Parquet files carry their own column types and have no leading rows
+        return bigquery.LoadJobConfig(
+            schema=schema,
+            schema_update_options=schema_updateOptions,
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=write_disposition,
+        )
+
+    return bigquery.LoadJobConfig(
         schema=schema,
         skip_leading_rows=skipLeadingRows,
         schema_update_options=schema_updateOptions,
         # The source format defaults to CSV, so the line below is optional.
         source_format=bigquery.SourceFormat.CSV,
-        field_delimiter=field_delimiter,
+        field_delimiter=getLoadFieldDelimiter(tableName, args),
         write_disposition=write_disposition,
     )
 
-    with open(fileName, "rb") as source_file:
+
+def isParquetLoad(args):
+
+    return str(getattr(args, "loadformat", "CSV")).upper() == "PARQUET"
+
+
+class ParquetConversionError(ValueError):
+    # A column has values that cannot be converted to the type of its Big Query schema field
+
+    def __init__(self, fieldName, conversionErr):
+
+        super().__init__(
+            'The column "{}" has values that cannot be converted: {}'.format(
+                fieldName, conversionErr
+            )
+        )
+        self.fieldName = fieldName
+
+
+def getStringFallbackSchema(schema, fieldName):
+    # The schema with the given field loaded as STRING
+
+    return [
+        bigquery.SchemaField(
+            schemaField.name,
+            "STRING",
+            mode=schemaField.mode,
+            description=schemaField.description,
+        )
+        if schemaField.name == fieldName
+        else schemaField
+        for schemaField in schema
+    ]
+
+
+class ParquetSpoolFile(io.RawIOBase):
+    # Compressed Parquet file of a load job. It is kept in memory up to PARQUET_SPOOL_BYTES and in a temporary file above
+    # that, so the memory used does not grow with the number of files of a table. The Big Query client only uploads
+    # streams opened in rb mode, which the spooled file is not
+
+    def __init__(self):
+        self._spoolFile = tempfile.SpooledTemporaryFile(max_size=PARQUET_SPOOL_BYTES)
+
+    def write(self, data):
+        return self._spoolFile.write(data)
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._spoolFile.seek(offset, whence)
+
+    def tell(self):
+        return self._spoolFile.tell()
+
+    def readinto(self, buffer):
+        data = self._spoolFile.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self._spoolFile.close()
+        super().close()
+
+
+def getParquetBufferFromFiles(fileNames, schema, skipLeadingRows, fieldDelimiter):
+    # Reads the CSV files of one table and writes them as row groups of a single compressed Parquet file (a ParquetSpoolFile).
+    # The values are read as text (like a CSV load job) and converted to the types of the Big Query schema.
+    # Columns with values that cannot be converted are loaded as STRING.
+    # Returns the buffer, the number of rows of each file and the schema to load it with
+
+    while True:
+        try:
+            buffer, fileRowCounts = writeParquetBufferFromFiles(
+                fileNames, schema, skipLeadingRows, fieldDelimiter
+            )
+            return buffer, fileRowCounts, schema
+        except ParquetConversionError as conversionErr:
+            print(
+                "\nWARNING: {}. The column is imported as STRING.\n".format(
+                    conversionErr
+                )
+            )
+            schema = getStringFallbackSchema(schema, conversionErr.fieldName)
+
+
+def writeParquetBufferFromFiles(fileNames, schema, skipLeadingRows, fieldDelimiter):
+
+    import pyarrow.parquet as pq
+
+    buffer = ParquetSpoolFile()
+    fileRowCounts = {}
+    writer = None
+
+    try:
+        for fileName in fileNames:
+
+            try:
+                df = collection_archive.readCollectionCSV(
+                    fileName,
+                    sep=fieldDelimiter,
+                    skiprows=skipLeadingRows,
+                    header=None,
+                    dtype=str,
+                    keep_default_na=False,
+                    na_values=[""],
+                    index_col=False,
+                )
+            except pd.errors.EmptyDataError:
+                df = pd.DataFrame()
+
+            if len(df.columns) > len(schema):
+                raise ValueError(
+                    "The filename {} has {} columns but the table schema has {} columns".format(
+                        fileName, len(df.columns), len(schema)
+                    )
+                )
+
+            df.columns = [schemaField.name for schemaField in schema][: len(df.columns)]
+
+            arrowTable = getArrowTableFromDataframe(df, schema)
+
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    buffer, arrowTable.schema, compression=PARQUET_COMPRESSION
+                )
+
+            writer.write_table(arrowTable)
+            fileRowCounts[fileName] = len(df)
+
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        buffer.close()
+        raise
+
+    if writer is not None:
+        writer.close()
+
+    buffer.seek(0)
+
+    return buffer, fileRowCounts
+
+
+def getParquetBufferFromDataframe(df, schema):
+    # Writes the dataframe as a compressed Parquet file (a ParquetSpoolFile) using the types of the Big Query schema.
+    # Columns with values that cannot be converted are loaded as STRING. Returns the buffer and the schema to load it with
+
+    import pyarrow.parquet as pq
+
+    while True:
+        try:
+            arrowTable = getArrowTableFromDataframe(df, schema)
+            break
+        except ParquetConversionError as conversionErr:
+            print(
+                "\nWARNING: {}. The column is imported as STRING.\n".format(
+                    conversionErr
+                )
+            )
+            schema = getStringFallbackSchema(schema, conversionErr.fieldName)
+
+    buffer = ParquetSpoolFile()
+    pq.write_table(arrowTable, buffer, compression=PARQUET_COMPRESSION)
+    buffer.seek(0)
+
+    return buffer, schema
+
+
+def getArrowTableFromDataframe(df, schema):
+    # Builds an Arrow table with one column per Big Query schema field. Dataframe columns are matched by name ignoring case
+    # and schema fields that are not in the dataframe are loaded as NULL
+
+    import pyarrow as pa
+
+    dfColumns = {str(column).upper(): column for column in df.columns}
+
+    arrays = []
+    fields = []
+
+    for schemaField in schema:
+
+        column = dfColumns.get(str(schemaField.name).upper())
+
+        if column is None:
+            values = pd.Series([None] * len(df), index=df.index, dtype=object)
+        else:
+            values = df[column]
+
+        try:
+            arrowType, arrowValues = getArrowColumn(values, schemaField.field_type)
+            if not isinstance(arrowValues, pa.Array):
+                arrowValues = pa.array(arrowValues, type=arrowType, from_pandas=True)
+            arrays.append(arrowValues)
+        except (ArithmeticError, TypeError, ValueError) as conversionErr:
+            raise ParquetConversionError(schemaField.name, conversionErr)
+
+        fields.append(pa.field(str(schemaField.name), arrowType))
+
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def getArrowColumn(values, fieldType):
+    # Converts a dataframe column to the Arrow type matching a Big Query type. Returns (arrowType, values or Arrow array)
+
+    import pyarrow as pa
+
+    fieldType = str(fieldType).upper()
+    notNull = values.notna()
+
+    if fieldType in PARQUET_TYPED_FIELD_TYPES:
+        # The values read as missing by the parse (and by -schematypes INFER) are NULL
+        notNull = notNull & ~values.astype(str).str.strip().isin(
+            rules_engine.CSV_NA_VALUES
+        )
+
+    if fieldType in ("INTEGER", "INT64"):
+        numbers = pd.to_numeric(getStrippedValues(values, notNull))
+        return pa.int64(), numbers.astype("Int64")
+
+    elif fieldType in ("FLOAT", "FLOAT64"):
+        numbers = pd.to_numeric(getStrippedValues(values, notNull))
+        return pa.float64(), numbers.astype(float)
+
+    elif fieldType in ("NUMERIC", "DECIMAL"):
+        # Big Query NUMERIC keeps 9 decimal digits. Values are rounded half away from zero like Big Query does
+        return pa.decimal128(38, 9), getNumericArray(getStrippedValues(values, notNull))
+
+    elif fieldType == "TIMESTAMP":
+        timestamps = pd.to_datetime(getStrippedValues(values, notNull), utc=True)
+        return pa.timestamp("us", tz="UTC"), timestamps
+
+    elif fieldType in ("BOOLEAN", "BOOL"):
+        booleans = (
+            getStrippedValues(values, notNull)
+            .astype(str)
+            .str.lower()
+            .map({"true": True, "false": False, "1": True, "0": False})
+        )
+        if (booleans.isna() & notNull).any():
+            raise ValueError("The values are not true, false, 1 or 0")
+        return pa.bool_(), booleans.where(notNull, None)
+
+    # STRING and any other type are loaded as text
+    return pa.string(), values.astype(str).where(notNull, None)
+
+
+def getNumericArray(values):
+    # Converts the text of the values to decimal128(38, 9) with the Arrow compute functions
+
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    text = pa.array(values, type=pa.string(), from_pandas=True)
+
+    try:
+        # The text is read with all its decimal digits before rounding (up to 38 digits on each side of the point)
+        numbers = text.cast(pa.decimal256(76, 38))
+    except pa.ArrowInvalid:
+        # Values with more than 38 decimal digits. I.E: very small numbers written without an exponent
+        return pa.array(
+            [
+                decimal.Decimal(value).quantize(NUMERIC_SCALE, context=NUMERIC_CONTEXT)
+                if value is not None
+                else None
+                for value in text.to_pylist()
+            ],
+            type=pa.decimal128(38, 9),
+        )
+
+    # half_towards_infinity rounds the ties away from zero
+    return pc.round(numbers, ndigits=9, round_mode="half_towards_infinity").cast(
+        pa.decimal128(38, 9)
+    )
+
+
+def getStrippedValues(values, notNull):
+    # Text of the not null values without surrounding spaces
+
+    return values.astype(str).str.strip().where(notNull, None)
+
+
+def importCSVToBQ(
+    gcpProjectName,
+    bqDataset,
+    tableName,
+    fileName,
+    skipLeadingRows,
+    autoDetect,
+    tableSchemas,
+    args,
+    importresults,
+    runJournal=None,
+):
+    # This function will import the CSV file into the Big Query using the proper project.dataset.tablename
+    # A Big Query Job is created for it
+
+    # Getting table schema
+    try:
+        schema = tableSchemas[tableName]
+    except KeyError:
+        # In case there is not expected table schema found in getBQJobConfig function
+        print(
+            '\nWARNING: The filename "{}" could not be imported to Big Query.'.format(
+                fileName
+            )
+        )
+        print(
+            'The table name "{}" cannot be imported because it does not have table schema in transformers.json. So, it will be skipped.\n'.format(
+                tableName
+            )
+        )
+        return False
+
+    # The OPKEYLOG import tracks the tool usage
+    client = get_bigqueryClient(gcpProjectName, str(tableName).lower() == "opkeylog")
+
+    table_id = getLoadTableId(client, gcpProjectName, bqDataset, tableName)
+
+    job_config = getLoadJobConfig(tableName, schema, skipLeadingRows, args)
+
+    with collection_archive.openCollectionFile(fileName, "rb") as source_file:
 
         try:
             load_job = client.load_table_from_file(
@@ -700,12 +1842,8 @@ def importCSVToBQ(
         )
         return False, importresults
 
-    destination_table = client.get_table(table_id)  # Make an API request.
-    print(
-        "Loaded {} rows into: {}".format(
-            destination_table.num_rows, destination_table.reference
-        )
-    )
+    # The rows written by this load job, not the table total
+    print("Loaded {} rows into: {}".format(load_job.output_rows, table_id))
 
     importresults = populateBT(
         tableName,
@@ -713,11 +1851,15 @@ def importCSVToBQ(
         "importDataframeToBQ",
         fileName,
         "fromimportCSVToBQ",
-        destination_table.num_rows,
+        load_job.output_rows or 0,
         importresults,
         args,
     )
 
+    # A resumed run does not import this file again
+    if runJournal is not None:
+        runJournal.recordLoadedFile(fileName, load_job.output_rows)
+
     # returns True if processing is successfully
     return True, importresults
 
@@ -727,7 +1869,7 @@ def getTableRef(dataset, tableName, projectName):
     if projectName:
         return f"{projectName}.{dataset}.{tableName}"
 
-    return f"{client.project}.{dataset}.{tableName}"
+    return f"{get_bigqueryClient(projectName, False).project}.{dataset}.{tableName}"
 
 
 def getObjNameFromFiles(fileName, splitterChar, pos):
@@ -775,7 +1917,7 @@ def createDataSet(datasetName, gcpProjectName):
     # Always try to create the dataset
 
     # Construct a BigQuery client object.
-    client = bigquery.Client(project=gcpProjectName)
+    client = get_bigqueryClient(gcpProjectName, False)
     if gcpProjectName is None:
         # In case the user did NOT pass the project name in the arguments
         dataset_id = "{}.{}".format(client.project, datasetName)
@@ -804,7 +1946,7 @@ def createDataSet(datasetName, gcpProjectName):
 def deleteDataSet(datasetName, gcpProjectName):
 
     # Construct a BigQuery client object.
-    client = bigquery.Client()
+    client = get_bigqueryClient(gcpProjectName, False)
 
     # Set dataset_id=datasetName to the ID of the dataset to create.
     if gcpProjectName is None:
@@ -834,13 +1976,13 @@ def deleteDataSet(datasetName, gcpProjectName):
         print("Failed to delete dataset {}.".format(dataset_id))
 
 
-def insertErrors(invalidfiles, op_df, gcpProjectName, bq_dataset):
+def insertErrors(invalidfiles, op_df, gcpProjectName, bq_dataset, loadDate=None):
     from google.cloud.exceptions import NotFound
 
     tableid = "operrors"
     try:
         pkey = op_df["PKEY"].iloc[0]
-        bq_client = bigquery.Client()
+        bq_client = get_bigqueryClient(gcpProjectName, False)
         try:
             table = bq_client.get_table(
                 "{}.{}.{}".format(gcpProjectName, bq_dataset, tableid)
@@ -861,7 +2003,7 @@ def insertErrors(invalidfiles, op_df, gcpProjectName, bq_dataset):
             basename = os.path.basename(filename)
             rows_to_insert = {
                 "PKEY": pkey,
-                "LOADDATE": str(ct),
+                "LOADDATE": str(loadDate or datetime.datetime.now()),
                 "FILENAME": basename,
                 "ERROR": error,
             }
@@ -874,6 +2016,18 @@ def insertErrors(invalidfiles, op_df, gcpProjectName, bq_dataset):
         )
 
 
+class ImportResult(NamedTuple):
+    # One line of the import summary: a file (or a PKEY of a dataframe) imported to a table
+    tableName: str
+    pkey: str
+    status: str
+    rows: int
+
+
+# Columns of the import summary, in ImportResult order
+IMPORT_RESULT_COLUMNS = ["Target Table", "Distinct Pkey", "Import Status", "Loaded rows"]
+
+
 def populateBT(
     tableName,
     df,
@@ -884,116 +2038,47 @@ def populateBT(
     importresults,
     args,
 ):
-    # Fuction to populate the importresults list which will be used to print using Beautiful Table
-    # rowsimported of <0 is used to indicate a FAILED status
-    tmpdataFrame = pd.DataFrame()
+    # Fuction to populate the importresults list of ImportResult which will be used to print using Beautiful Table
+    # rowsimported of <0 is used to indicate a FAILED status, otherwise it is the number of rows written by the load job
 
     if "opConfig/" in invalidfiles:
         return importresults
 
     if btsource == "invalidfiles":  # when called from runMain
-        for fileName, error in invalidfiles.items():
-            tmpdataFrame = pd.DataFrame()
-            tmpdataFramedict = {
-                "Target Table": getObjNameFromFiles(fileName, "__", 1),
-                "Distinct Pkey": getObjNameFromFiles(fileName, "__", 2),
-                "Import Status": "FAILED",
-                "Loaded rows": 0,
-            }
-            tmpdataFrame = tmpdataFrame.append(tmpdataFramedict, ignore_index=True)
-            if len(tmpdataFrame) > 0:
-                importresults = pd.concat(
-                    [importresults, tmpdataFrame], ignore_index=True, axis=0
+        importresults.extend(
+            [
+                ImportResult(
+                    collection_index.getTableName(fileName),
+                    getObjNameFromFiles(os.path.basename(fileName), "__", 2),
+                    "FAILED",
+                    0,
                 )
+                for fileName in invalidfiles
+            ]
+        )
     else:
         if args.fromdataframe:  # when called from importDataframeToBQ
             if dataframeornot is not None:
                 if "PKEY" in df.columns.to_list():
-                    df.reset_index(drop=True, inplace=True)
-                    pkeygroupby = df.groupby(["PKEY"]).size()
-                    pkeycount = pkeygroupby.to_dict()
-                    for pkeyname, pkeyname_rowcount in pkeycount.items():
-                        tmpdataFrame = pd.DataFrame()
-                        tmpdataFramedict = {
-                            "Target Table": tableName,
-                            "Distinct Pkey": pkeyname,
-                            "Import Status": "SUCCESS",
-                            "Loaded rows": pkeyname_rowcount,
-                        }
-                        tmpdataFrame = tmpdataFrame.append(
-                            tmpdataFramedict, ignore_index=True
-                        )
-                        if len(tmpdataFrame) > 0:
-                            importresults = pd.concat(
-                                [importresults, tmpdataFrame], ignore_index=True, axis=0
-                            )
+                    pkeycount = df.groupby(["PKEY"], observed=True).size()
+                    importresults.extend(
+                        [
+                            ImportResult(tableName, pkeyname, "SUCCESS", int(rowcount))
+                            for pkeyname, rowcount in pkeycount.items()
+                        ]
+                    )
 
         else:
             fileName = invalidfiles  # when called from importCSVToBQ
 
             if "opdbt" not in fileName:
+                pkeyname = getObjNameFromFiles(os.path.basename(fileName), "__", 2)
                 if rowsimported >= 0:
-                    if len(importresults) == 0:
-                        tmpdataFrame = pd.DataFrame()
-                        tmpdataFramedict = {
-                            "Target Table": tableName,
-                            "Distinct Pkey": getObjNameFromFiles(fileName, "__", 2),
-                            "Import Status": "SUCCESS",
-                            "Loaded rows": rowsimported,
-                        }
-                        tmpdataFrame = tmpdataFrame.append(
-                            tmpdataFramedict, ignore_index=True
-                        )
-                    else:
-                        if (
-                            tableName in importresults["Target Table"].values
-                            and "SUCCESS" in importresults["Import Status"].values
-                        ):
-                            # this is needed as bq functions check for rows already loaded and not the new ones only
-                            ExistingRowsInDataframe = importresults[
-                                importresults["Target Table"].str.contains(tableName)
-                                & importresults["Import Status"].str.contains("SUCCESS")
-                            ]["Loaded rows"].sum()
-                            newrows4dataframe = rowsimported - ExistingRowsInDataframe
-
-                            tmpdataFrame = pd.DataFrame()
-                            tmpdataFramedict = {
-                                "Target Table": tableName,
-                                "Distinct Pkey": getObjNameFromFiles(fileName, "__", 2),
-                                "Import Status": "SUCCESS",
-                                "Loaded rows": newrows4dataframe,
-                            }
-                            tmpdataFrame = tmpdataFrame.append(
-                                tmpdataFramedict, ignore_index=True
-                            )
-                        else:
-                            tmpdataFrame = pd.DataFrame()
-                            tmpdataFramedict = {
-                                "Target Table": tableName,
-                                "Distinct Pkey": getObjNameFromFiles(fileName, "__", 2),
-                                "Import Status": "SUCCESS",
-                                "Loaded rows": rowsimported,
-                            }
-                            tmpdataFrame = tmpdataFrame.append(
-                                tmpdataFramedict, ignore_index=True
-                            )
-
-                else:
-                    tmpdataFrame = pd.DataFrame()
-                    tmpdataFramedict = {
-                        "Target Table": tableName,
-                        "Distinct Pkey": getObjNameFromFiles(fileName, "__", 2),
-                        "Import Status": "FAILED",
-                        "Loaded rows": 0,
-                    }
-                    tmpdataFrame = tmpdataFrame.append(
-                        tmpdataFramedict, ignore_index=True
-                    )
-
-                if len(tmpdataFrame) > 0:
-                    importresults = pd.concat(
-                        [importresults, tmpdataFrame], ignore_index=True, axis=0
+                    importresults.append(
+                        ImportResult(tableName, pkeyname, "SUCCESS", int(rowsimported))
                     )
+                else:
+                    importresults.append(ImportResult(tableName, pkeyname, "FAILED", 0))
 
     return importresults
 
@@ -1004,17 +2089,14 @@ def printBTResults(importresults):
     # Create and load the output bt table
     btImportLogFinalTable = BeautifulTable()
     btImportLogFinalTable = BeautifulTable(maxwidth=300)
-    btImportLogFinalTable.columns.header = [
-        "Target Table",
-        "Distinct Pkey",
-        "Import Status",
-        "Loaded rows",
-    ]
+    btImportLogFinalTable.columns.header = IMPORT_RESULT_COLUMNS
 
     # To group by table name, import status, count of distinct pkeys and sum of rows
-    if not importresults.empty:
+    if len(importresults) > 0:
+        # The dataframe is built only once from all the collected results
+        importresultsdf = pd.DataFrame(importresults, columns=IMPORT_RESULT_COLUMNS)
         importresultsagg = (
-            importresults.groupby(["Target Table", "Import Status"])["Loaded rows"]
+            importresultsdf.groupby(["Target Table", "Import Status"])["Loaded rows"]
             .agg(["size", "sum"])
             .reset_index(drop=False)
         )
@@ -1028,12 +2110,10 @@ def printBTResults(importresults):
         )
 
         # swap for correcting to match the expected order of columns
-        importresultsfinal = importresultsfinal[
-            ["Target Table", "Distinct Pkey", "Import Status", "Loaded rows"]
-        ]
+        importresultsfinal = importresultsfinal[IMPORT_RESULT_COLUMNS]
 
         # insert into beautiful table
-        for index, row in importresultsfinal.iterrows():
+        for row in importresultsfinal.values.tolist():
             btImportLogFinalTable.rows.append(row)
 
     btImportLogFinalTable.set_style(BeautifulTable.STYLE_BOX_ROUNDED)
@@ -0,0 +1,241 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Ledger of the files imported to a Big Query dataset, used by -incremental.
+# The ledger is the dataset table opimportledger with one row per imported file: file name, target table, PKEYs and content hash.
+# Files already imported with the same content are skipped. Files whose content changed replace the rows of their PKEYs.
+
+import datetime
+import os
+
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from db_assessment import collection_archive, import_db_assessment
+
+LEDGER_TABLE_NAME = "opimportledger"
+
+LEDGER_SCHEMA = [
+    bigquery.SchemaField("FILENAME", "STRING"),
+    bigquery.SchemaField("TABLENAME", "STRING"),
+    bigquery.SchemaField("PKEY", "STRING"),
+    bigquery.SchemaField("CONTENTHASH", "STRING"),
+    bigquery.SchemaField("LOADDATE", "TIMESTAMP"),
+]
+
+# Status of a file compared to the ledger
+FILE_NEW = "NEW"
+FILE_CHANGED = "CHANGED"
+FILE_UNCHANGED = "UNCHANGED"
+
+
+def isIncrementalImport(args):
+
+    return bool(getattr(args, "incremental", False))
+
+
+class ImportLedger:
+    # Files already imported to the dataset and the files imported in this run, to be saved by save()
+
+    def __init__(self, gcpProjectName, bqDataset):
+
+        self.client = import_db_assessment.get_bigqueryClient(gcpProjectName, False)
+        self.ledgerTableId = import_db_assessment.getLoadTableId(
+            self.client, gcpProjectName, bqDataset, LEDGER_TABLE_NAME
+        )
+        self.gcpProjectName = gcpProjectName
+        self.bqDataset = bqDataset
+
+        # {(file name, table name): (content hash, pkeys)} with the last import of each file
+        self.importedFiles = {}
+        # PKEYs of the files to be imported in this run
+        self.filePkeys = {}
+        # {file written by Optimus Prime: collected file it was written from}
+        self.sourceFiles = {}
+        self.newEntries = []
+
+        self.loadLedger()
+
+    def getLedgerKey(self, fileName, tableName):
+        # Files are identified by their name, so the drop folder can be moved or mounted somewhere else
+
+        return os.path.basename(str(fileName)), str(tableName).lower()
+
+    def loadLedger(self):
+
+        try:
+            # The ledger is small, so it is read as a whole without a query
+            ledgerRows = list(self.client.list_rows(self.ledgerTableId))
+        except NotFound:
+            # First incremental import to this dataset
+            return
+
+        lastLoadDates = {}
+
+        for ledgerRow in ledgerRows:
+
+            ledgerKey = (ledgerRow["FILENAME"], str(ledgerRow["TABLENAME"]).lower())
+
+            if (
+                ledgerKey in lastLoadDates
+                and lastLoadDates[ledgerKey] >= ledgerRow["LOADDATE"]
+            ):
+                continue
+
+            lastLoadDates[ledgerKey] = ledgerRow["LOADDATE"]
+            self.importedFiles[ledgerKey] = (
+                ledgerRow["CONTENTHASH"],
+                str(ledgerRow["PKEY"] or ""),
+            )
+
+    def getFileStatus(self, fileName, tableName):
+        # Returns NEW, CHANGED or UNCHANGED for a file to be imported
+
+        ledgerKey = self.getLedgerKey(fileName, tableName)
+
+        if ledgerKey not in self.importedFiles:
+            return FILE_NEW
+
+        if self.importedFiles[ledgerKey][0] == import_db_assessment.getFileContentHash(
+            fileName
+        ):
+            return FILE_UNCHANGED
+
+        return FILE_CHANGED
+
+    def deleteTablePkeys(self, tableName, pkeys):
+        # Deletes the rows of the given PKEYs before their files are imported again
+
+        if len(pkeys) == 0:
+            return True
+
+        tableId = import_db_assessment.getLoadTableId(
+            self.client, self.gcpProjectName, self.bqDataset, tableName
+        )
+
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ArrayQueryParameter("pkeys", "STRING", sorted(pkeys))
+            ]
+        )
+
+        try:
+            self.client.query(
+                "DELETE FROM `{}` WHERE TRIM(CAST(PKEY AS STRING)) IN UNNEST(@pkeys)".format(
+                    tableId
+                ),
+                job_config=job_config,
+            ).result()
+        except NotFound:
+            # Nothing to replace when the table does not exist yet
+            return True
+        except Exception as deleteErr:
+            print(
+                '\nWARNING: The previous rows of the PKEYs {} could not be deleted from "{}". Error: {}'.format(
+                    sorted(pkeys), tableId, deleteErr
+                )
+            )
+            return False
+
+        print(
+            "Deleted the previous rows of {} PKEYs from: {}".format(len(pkeys), tableId)
+        )
+
+        return True
+
+    def addFile(self, fileName, pkeys):
+        # Keeps the PKEYs of a file that is going to be imported
+
+        self.filePkeys[fileName] = set(pkeys)
+
+    def addSourceFile(self, fileName, sourceFileName):
+        # The file is a copy of a collected file (I.E: OPKEYLOG with the import details), so the ledger keeps the hash of the
+        # collected file to find it unchanged in the next run
+
+        self.sourceFiles[fileName] = sourceFileName
+
+    def recordFile(self, fileName, tableName):
+        # Adds an imported file to the ledger. The hash is taken after the import, as the file was loaded
+
+        self.newEntries.append(
+            {
+                "FILENAME": self.getLedgerKey(fileName, tableName)[0],
+                "TABLENAME": str(tableName).lower(),
+                "PKEY": ",".join(sorted(self.filePkeys.get(fileName, set()))),
+                "CONTENTHASH": import_db_assessment.getFileContentHash(
+                    self.sourceFiles.get(fileName, fileName)
+                ),
+                "LOADDATE": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            }
+        )
+
+    def save(self):
+        # Appends the files imported in this run to the ledger table with a single load job
+
+        if len(self.newEntries) == 0:
+            return True
+
+        job_config = bigquery.LoadJobConfig(
+            schema=LEDGER_SCHEMA,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        )
+
+        try:
+            self.client.load_table_from_json(
+                self.newEntries, self.ledgerTableId, job_config=job_config
+            ).result()
+        except Exception as ledgerErr:
+            print(
+                '\nWARNING: The import ledger "{}" could not be updated. The files of this run will be imported again by the next run. Error: {}'.format(
+                    self.ledgerTableId, ledgerErr
+                )
+            )
+            return False
+
+        print(
+            "\nRecorded {} imported files in the import ledger {}".format(
+                len(self.newEntries), self.ledgerTableId
+            )
+        )
+        self.newEntries = []
+
+        return True
+
+
+def getFilePkeys(fileName, tableHeader, skipLeadingRows, fieldDelimiter):
+    # Distinct PKEY values found in a CSV file. Empty when the table has no PKEY column
+
+    upperHeader = [str(header).upper() for header in tableHeader]
+
+    if "PKEY" not in upperHeader:
+        return set()
+
+    pkeyPosition = upperHeader.index("PKEY")
+    pkeys = set()
+
+    with collection_archive.openCollectionFile(fileName, "r") as csvFile:
+
+        for lineNumber, line in enumerate(csvFile):
+
+            if lineNumber < skipLeadingRows or line.strip() == "":
+                continue
+
+            fields = line.split(fieldDelimiter, pkeyPosition + 1)
+
+            if len(fields) > pkeyPosition:
+                pkeys.add(fields[pkeyPosition].strip())
+
+    pkeys.discard("")
+
+    return pkeys
@@ -0,0 +1,167 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Queue of the assessment imports submitted to the API.
+# An upload is stored in its own directory and returns a job id right away. A bounded pool of threads runs the imports and
+# the progress of each job is taken from the journal (finished stages) of its AssessmentRun.
+
+import datetime
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from db_assessment import assessment_run, run_journal
+
+logger = logging.getLogger(__name__)
+
+# Job statuses
+JOB_QUEUED = "QUEUED"
+JOB_RUNNING = "RUNNING"
+JOB_SUCCEEDED = "SUCCEEDED"
+JOB_FAILED = "FAILED"
+
+# Number of imports run at the same time. OP_API_JOB_WORKERS overrides it
+DEFAULT_JOB_WORKERS = 2
+# Finished jobs kept to be reported by /api/jobs/<id>
+MAX_FINISHED_JOBS = 100
+
+
+def getJobWorkers():
+
+    try:
+        return max(int(os.getenv("OP_API_JOB_WORKERS", DEFAULT_JOB_WORKERS)), 1)
+    except ValueError:
+        return DEFAULT_JOB_WORKERS
+
+
+class AssessmentJob:
+    # One import submitted to the API. jobDir has the uploaded files and it is deleted when the job finishes
+
+    def __init__(self, jobDir, config):
+
+        self.jobId = uuid.uuid4().hex
+        self.jobDir = jobDir
+        self.config = config
+        self.status = JOB_QUEUED
+        self.submitted = datetime.datetime.now().isoformat()
+        self.started = None
+        self.finished = None
+        self.error = None
+        self.results = []
+        self.assessmentRun = None
+
+    def getJournal(self):
+        # Journal of the run, kept in memory by its AssessmentRun
+
+        if self.assessmentRun is None or self.assessmentRun.runJournal is None:
+            return None
+
+        return self.assessmentRun.runJournal.journal
+
+    def asDict(self):
+
+        journal = self.getJournal() or {}
+
+        return {
+            "jobId": self.jobId,
+            "status": self.status,
+            "runId": journal.get("runid"),
+            "stages": list(journal.get("stages", [])),
+            "pipelineStages": run_journal.PIPELINE_STAGES,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+            "results": [result._asdict() for result in self.results],
+        }
+
+
+class JobQueue:
+    # Jobs submitted to this API process, run by a pool of getJobWorkers() threads.
+    # newRun creates the AssessmentRun of a job configuration
+
+    def __init__(self, newRun, jobWorkers=None):
+
+        self.newRun = newRun
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(
+            max_workers=jobWorkers or getJobWorkers(), thread_name_prefix="opjob"
+        )
+
+    def newJobDir(self):
+        # Directory where an upload is stored before the job is submitted
+
+        return tempfile.mkdtemp(prefix="opjob_")
+
+    def submit(self, jobDir, config):
+
+        job = AssessmentJob(jobDir, config)
+
+        with self.lock:
+            self.jobs[job.jobId] = job
+            self.pruneJobs()
+
+        self.executor.submit(self.run, job)
+
+        return job
+
+    def getJob(self, jobId):
+
+        with self.lock:
+            return self.jobs.get(jobId)
+
+    def pruneJobs(self):
+        # Keeps the last MAX_FINISHED_JOBS finished jobs. Queued and running jobs are always kept
+
+        finishedJobs = [
+            jobId
+            for jobId, job in self.jobs.items()
+            if job.status in (JOB_SUCCEEDED, JOB_FAILED)
+        ]
+
+        for jobId in finishedJobs[: max(len(finishedJobs) - MAX_FINISHED_JOBS, 0)]:
+            del self.jobs[jobId]
+
+    def run(self, job):
+
+        job.status = JOB_RUNNING
+        job.started = datetime.datetime.now().isoformat()
+
+        try:
+            job.assessmentRun = self.newRun(job.config)
+            job.results = job.assessmentRun.run() or []
+            job.status = JOB_SUCCEEDED
+        except assessment_run.AssessmentError as runErr:
+            job.error = str(runErr).strip()
+            job.status = JOB_FAILED
+        except SystemExit as exitErr:
+            # The job fails but the API keeps running
+            job.error = str(exitErr.code)
+            job.status = JOB_FAILED
+        except Exception as jobErr:
+            logger.error(traceback.format_exc())
+            job.error = str(jobErr)
+            job.status = JOB_FAILED
+        finally:
+            job.finished = datetime.datetime.now().isoformat()
+            shutil.rmtree(job.jobDir, ignore_errors=True)
+
+        logger.info("Job {} finished with status {}".format(job.jobId, job.status))
@@ -19,9 +19,17 @@ import logging
 # Basic python built-in libraries to enable read, write and manipulate files in the OS
 import sys
 
-import pandas as pd
-
-from db_assessment import import_db_assessment, rules_engine
+from db_assessment import (
+    assessment_run,
+    collection_archive,
+    collection_index,
+    frame_liveness,
+    import_db_assessment,
+    parse_cache,
+    partitioned_run,
+    rules_engine,
+    run_journal,
+)
 from db_assessment.remote import runRemote
 from db_assessment.version import __version__
 
@@ -34,10 +42,21 @@ def getVersion():
 
 
 def runMain(args):
-    # Main function
+    # Main function. Returns the import results and raises AssessmentError on fatal errors
+
+    return assessment_run.AssessmentRun(args).run()
+
+
+def runAssessment(assessmentRun):
+    # Pipeline of an AssessmentRun
+
+    args = assessmentRun.args
 
     # Pre-Tasks before trying to import any data
 
+    if getattr(args, "purgeparsecache", False):
+        parse_cache.purgeCache(args)
+
     # STEP: Read in JSON file configuration (rules and parameters)
 
     # Import Json with parameters and rules
@@ -54,11 +73,27 @@ def runMain(args):
     transformersTablesSchemaConfig = {}
     transformersTablesSchemaConfig = transformerConfiguration["tableschemas"]
 
+    # Compiling the rule expressions once, so broken rules stop the run before any data is processed
+    ruleErrors = rules_engine.validateRules(transformerRulesConfig)
+
+    if len(ruleErrors) > 0:
+        raise assessment_run.InvalidOptionsError(
+            "\nERROR: Enabled rules from {} are not valid. Fix or disable them and try again:\n{}\n".format(
+                args.transformersconfig,
+                "\n".join(
+                    ' The {} of the rule "{}": {}'.format(
+                        exprField, ruleItem, compileError
+                    )
+                    for ruleItem, exprField, compileError in ruleErrors
+                ),
+            )
+        )
+
     # For all cases in which those attributes are <> None it means the user wants to import data to Big Query
     # No need to further messaging for mandatory options because this is being done in argumentsParser function
     if args.dataset is not None and args.collectionid is not None:
 
-        # This is broken needs to be fixed in upcoming versions
+        # This is broken needs to be fixed in upcoming versions. Use -mergeloads to import all files of a table with a single load job
         if args.consolidatelogs:
             # It is True if no fatal errors were found
             resConsolidation = import_db_assessment.consolidateLos(
@@ -67,8 +102,11 @@ def runMain(args):
 
         # STEP 1: Import customer database assessment data
 
-        # Optimus Prime Search Pattern to find the target CSV files to be processed
+        # Optimus Prime catalog of the collected CSV files found in the OS. The directory is scanned only once
         # The default location will be dbResults if not overwritten by the argument -fileslocation
+        collectionIndex = collection_index.CollectionIndex(args.fileslocation)
+
+        # Optimus Prime Search Pattern of the target CSV files to be processed. Only used in messages
         csvFilesLocationPattern = (
             str(args.fileslocation)
             + "/*"
@@ -76,57 +114,68 @@ def runMain(args):
             + ".log"
         )
 
-        # Append csvFilesLocationPattern if there are filterbysqlversion and/or filterbydbversion flag
-        if args.filterbysqlversion and args.filterbysqlversion is not None:
-            csvFilesLocationPattern = csvFilesLocationPattern.replace(
-                str(args.fileslocation) + "/*",
-                str(args.fileslocation) + "/*_" + str(args.filterbysqlversion) + "*",
-            )
-
-        fileList = []
+        # Filter the files if there are filterbysqlversion and/or filterbydbversion flag
+        dbVersionsFilter = None
         if args.filterbydbversion and args.filterbydbversion is not None:
-            for dbversion in args.filterbydbversion.split(","):
-                dbversion = dbversion.replace(".", "")
-                newcsvFilesLocationPattern = csvFilesLocationPattern.replace(
-                    str(args.fileslocation) + "/*",
-                    str(args.fileslocation) + "/*__" + dbversion + "*",
-                )
-                fileListfordbversion = import_db_assessment.getAllFilesByPattern(
-                    newcsvFilesLocationPattern
-                )
-                fileList.extend(fileListfordbversion)
-        else:
-            # Getting a list of files from OS based on the pattern provided
-            # This is the default directory to have all customer database results from oracle_db_assessment.sql
-            fileList = import_db_assessment.getAllFilesByPattern(
-                csvFilesLocationPattern
-            )
+            dbVersionsFilter = args.filterbydbversion.split(",")
+
+        collectionFiles = collectionIndex.selectFiles(
+            args.collectionid, args.filterbysqlversion, dbVersionsFilter
+        )
+        fileList = [collectionFile.fileName for collectionFile in collectionFiles]
 
         skipvalidations = False
         if args.skipvalidations and args.skipvalidations is not None:
             skipvalidations = True
 
+        # Typed columns can only be loaded from Parquet. CSV files still have the spaces around the values
+        if rules_engine.isSchemaTypeInference(
+            args
+        ) and not import_db_assessment.isParquetLoad(args):
+            print(
+                "\nWARNING: -schematypes INFER requires -loadformat PARQUET. The columns will be imported as declared in transformers.json.\n"
+            )
+            args.schematypes = "STRING"
+
+        # The import ledger tracks files. The dataframes are always imported as a whole
+        if getattr(args, "incremental", False) and args.fromdataframe:
+            print(
+                "\nWARNING: -incremental is not supported with -fromdataframe. All data will be imported.\n"
+            )
+            args.incremental = False
+
+        # The dataframe imports and the schemas found from the data need all tables read into dataframes
+        if rules_engine.isLazyLoad(args) and (
+            args.fromdataframe
+            or rules_engine.isSchemaTypeInference(args)
+            or str(args.schemadetection).upper() == "AUTO"
+        ):
+            print(
+                "\nWARNING: -lazyload is not supported with -fromdataframe, -schematypes INFER or -schemadetection AUTO. All tables will be read into dataframes.\n"
+            )
+            args.lazyload = False
+
         # In case there is no matching file in the OS
         if len(fileList) == 0:
-            sys.exit(
+            raise assessment_run.NoCollectionFilesError(
                 "\nERROR: There is not matching CSV file found to be processed using: {}\n".format(
                     csvFilesLocationPattern
                 )
             )
 
         #  Make sure there are not 11.2 or 11.1 database versions being imported along with other database versions.
-        dbversionslist = set([f.split("__")[2].split("_")[0] for f in fileList])
+        dbversionslist = collection_index.getDbVersions(collectionFiles)
         outliers = len(
             [version for version in dbversionslist if version not in ["111", "112"]]
         )
         if ("111" in dbversionslist or "112" in dbversionslist) and outliers > 0:
-            sys.exit(
+            raise assessment_run.UnsupportedCollectionError(
                 '\nERROR:  Importing other versions along with 11.1 and 11.2 is not supported. Please use flag fileterbydbversion to filter database versions, For example: -filterbydbversion "12.1,12.2,18.0,19.1"\n'
             )
 
-        sqlversionslist = set([f.split("__")[2].split("_")[1] for f in fileList])
+        sqlversionslist = collection_index.getSqlVersions(collectionFiles)
         if len(sqlversionslist) > 1:
-            sys.exit(
+            raise assessment_run.UnsupportedCollectionError(
                 '\nERROR:  Importing multiple SQL versions is not supported. Please use flag fileterbysqlversion to filter SQL versions, For example: -filterbysqlversion 2.0.3"\n'
             )
 
@@ -139,9 +188,7 @@ def runMain(args):
         )
 
         # Variable to track the collection id. To be used mostly when new CSV files are generated from processing rules
-        collectionKey = import_db_assessment.getObjNameFromFiles(
-            str(fileList[0]), "__", 2
-        )
+        collectionKey = collectionFiles[0].collectionKey
         transformersParameters["collectionKey"] = collectionKey
 
         # Verify if the script has any version on it (only old script versions should not have 3 parts)
@@ -150,14 +197,11 @@ def runMain(args):
         elif (
             len(collectionKey.split("_")) >= 3 and args.dbversion is None
         ):  # bug #23. Changed == to >=.
-            transformersParameters[
-                "dbversion"
-            ] = import_db_assessment.getObjNameFromFiles(collectionKey, "_", 0)
+            transformersParameters["dbversion"] = collectionFiles[0].dbversion
         else:
-            print(
+            raise assessment_run.UnsupportedCollectionError(
                 "\nFATAL ERRROR: Please use -dbversion and -collectionversion. \nI.E -dbversion 122 -collectionversion 2.0.3\n"
             )
-            sys.exit()
 
         if args.importcomment is not None:
             transformersParameters["importcomment"] = str(args.importcomment)
@@ -165,7 +209,7 @@ def runMain(args):
         if len(collectionKey.split("_")) >= 3:  # bug #23. Changed == to >=.
             transformersParameters[
                 "optimuscollectionversion"
-            ] = import_db_assessment.getObjNameFromFiles(collectionKey, "_", 1)
+            ] = collectionFiles[0].sqlversion
         else:
             transformersParameters["optimuscollectionversion"] = args.collectionversion
 
@@ -205,121 +249,282 @@ def runMain(args):
                         transformersParameters["optimuscollectionversion"]
                     ][dbVersion]
 
-            # If we could not find any matching for tableSchemas
-            if transformersTablesSchema is None:
-                print(
-                    '\n FAILURE: Optimus Prime could not find in transformers.json matching for table schema configuration for "optimuscollectionversion={}" and "dbversion={}"\n'.format(
-                        transformersParameters["optimuscollectionversion"],
-                        transformersParameters["dbversion"],
-                    )
-                )
-                sys.exit()
         except KeyError:
-            print(
+            transformersTablesSchema = None
+
+        # If we could not find any matching for tableSchemas
+        if transformersTablesSchema is None:
+            raise assessment_run.UnsupportedCollectionError(
                 '\n FAILURE: Optimus Prime could not find in transformers.json matching for table schema configuration for "optimuscollectionversion={}" and "dbversion={}"\n'.format(
                     transformersParameters["optimuscollectionversion"],
                     transformersParameters["dbversion"],
                 )
             )
-            sys.exit()
 
         # Import the CSV files into Big Query
         gcpProjectName = args.projectname
         bqDataset = str(args.dataset)
 
-        # Delete the dataset before importing new data
-        if args.deletedataset:
-            if args.projectname is not None:
-                import_db_assessment.deleteDataSet(bqDataset, gcpProjectName)
-            else:
-                sys.exit(
-                    "\nWARNING: The database {} will not be deleted because the option -projectname is omitted. \nPlease try again either providing -projectname OR removing -deletedataset.\n\n".format(
-                        args.deletedataset
-                    )
+        # Journal of this run. With -resume the finished stages and the files already imported are skipped.
+        # It is only written to disk with -resumable or -resume
+        try:
+            runJournal = run_journal.RunJournal(
+                collection_archive.getWritableLocation(args.fileslocation),
+                getattr(args, "resume", None),
+                {
+                    "dataset": bqDataset,
+                    "projectname": gcpProjectName,
+                    "collectionid": args.collectionid,
+                },
+                run_journal.isResumable(args),
+            )
+        except run_journal.RunMismatchError as journalErr:
+            raise assessment_run.InvalidOptionsError(
+                "\nERROR: {}\n".format(journalErr)
+            )
+        except ValueError as journalErr:
+            raise assessment_run.RunNotFoundError("\nERROR: {}\n".format(journalErr))
+
+        # The files generated by this run are written to its run directory
+        assessmentRun.setRunJournal(runJournal)
+
+        if runJournal.resumed:
+            print(
+                "\nResuming the run {}. Finished stages: {}\n".format(
+                    runJournal.runId, ", ".join(runJournal.journal["stages"])
+                )
+            )
+        elif runJournal.persistent:
+            print(
+                "\nRun id: {}. If this run fails it can be resumed with -resume {}\n".format(
+                    runJournal.runId, runJournal.runId
                 )
+            )
+
+        # The loads only track the imported files when the run can be resumed
+        loadJournal = runJournal if runJournal.persistent else None
+
+        if not runJournal.isStageDone(
+            run_journal.STAGE_DATASET
+        ) and not assessmentRun.rulesOnly:
+
+            # Delete the dataset before importing new data
+            if args.deletedataset:
+                if args.projectname is not None:
+                    import_db_assessment.deleteDataSet(bqDataset, gcpProjectName)
+                else:
+                    raise assessment_run.InvalidOptionsError(
+                        "\nWARNING: The database {} will not be deleted because the option -projectname is omitted. \nPlease try again either providing -projectname OR removing -deletedataset.\n\n".format(
+                            args.deletedataset
+                        )
+                    )
 
-        # Create the dataset to import the CSV data
-        import_db_assessment.createDataSet(bqDataset, gcpProjectName)
+            # Create the dataset to import the CSV data
+            import_db_assessment.createDataSet(bqDataset, gcpProjectName)
+
+            runJournal.markStageDone(run_journal.STAGE_DATASET)
 
         # STEP: Processing parameters which create internal variables(transformersParameters) to be used in later stages
 
         #####transformerParameterResults, transformersParameters = rules_engine.runRules(transformerRulesConfig, None, None)
 
+        # Dataframes, schemas and file lists after the last finished stage of a resumed run
+        runState = runJournal.loadState() if runJournal.resumed else None
+
+        if runState is not None:
+            dbAssessmentDataframes = runState["dataframes"]
+            transformersTablesSchema = runState["tablesschema"]
+            transformersParameters = runState["parameters"]
+            invalidfiles = runState["invalidfiles"]
+            fileList = runState["filelist"]
+            rulesAlreadyExecuted = runState["rulesalreadyexecuted"]
+
+        # With -lazyload only the tables used by the rules are read into dataframes
+        requiredTables = None
+        if rules_engine.isLazyLoad(args) and not runJournal.isStageDone(
+            run_journal.STAGE_PARSE
+        ):
+            requiredTables = rules_engine.getRequiredTableNames(
+                transformerRulesConfig, transformersParameters
+            )
+
+        # STEP: Parse, reshape and rules for each collection key in its own process
+
+        if partitioned_run.getPartitionWorkers(
+            args
+        ) > 1 and not runJournal.isStageDone(run_journal.STAGE_PARSE):
+
+            (
+                dbAssessmentDataframes,
+                transformersTablesSchema,
+                invalidfiles,
+                fileList,
+                rulesAlreadyExecuted,
+            ) = partitioned_run.runPartitions(
+                collectionFiles,
+                fileListOPConfig,
+                args,
+                transformerRulesConfig,
+                transformersTablesSchema,
+                transformersParameters,
+                skipvalidations,
+                requiredTables,
+                gcpProjectName,
+                bqDataset,
+                assessmentRun.inferredSchemaTypes,
+            )
+
+            # The partitions run the three stages together, so the state is saved once
+            runJournal.markStageDone(run_journal.STAGE_PARSE)
+            runJournal.markStageDone(run_journal.STAGE_RESHAPE)
+            runJournal.markStageDone(
+                run_journal.STAGE_RULES,
+                getRunState(
+                    dbAssessmentDataframes,
+                    transformersTablesSchema,
+                    transformersParameters,
+                    invalidfiles,
+                    fileList,
+                    rulesAlreadyExecuted,
+                ),
+            )
+
         # STEP: Loading all CSV files in memory into dataframes
 
-        dbAssessmentDataframes = {}
-        invalidfiles = {}
-        (
-            dbAssessmentDataframes,
-            transformersTablesSchema,
-        ) = rules_engine.getAllDataFrames(
-            fileList,
-            1,
-            collectionKey,
-            args,
-            transformersTablesSchema,
-            dbAssessmentDataframes,
-            transformersParameters,
-            invalidfiles,
-            skipvalidations,
-        )
-        (
-            dbAssessmentDataframes,
-            transformersTablesSchema,
-        ) = rules_engine.getAllDataFrames(
-            fileListOPConfig,
-            0,
-            collectionKey,
-            args,
-            transformersTablesSchema,
-            dbAssessmentDataframes,
-            transformersParameters,
-            invalidfiles,
-            skipvalidations,
-        )
+        if not runJournal.isStageDone(run_journal.STAGE_PARSE):
+
+            dbAssessmentDataframes = {}
+            invalidfiles = {}
+
+            (
+                dbAssessmentDataframes,
+                transformersTablesSchema,
+            ) = rules_engine.getAllDataFrames(
+                fileList,
+                1,
+                collectionKey,
+                args,
+                transformersTablesSchema,
+                dbAssessmentDataframes,
+                transformersParameters,
+                invalidfiles,
+                skipvalidations,
+                requiredTables,
+                assessmentRun.inferredSchemaTypes,
+            )
+            (
+                dbAssessmentDataframes,
+                transformersTablesSchema,
+            ) = rules_engine.getAllDataFrames(
+                fileListOPConfig,
+                0,
+                collectionKey,
+                args,
+                transformersTablesSchema,
+                dbAssessmentDataframes,
+                transformersParameters,
+                invalidfiles,
+                skipvalidations,
+                inferredSchemaTypes=assessmentRun.inferredSchemaTypes,
+            )
+
+            rulesAlreadyExecuted = []
+
+            runJournal.markStageDone(
+                run_journal.STAGE_PARSE,
+                getRunState(
+                    dbAssessmentDataframes,
+                    transformersTablesSchema,
+                    transformersParameters,
+                    invalidfiles,
+                    fileList,
+                    rulesAlreadyExecuted,
+                ),
+            )
 
         # STEP: Reshape Dataframes when necessary based on the transformersParameters
 
-        (
-            dbAssessmentDataframes,
-            fileList,
-            transformersTablesSchema,
-            rulesAlreadyExecuted,
-        ) = rules_engine.getAllReShapedDataframes(
-            dbAssessmentDataframes,
-            transformersTablesSchema,
-            transformersParameters,
-            transformerRulesConfig,
-            args,
-            collectionKey,
-            fileList,
-        )
+        if not runJournal.isStageDone(run_journal.STAGE_RESHAPE):
+
+            (
+                dbAssessmentDataframes,
+                fileList,
+                transformersTablesSchema,
+                rulesAlreadyExecuted,
+            ) = rules_engine.getAllReShapedDataframes(
+                dbAssessmentDataframes,
+                transformersTablesSchema,
+                transformersParameters,
+                transformerRulesConfig,
+                args,
+                collectionKey,
+                fileList,
+            )
+
+            runJournal.markStageDone(
+                run_journal.STAGE_RESHAPE,
+                getRunState(
+                    dbAssessmentDataframes,
+                    transformersTablesSchema,
+                    transformersParameters,
+                    invalidfiles,
+                    fileList,
+                    rulesAlreadyExecuted,
+                ),
+            )
 
         # STEP: Run rules engine
 
-        (
-            transformerParameterResults,
-            transformersRulesVariables,
-            fileList,
-            dbAssessmentDataframes,
-        ) = rules_engine.runRules(
-            "1",
-            transformerRulesConfig,
-            dbAssessmentDataframes,
-            None,
-            args,
-            collectionKey,
-            transformersTablesSchema,
-            fileList,
-            rulesAlreadyExecuted,
-            transformersParameters,
-            gcpProjectName,
-            bqDataset,
-        )
+        if not runJournal.isStageDone(run_journal.STAGE_RULES):
+
+            (
+                transformerParameterResults,
+                transformersRulesVariables,
+                fileList,
+                dbAssessmentDataframes,
+            ) = rules_engine.runRules(
+                "1",
+                transformerRulesConfig,
+                dbAssessmentDataframes,
+                None,
+                args,
+                collectionKey,
+                transformersTablesSchema,
+                fileList,
+                rulesAlreadyExecuted,
+                transformersParameters,
+                gcpProjectName,
+                bqDataset,
+            )
+
+            runJournal.markStageDone(
+                run_journal.STAGE_RULES,
+                getRunState(
+                    dbAssessmentDataframes,
+                    transformersTablesSchema,
+                    transformersParameters,
+                    invalidfiles,
+                    fileList,
+                    rulesAlreadyExecuted,
+                ),
+            )
+
+        if assessmentRun.rulesOnly:
+            # The spilled dataframes are read back before the run directory is deleted
+            assessmentRun.rulesDataFrames = {
+                dataFrameName: frame_liveness.getDataFrame(
+                    dbAssessmentDataframes, dataFrameName
+                )
+                for dataFrameName in list(dbAssessmentDataframes)
+            }
+            return []
 
         # STEP: Import ALL data to Big Query
         # Local Variable store to avoid Global parameters
-        importresults = pd.DataFrame()
+        importresults = []
+
+        # All rows imported by this run have the same load date
+        transformersParameters["loaddate"] = assessmentRun.loadDate
 
         # Eliminating duplicated entries from transformers.json processing
         fileList = list(set(fileList))
@@ -330,9 +535,16 @@ def runMain(args):
             ## Insert Invalid Files to BQ
             if "OPKEYLOG" in dbAssessmentDataframes.keys():
                 op_df = dbAssessmentDataframes["OPKEYLOG"]
-                import_db_assessment.insertErrors(
-                    invalidfiles, op_df, gcpProjectName, bqDataset
-                )
+                # The errors are inserted only once for a run
+                if not runJournal.isStageDone(run_journal.STAGE_ERRORS):
+                    import_db_assessment.insertErrors(
+                        invalidfiles,
+                        op_df,
+                        gcpProjectName,
+                        bqDataset,
+                        assessmentRun.loadDate,
+                    )
+                    runJournal.markStageDone(run_journal.STAGE_ERRORS)
                 importresults = import_db_assessment.populateBT(
                     "notabname",
                     "nodataframe",
@@ -344,6 +556,7 @@ def runMain(args):
                     args,
                 )
 
+        # The load always runs on a resumed run. Only the files not imported yet are loaded, so failed loads are retried
         if args.fromdataframe:
 
             (
@@ -358,6 +571,7 @@ def runMain(args):
                 dbAssessmentDataframes,
                 transformersParameters,
                 importresults,
+                loadJournal,
             )
 
         else:
@@ -372,6 +586,7 @@ def runMain(args):
                 transformersParameters,
                 args,
                 importresults,
+                loadJournal,
             )
             # Import all Optimus Prime CSV configutation
             sucessImported, importresults = import_db_assessment.importAllCSVsToBQ(
@@ -383,35 +598,69 @@ def runMain(args):
                 transformersParameters,
                 args,
                 importresults,
+                loadJournal,
             )
 
-        (
-            transformerParameterResults,
-            transformersRulesVariables,
-            fileList,
-            dbAssessmentDataframes,
-        ) = rules_engine.runRules(
-            "2",
-            transformerRulesConfig,
-            dbAssessmentDataframes,
-            None,
-            args,
-            collectionKey,
-            transformersTablesSchema,
-            fileList,
-            rulesAlreadyExecuted,
-            transformersParameters,
-            gcpProjectName,
-            bqDataset,
-        )
+        runJournal.markStageDone(run_journal.STAGE_LOAD)
+
+        # The dataframes spilled by -evictframes are not needed once they are imported
+        frame_liveness.removeSpilledFrames(dbAssessmentDataframes)
+
+        if not runJournal.isStageDone(run_journal.STAGE_VIEWS):
+
+            (
+                transformerParameterResults,
+                transformersRulesVariables,
+                fileList,
+                dbAssessmentDataframes,
+            ) = rules_engine.runRules(
+                "2",
+                transformerRulesConfig,
+                dbAssessmentDataframes,
+                None,
+                args,
+                collectionKey,
+                transformersTablesSchema,
+                fileList,
+                rulesAlreadyExecuted,
+                transformersParameters,
+                gcpProjectName,
+                bqDataset,
+            )
 
-        # Create Optimus Prime Views
-        import_db_assessment.createOptimusPrimeViewsFromOS(gcpProjectName, bqDataset)
+            # Create Optimus Prime Views
+            import_db_assessment.createOptimusPrimeViewsFromOS(
+                gcpProjectName, bqDataset
+            )
+
+            runJournal.markStageDone(run_journal.STAGE_VIEWS)
 
         # Call BT for import summary table
         import_db_assessment.printBTResults(importresults)
         print("\n\n Thank YOU for using Optimus Prime!\n\n")
 
+        return importresults
+
+
+def getRunState(
+    dbAssessmentDataframes,
+    transformersTablesSchema,
+    transformersParameters,
+    invalidfiles,
+    fileList,
+    rulesAlreadyExecuted,
+):
+    # Everything a resumed run needs to continue after a finished stage
+
+    return {
+        "dataframes": dbAssessmentDataframes,
+        "tablesschema": transformersTablesSchema,
+        "parameters": transformersParameters,
+        "invalidfiles": invalidfiles,
+        "filelist": fileList,
+        "rulesalreadyexecuted": rulesAlreadyExecuted,
+    }
+
 
 def argumentsParser():
     # function to handle all arguments to be used in cli mode for this code and enforces mandatory options
@@ -503,6 +752,22 @@ def argumentsParser():
         help="Choose the BQ Load Type. Options are: WRITE_TRUNCATE, WRITE_APPEND and WRITE_EMPTY. The WRITE_APPEND is the default option.",
     )
 
+    parser.add_argument(
+        "-loadformat",
+        type=str,
+        default="CSV",
+        choices=["CSV", "PARQUET", "csv", "parquet"],
+        help="Format of the data uploaded to Big Query. PARQUET converts each table batch to compressed Parquet using the table schemas. The default is CSV",
+    )
+
+    parser.add_argument(
+        "-schematypes",
+        type=str,
+        default="STRING",
+        choices=["STRING", "INFER", "string", "infer"],
+        help="STRING loads the columns with the types from transformers.json. INFER replaces the STRING columns by the INT64, NUMERIC, BOOL or TIMESTAMP types found in the parsed data. INFER requires -loadformat PARQUET",
+    )
+
     parser.add_argument(
         "-fromdataframe",
         default=False,
@@ -517,6 +782,13 @@ def argumentsParser():
         action="store_true",
     )
 
+    parser.add_argument(
+        "-compactframes",
+        default=False,
+        help="Keep the parsed dataframes with pyarrow backed string columns and the op_categorical_columns from transformers.json as categoricals to reduce the memory used",
+        action="store_true",
+    )
+
     parser.add_argument(
         "-remote", default=False, help="Leverage remote API", action="store_true"
     )
@@ -567,6 +839,111 @@ def argumentsParser():
         action="store_true",
     )
 
+    parser.add_argument(
+        "-incremental",
+        help="Skip the files already imported to the dataset with the same content and replace the rows of the collections whose files changed. The imported files are tracked in the dataset table opimportledger",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "-resume",
+        type=str,
+        default=None,
+        help="Run id of a failed run to be resumed. The finished stages are skipped using the dataframes saved by the run and only the files not imported yet are loaded. Only runs started with -resumable can be resumed",
+    )
+
+    parser.add_argument(
+        "-resumable",
+        help="Journal the run in <fileslocation>/.opruns/<runid> with the dataframes after each stage, so it can be resumed with -resume if it fails. The saved dataframes are deleted when the run finishes",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "-parallelloads",
+        type=int,
+        default=1,
+        help="Number of Big Query load jobs to run at the same time when importing CSV files. The default is 1 (one file at a time)",
+    )
+
+    parser.add_argument(
+        "-mergeloads",
+        default=False,
+        help="Import all CSV files of the same table with a single Big Query load job instead of one load job per file",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-partitionworkers",
+        type=int,
+        default=1,
+        help="Number of processes used to parse, reshape and run the transformers.json rules for each collection key (database) separately. The results are merged before importing them. The default is 1 (all collections together)",
+    )
+
+    parser.add_argument(
+        "-ruleworkers",
+        type=int,
+        default=1,
+        help="Number of transformers.json rules run at the same time. Rules that do not use the same dataframes run concurrently",
+    )
+
+    parser.add_argument(
+        "-viewworkers",
+        type=int,
+        default=8,
+        help="Number of Big Query views from transformers.json created at the same time. Views are created by tiers (2-0, 2-100, 2-200...) and all views of a tier are created concurrently",
+    )
+
+    parser.add_argument(
+        "-evictframes",
+        default=False,
+        help="Evict each dataframe once no remaining transformers.json rule uses it. With -fromdataframe the dataframes are spilled to Feather files and read back when they are imported",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-lazyload",
+        default=False,
+        help="Read into dataframes only the CSV files of the tables used by the transformers.json rules. The other files are validated and imported straight from the OS",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-parseworkers",
+        type=int,
+        default=1,
+        help="Number of processes used to read the CSV files into dataframes. The default is 1 (files are read by the main process)",
+    )
+
+    parser.add_argument(
+        "-parsecache",
+        default=False,
+        help="Keep the dataframes parsed from the CSV files in a local Parquet cache and load unchanged files from it",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-parsecachedir",
+        type=str,
+        default=None,
+        help="Directory of the parse cache. The default is ~/.cache/optimus-prime/parsecache",
+    )
+
+    parser.add_argument(
+        "-parsecachemaxmb",
+        type=int,
+        default=2048,
+        help="Maximum size in MB of the parse cache. The least recently used entries are evicted above it. The default is 2048",
+    )
+
+    parser.add_argument(
+        "-purgeparsecache",
+        default=False,
+        help="Delete all entries of the parse cache before importing the data",
+        action="store_true",
+    )
+
     # Execute the parse_args() method. Variable args is a namespace type
     args = parser.parse_args()
 
@@ -602,7 +979,10 @@ def main():
         runRemote(args)
     else:
         # Call main function
-        runMain(args)
+        try:
+            runMain(args)
+        except assessment_run.AssessmentError as runErr:
+            sys.exit(str(runErr))
 
 
 if __name__ == "__main__":
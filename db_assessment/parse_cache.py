@@ -0,0 +1,196 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Local cache of the dataframes parsed from the collected CSV files.
+# Each parsed file is stored as a Parquet file named by a key made of the file path, size, mtime, content hash and
+# the parsing settings (table headers, separator, Optimus Prime version). Unchanged files are loaded from the cache on re-runs.
+
+import hashlib
+import json
+
+# Basic python built-in libraries to enable read, write and manipulate files in the OS
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from db_assessment import collection_archive, import_db_assessment
+from db_assessment.version import __version__
+
+# Increase it whenever the way files are parsed changes, so old cache entries are not used anymore
+CACHE_FORMAT_VERSION = "1"
+
+CACHE_FILE_SUFFIX = ".parquet"
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "optimus-prime", "parsecache"
+)
+
+
+def isCacheEnabled(args):
+
+    return bool(getattr(args, "parsecache", False))
+
+
+def getCacheDir(args):
+
+    cacheDir = getattr(args, "parsecachedir", None)
+
+    if cacheDir is None or str(cacheDir) == "":
+        cacheDir = DEFAULT_CACHE_DIR
+
+    return str(cacheDir)
+
+
+def getCacheKey(fileName, tableHeader, skipRows, skipvalidations, args):
+    # Returns the cache key for a CSV file parsed with the given settings
+
+    fileStat = collection_archive.getCollectionFileStat(fileName)
+
+    schemaVersion = json.dumps(
+        [
+            CACHE_FORMAT_VERSION,
+            __version__,
+            list(tableHeader),
+            str(args.sep),
+            skipRows,
+            bool(skipvalidations),
+        ]
+    )
+
+    keyComponents = [
+        os.path.abspath(fileName),
+        str(fileStat.st_size),
+        str(fileStat.st_mtime_ns),
+        import_db_assessment.getFileContentHash(fileName),
+        schemaVersion,
+    ]
+
+    return hashlib.sha256("\n".join(keyComponents).encode("utf-8")).hexdigest()
+
+
+def getCacheFileName(args, cacheKey):
+
+    return os.path.join(getCacheDir(args), cacheKey + CACHE_FILE_SUFFIX)
+
+
+def loadCachedDataFrame(args, cacheKey):
+    # Returns the cached dataframe or None if the key is not in the cache
+
+    cacheFileName = getCacheFileName(args, cacheKey)
+
+    if not os.path.exists(cacheFileName):
+        return None
+
+    try:
+        df = pd.read_parquet(cacheFileName)
+    except Exception as cacheErr:
+        print(
+            "\nWARNING: The parse cache file {} could not be read and it will be ignored. Error: {}".format(
+                cacheFileName, cacheErr
+            )
+        )
+        return None
+
+    # Parquet brings missing strings back as None. pd.read_csv uses NaN
+    for column in df.columns:
+        if df[column].dtype == object:
+            df[column] = df[column].where(df[column].notna(), np.nan)
+
+    # Recently used entries are the last ones to be evicted
+    try:
+        os.utime(cacheFileName)
+    except OSError:
+        None
+
+    return df
+
+
+def storeCachedDataFrame(args, cacheKey, df):
+    # Stores the dataframe in the cache. Dataframes that cannot be written to Parquet are just not cached
+
+    cacheFileName = getCacheFileName(args, cacheKey)
+    tmpCacheFileName = "{}.{}.tmp".format(cacheFileName, os.getpid())
+
+    try:
+        os.makedirs(getCacheDir(args), exist_ok=True)
+        df.to_parquet(tmpCacheFileName, index=False)
+        # Renaming makes the entry visible only when it is complete, also for other processes
+        os.replace(tmpCacheFileName, cacheFileName)
+    except Exception as cacheErr:
+        print(
+            "\nWARNING: The dataframe could not be stored in the parse cache {}. Error: {}".format(
+                getCacheDir(args), cacheErr
+            )
+        )
+        if os.path.exists(tmpCacheFileName):
+            os.remove(tmpCacheFileName)
+        return False
+
+    return True
+
+
+def purgeCache(args):
+    # Deletes all cached dataframes
+
+    cacheDir = getCacheDir(args)
+
+    if os.path.isdir(cacheDir):
+        shutil.rmtree(cacheDir)
+        print("\nThe parse cache {} was purged.".format(cacheDir))
+
+
+def evictCache(args):
+    # Deletes the least recently used entries until the cache is under -parsecachemaxmb
+
+    cacheDir = getCacheDir(args)
+
+    if not os.path.isdir(cacheDir):
+        return
+
+    maxCacheBytes = int(getattr(args, "parsecachemaxmb", 2048)) * 1024 * 1024
+
+    cacheFiles = []
+    cacheBytes = 0
+
+    for entry in os.scandir(cacheDir):
+        if entry.is_file() and entry.name.endswith(CACHE_FILE_SUFFIX):
+            entryStat = entry.stat()
+            cacheFiles.append((entryStat.st_mtime, entryStat.st_size, entry.path))
+            cacheBytes = cacheBytes + entryStat.st_size
+
+    # Oldest entries first
+    cacheFiles.sort()
+
+    evictedFiles = 0
+    for mtime, size, cacheFileName in cacheFiles:
+
+        if cacheBytes <= maxCacheBytes:
+            break
+
+        try:
+            os.remove(cacheFileName)
+        except OSError:
+            continue
+
+        cacheBytes = cacheBytes - size
+        evictedFiles = evictedFiles + 1
+
+    if evictedFiles > 0:
+        print(
+            "\nEvicted {} entries from the parse cache {}.".format(
+                evictedFiles, cacheDir
+            )
+        )
@@ -0,0 +1,401 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Partitioned execution, used by -partitionworkers.
+# The transformers.json rules work within one database (merges by PKEY/DBID/INSTANCE_NUMBER/HOUR, groupbys by PKEY), so the
+# collected files are partitioned by collection key and each partition is parsed, reshaped and run through the rules of the
+# execution group 1 in its own process. The partition results are then merged to be imported to Big Query.
+# The partitions only send back the dataframes used after them (OPKEYLOG and the dataframes of the rules of the other
+# execution groups). With -fromdataframe every dataframe is imported, so they are sent as Feather files instead.
+
+import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from db_assessment import collection_index, frame_liveness, rules_engine
+
+
+def getPartitionWorkers(args):
+
+    try:
+        return max(int(getattr(args, "partitionworkers", 1) or 1), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def getPartitions(collectionFiles):
+    # Returns [(collectionKey, fileList)] in the order the collection keys are found
+
+    partitions = {}
+
+    for collectionFile in collectionFiles:
+        partitions.setdefault(collectionFile.collectionKey, []).append(
+            collectionFile.fileName
+        )
+
+    return list(partitions.items())
+
+
+def getParentFrameNames(transformerRules):
+    # Dataframes used after the partitions: OPKEYLOG (invalid files log) and the dataframes read or written by the python
+    # rules of the other execution groups. None when they cannot be known from the rule expressions
+
+    parentFrames = set(frame_liveness.KEEP_FRAMES)
+
+    for ruleItem in transformerRules.keys():
+
+        if (
+            str(transformerRules[ruleItem]["status"]).upper() != "ENABLED"
+            or str(transformerRules[ruleItem]["action_details"]["type"]).upper()
+            not in rules_engine.RULE_PYTHON_TYPES
+            or str(transformerRules[ruleItem]["execution_group"]).upper() == "1"
+        ):
+            continue
+
+        ruleDataFrames = rules_engine.getRuleDataFrameNames(transformerRules[ruleItem])
+
+        if ruleDataFrames is None:
+            return None
+
+        parentFrames.update(ruleDataFrames[0] | ruleDataFrames[1])
+
+    return parentFrames
+
+
+def getPartitionResultFrames(dataFrames, args, transformerRules):
+    # Dataframes sent back by a partition. With -fromdataframe they are spilled to Feather files in the scratch location
+    # and only their file names are sent
+
+    if not args.fromdataframe:
+
+        parentFrames = getParentFrameNames(transformerRules)
+
+        if parentFrames is None:
+            return dataFrames
+
+        return {
+            tableName: df
+            for tableName, df in dataFrames.items()
+            if tableName in parentFrames
+        }
+
+    resultFrames = {}
+    spillDir = None
+
+    for tableName, df in dataFrames.items():
+
+        if tableName in frame_liveness.KEEP_FRAMES or isinstance(
+            df, frame_liveness.SpilledDataFrame
+        ):
+            resultFrames[tableName] = df
+            continue
+
+        if spillDir is None:
+            spillDir = frame_liveness.newSpillDir(args)
+
+        resultFrames[tableName] = (
+            frame_liveness.spillDataFrame(df, tableName, spillDir) or df
+        )
+
+    return resultFrames
+
+
+def runPartition(
+    collectionKey,
+    fileList,
+    fileListOPConfig,
+    args,
+    transformerRulesConfig,
+    transformersTablesSchema,
+    transformersParameters,
+    skipvalidations,
+    requiredTables,
+    gcpProjectName,
+    bqDataset,
+):
+    # Parse, reshape and rules (execution group 1) for the files of one collection key. It runs in the partition worker processes.
+    # Returns (dataFrames, transformersTablesSchema, inferred schema types, invalidfiles, fileList, rulesAlreadyExecuted)
+
+    print(
+        "\nProcessing the partition {} with {} files".format(
+            collectionKey, len(fileList)
+        )
+    )
+
+    # The partitions are already processes, so the files of a partition are parsed by its own process
+    args = copy.copy(args)
+    args.parseworkers = 1
+
+    transformersParameters = copy.deepcopy(transformersParameters)
+    transformersParameters["collectionKey"] = collectionKey
+
+    dataFrames = {}
+    invalidfiles = {}
+    inferredSchemaTypes = {}
+
+    dataFrames, transformersTablesSchema = rules_engine.getAllDataFrames(
+        list(fileList),
+        1,
+        collectionKey,
+        args,
+        transformersTablesSchema,
+        dataFrames,
+        transformersParameters,
+        invalidfiles,
+        skipvalidations,
+        requiredTables,
+        inferredSchemaTypes,
+    )
+    dataFrames, transformersTablesSchema = rules_engine.getAllDataFrames(
+        list(fileListOPConfig),
+        0,
+        collectionKey,
+        args,
+        transformersTablesSchema,
+        dataFrames,
+        transformersParameters,
+        invalidfiles,
+        skipvalidations,
+        inferredSchemaTypes=inferredSchemaTypes,
+    )
+
+    (
+        dataFrames,
+        fileList,
+        transformersTablesSchema,
+        rulesAlreadyExecuted,
+    ) = rules_engine.getAllReShapedDataframes(
+        dataFrames,
+        transformersTablesSchema,
+        transformersParameters,
+        transformerRulesConfig,
+        args,
+        collectionKey,
+        list(fileList),
+    )
+
+    (
+        transformerParameterResults,
+        transformersRulesVariables,
+        fileList,
+        dataFrames,
+    ) = rules_engine.runRules(
+        "1",
+        transformerRulesConfig,
+        dataFrames,
+        None,
+        args,
+        collectionKey,
+        transformersTablesSchema,
+        fileList,
+        rulesAlreadyExecuted,
+        transformersParameters,
+        gcpProjectName,
+        bqDataset,
+    )
+
+    return (
+        getPartitionResultFrames(dataFrames, args, transformerRulesConfig),
+        transformersTablesSchema,
+        inferredSchemaTypes,
+        invalidfiles,
+        fileList,
+        rulesAlreadyExecuted,
+    )
+
+
+def runPartitions(
+    collectionFiles,
+    fileListOPConfig,
+    args,
+    transformerRulesConfig,
+    transformersTablesSchema,
+    transformersParameters,
+    skipvalidations,
+    requiredTables,
+    gcpProjectName,
+    bqDataset,
+    inferredSchemaTypes,
+):
+    # Runs all partitions in a pool of -partitionworkers processes and merges their results.
+    # Returns (dataFrames, transformersTablesSchema, invalidfiles, fileList, rulesAlreadyExecuted) like the serial stages.
+    # The types inferred by the partitions (-schematypes INFER) are widened into inferredSchemaTypes
+
+    partitions = getPartitions(collectionFiles)
+    partitionWorkers = min(getPartitionWorkers(args), len(partitions))
+
+    print(
+        "\nRunning {} partitions (collection keys) in {} processes".format(
+            len(partitions), partitionWorkers
+        )
+    )
+
+    # The partitions start from a new interpreter instead of a fork of this process with its threads and dataframes
+    with ProcessPoolExecutor(
+        max_workers=partitionWorkers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(
+                runPartition,
+                collectionKey,
+                fileList,
+                fileListOPConfig,
+                args,
+                transformerRulesConfig,
+                transformersTablesSchema,
+                transformersParameters,
+                skipvalidations,
+                requiredTables,
+                gcpProjectName,
+                bqDataset,
+            )
+            for collectionKey, fileList in partitions
+        ]
+
+        # The results are merged in the partitions order. Errors are raised like in the serial execution
+        partitionResults = [future.result() for future in futures]
+
+    return mergePartitionResults(
+        partitionResults,
+        fileListOPConfig,
+        args,
+        transformersTablesSchema,
+        inferredSchemaTypes,
+    )
+
+
+def mergePartitionResults(
+    partitionResults,
+    fileListOPConfig,
+    args,
+    transformersTablesSchema,
+    inferredSchemaTypes,
+):
+
+    # Tables from the Optimus Prime configuration files are the same in all partitions, so only the first one is kept
+    opConfigTables = set(
+        str(collection_index.getTableName(fileName)).upper()
+        for fileName in fileListOPConfig
+    )
+
+    tableParts = {}
+    invalidfiles = {}
+    fileList = []
+    mergedFiles = set()
+    rulesAlreadyExecuted = []
+    mergedTablesSchema = dict(transformersTablesSchema)
+
+    for (
+        partitionDataFrames,
+        partitionTablesSchema,
+        partitionInferredTypes,
+        partitionInvalidFiles,
+        partitionFileList,
+        partitionRulesExecuted,
+    ) in partitionResults:
+
+        for tableName, df in partitionDataFrames.items():
+
+            if tableName in opConfigTables and tableName in tableParts:
+                continue
+
+            if args.consolidatedataframes:
+                tableParts.setdefault(tableName, []).append(df)
+            else:
+                # Like the serial execution, the last dataframe of a table is kept when the dataframes are not consolidated
+                tableParts[tableName] = [df]
+
+        mergedTablesSchema = mergePartitionTablesSchema(
+            mergedTablesSchema,
+            partitionTablesSchema,
+            partitionInferredTypes,
+            inferredSchemaTypes,
+        )
+
+        invalidfiles.update(partitionInvalidFiles)
+
+        for fileName in partitionFileList:
+            if fileName not in mergedFiles:
+                mergedFiles.add(fileName)
+                fileList.append(fileName)
+
+        for ruleItem in partitionRulesExecuted:
+            if ruleItem not in rulesAlreadyExecuted:
+                rulesAlreadyExecuted.append(ruleItem)
+
+    dataFrames = {}
+    spillDir = None
+
+    for tableName, dfParts in tableParts.items():
+        # Each table is concatenated once, so every row is copied only once
+        if len(dfParts) == 1:
+            dataFrames[tableName] = dfParts[0]
+            continue
+
+        if all(
+            isinstance(dfPart, frame_liveness.SpilledDataFrame) for dfPart in dfParts
+        ):
+            # -fromdataframe: the table is written to its own Feather file, so only one table is in memory at a time
+            if spillDir is None:
+                spillDir = frame_liveness.newSpillDir(args)
+            df = rules_engine.concatCompactDataframes(
+                [dfPart.load() for dfPart in dfParts]
+            )
+            dataFrames[tableName] = (
+                frame_liveness.spillDataFrame(df, tableName, spillDir) or df
+            )
+            frame_liveness.removeSpilledFrames(dict(enumerate(dfParts)))
+            continue
+
+        # Dataframes spilled by -evictframes are read back to be concatenated
+        dataFrames[tableName] = rules_engine.concatCompactDataframes(
+            [
+                dfPart.load()
+                if isinstance(dfPart, frame_liveness.SpilledDataFrame)
+                else dfPart
+                for dfPart in dfParts
+            ]
+        )
+        frame_liveness.removeSpilledFrames(dict(enumerate(dfParts)))
+
+    return dataFrames, mergedTablesSchema, invalidfiles, fileList, rulesAlreadyExecuted
+
+
+def mergePartitionTablesSchema(
+    transformersTablesSchema,
+    partitionTablesSchema,
+    partitionInferredTypes,
+    inferredSchemaTypes,
+):
+    # Adds the schemas created by a partition (schema detection, rules) and, with -schematypes INFER, widens the inferred types.
+    # Only the columns inferred by the partitions are widened, typed columns from transformers.json are kept as they are
+
+    for tableName, tableSchema in partitionTablesSchema.items():
+
+        if tableName not in transformersTablesSchema or (
+            tableName in partitionInferredTypes and tableName not in inferredSchemaTypes
+        ):
+            transformersTablesSchema[tableName] = tableSchema
+
+    for tableName, tableInferredTypes in partitionInferredTypes.items():
+
+        if tableName in transformersTablesSchema:
+            transformersTablesSchema = rules_engine.mergeInferredBQDataTypes(
+                transformersTablesSchema,
+                inferredSchemaTypes,
+                tableName,
+                tableInferredTypes,
+            )
+
+    return transformersTablesSchema
@@ -18,12 +18,25 @@ import logging
 
 # Basic python built-in libraries to enable read, write and manipulate files in the OS
 import os
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Import to Big Query
-from db_assessment import import_db_assessment
+from db_assessment import collection_archive, import_db_assessment
 
 logging.getLogger().setLevel(level=logging.INFO)
 
+# Seconds between two status requests for a remote job
+REMOTE_JOB_POLL_SECONDS = 10
+# Parts of the collection uploaded at the same time
+REMOTE_UPLOAD_WORKERS = 4
+# Attempts for each request and for the whole upload
+REMOTE_UPLOAD_RETRIES = 5
+
 
 def get_id_token():
     import google.auth
@@ -33,11 +46,21 @@ def get_id_token():
     return credentials.id_token
 
 
+def getAuthorizationHeaders(refresh=False):
+    # ID_TOKEN is used as it is. A refresh (the token expired) always asks for a new token
+
+    if os.getenv("ID_TOKEN") and not refresh:
+        id_token = os.getenv("ID_TOKEN")
+    else:
+        id_token = get_id_token()
+
+    return {"Authorization": f"Bearer {id_token}"}
+
+
 def runRemote(args):
     import requests
 
-    id_token = os.getenv("ID_TOKEN") if os.getenv("ID_TOKEN") else get_id_token()
-    headers = {"Authorization": f"Bearer {id_token}"}
+    headers = getAuthorizationHeaders()
     config = {
         "projectId": args.projectname,
         "dataset": args.dataset,
@@ -53,16 +76,227 @@ def runRemote(args):
     # Getting a list of files from OS based on the pattern provided
     # This is the default directory to have all customer database results from oracle_db_assessment.sql
     filename_list = import_db_assessment.getAllFilesByPattern(csvFilesLocationPattern)
-    files = {filename: open(filename, "r") for filename in filename_list}
-    result = requests.post(
-        f"{args.remoteurl}/api/loadAssessment",
-        files=files,
-        data=config,
-        headers=headers,
-    )
-    result.raise_for_status()
+
+    if len(filename_list) == 0:
+        sys.exit(
+            "\nERROR: There is not matching CSV file found to be processed using: {}\n".format(
+                csvFilesLocationPattern
+            )
+        )
+
+    session = requests.Session()
+    session.headers.update(headers)
+
+    # Only the files the API has not stored yet are uploaded. The manifest tells the API which stored files to use
+    manifest = getCollectionManifest(filename_list)
+
+    for attempt in range(REMOTE_UPLOAD_RETRIES):
+
+        missing = set(
+            requestWithRetries(
+                session,
+                "POST",
+                f"{args.remoteurl}/api/blobs/missing",
+                json=dict(config, hashes=[entry["sha256"] for entry in manifest]),
+            ).json()["missing"]
+        )
+        upload_list = [
+            filename
+            for filename, entry in zip(filename_list, manifest)
+            if entry["sha256"] in missing
+        ]
+
+        try:
+            result = uploadCollection(
+                session, args.remoteurl, config, upload_list, manifest
+            )
+            break
+        except requests.HTTPError as completeErr:
+            # Stored files evicted by the API since they were asked for. They are uploaded again
+            if (
+                completeErr.response.status_code != 409
+                or "missing" not in completeErr.response.text
+            ):
+                raise
+            logging.warning(
+                f"Files evicted by the API during the upload, uploading again: {completeErr.response.text}"
+            )
+    else:
+        sys.exit(
+            "\nERROR: The collection could not be uploaded to {}\n".format(
+                args.remoteurl
+            )
+        )
+
     logging.info(result.text)
 
+    # The import runs in the background. Following the job until it finishes
+    jobId = result.json()["jobId"]
+    waitRemoteJob(session, args.remoteurl, jobId)
+
+
+def getCollectionManifest(filename_list):
+    # Name and SHA-256 of each collected file
+
+    return [
+        {
+            "name": os.path.basename(filename),
+            "sha256": import_db_assessment.getFileContentHash(filename),
+            "size": collection_archive.getCollectionFileStat(filename).st_size,
+        }
+        for filename in filename_list
+    ]
+
+
+def uploadCollection(session, remoteurl, config, upload_list, manifest):
+    # Uploads the files as a single tar.gz, in parts that are retried and uploaded in parallel. Returns the complete response
+
+    with tempfile.TemporaryFile() as archiveFile:
+
+        writeCollectionArchive(upload_list, archiveFile)
+        archiveSize = archiveFile.tell()
+
+        logging.info(
+            f"Uploading {len(upload_list)} of {len(manifest)} files ({archiveSize} bytes compressed). The other files are already stored by the API"
+        )
+
+        upload = requestWithRetries(
+            session,
+            "POST",
+            f"{remoteurl}/api/uploads",
+            json=dict(config, size=archiveSize, manifest=manifest),
+        ).json()
+
+        uploadArchiveParts(
+            session,
+            f"{remoteurl}/api/uploads/{upload['uploadId']}",
+            archiveFile,
+            archiveSize,
+            int(upload["partSize"]),
+        )
+
+    # The API answers a repeated complete with the same job, so it can be retried
+    return requestWithRetries(
+        session,
+        "POST",
+        f"{remoteurl}/api/uploads/{upload['uploadId']}/complete",
+    )
+
+
+def writeCollectionArchive(filename_list, archiveFile):
+    # tar.gz of the collected files. The files are read one at a time, also from the compressed collections
+
+    with tarfile.open(fileobj=archiveFile, mode="w:gz") as archive:
+        for filename in filename_list:
+            memberInfo = tarfile.TarInfo(os.path.basename(filename))
+            memberInfo.size = collection_archive.getCollectionFileStat(filename).st_size
+            with collection_archive.openCollectionFile(filename, "rb") as memberFile:
+                archive.addfile(memberInfo, memberFile)
+
+
+def uploadArchiveParts(session, uploadUrl, archiveFile, archiveSize, partSize):
+    # Sends the parts not received yet by the API. After a failure the parts the API already has are not sent again
+
+    archiveLock = threading.Lock()
+
+    def uploadPart(offset):
+        with archiveLock:
+            archiveFile.seek(offset)
+            data = archiveFile.read(min(partSize, archiveSize - offset))
+        requestWithRetries(session, "PUT", f"{uploadUrl}/parts/{offset}", data=data)
+
+    for attempt in range(REMOTE_UPLOAD_RETRIES + 1):
+
+        uploadStatus = requestWithRetries(session, "GET", uploadUrl).json()
+        receivedParts = set(offset for offset, length in uploadStatus["receivedParts"])
+        pendingParts = [
+            offset
+            for offset in range(0, archiveSize, partSize)
+            if offset not in receivedParts
+        ]
+
+        if len(pendingParts) == 0:
+            return
+
+        if attempt == REMOTE_UPLOAD_RETRIES:
+            break
+
+        try:
+            with ThreadPoolExecutor(max_workers=REMOTE_UPLOAD_WORKERS) as executor:
+                list(executor.map(uploadPart, pendingParts))
+        except Exception as uploadErr:
+            logging.warning(f"Upload interrupted, resuming: {uploadErr}")
+
+    sys.exit("\nERROR: The collection could not be uploaded to {}\n".format(uploadUrl))
+
+
+def requestWithRetries(session, method, url, **kwargs):
+    # Retries connection errors and server errors with an exponential backoff.
+    # An expired ID token (401) is refreshed once
+    import requests
+
+    tokenRefreshed = False
+
+    for attempt in range(REMOTE_UPLOAD_RETRIES):
+        try:
+            result = session.request(method, url, **kwargs)
+            if result.status_code == 401 and not tokenRefreshed:
+                logging.info("The ID token expired, getting a new one")
+                session.headers.update(getAuthorizationHeaders(refresh=True))
+                tokenRefreshed = True
+                result = session.request(method, url, **kwargs)
+            if result.status_code < 500 or attempt == REMOTE_UPLOAD_RETRIES - 1:
+                result.raise_for_status()
+                return result
+            logging.warning(f"{method} {url} failed with {result.status_code}")
+        except (requests.ConnectionError, requests.Timeout) as requestErr:
+            if attempt == REMOTE_UPLOAD_RETRIES - 1:
+                raise
+            logging.warning(f"{method} {url} failed: {requestErr}")
+
+        time.sleep(2**attempt)
+
+
+def waitRemoteJob(session, remoteurl, jobId):
+    # The job keeps running in the API, so failed status requests are retried at the next poll
+    import requests
+
+    reportedStages = []
+    failedPolls = 0
+
+    while True:
+
+        try:
+            job = requestWithRetries(
+                session, "GET", f"{remoteurl}/api/jobs/{jobId}"
+            ).json()
+            failedPolls = 0
+        except (requests.ConnectionError, requests.Timeout, ValueError) as pollErr:
+            failedPolls += 1
+            if failedPolls > REMOTE_UPLOAD_RETRIES:
+                raise
+            logging.warning(f"Job {jobId}: status request failed: {pollErr}")
+            time.sleep(REMOTE_JOB_POLL_SECONDS)
+            continue
+
+        for stage in job["stages"]:
+            if stage not in reportedStages:
+                logging.info(f"Job {jobId}: stage {stage} finished")
+                reportedStages.append(stage)
+
+        if job["status"] == "SUCCEEDED":
+            for importResult in job["results"]:
+                logging.info(importResult)
+            logging.info(f"Job {jobId} finished")
+            return job
+
+        if job["status"] == "FAILED":
+            sys.exit(
+                "\nERROR: The remote job {} failed: {}\n".format(jobId, job["error"])
+            )
+
+        time.sleep(REMOTE_JOB_POLL_SECONDS)
+
 
 def grantAccess(projectId, dataset):
     # get OP SA
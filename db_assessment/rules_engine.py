@@ -13,18 +13,74 @@
 # limitations under the License.
 
 
+import ast
+import builtins
 import csv
 import os
+import re
 import warnings
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import lru_cache
+from itertools import repeat
 
 import numpy as np
 import pandas as pd
 
 warnings.simplefilter("error", pd.errors.ParserWarning)
 
+# Text values that are inferred as TIMESTAMP (ISO 8601 date and time)
+TIMESTAMP_PATTERN = re.compile(
+    r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:?\d{2})?$"
+)
+
+# Values read as missing when the collected files are parsed (the pd.read_csv defaults and n/a). The typed Parquet loads
+# read them as NULL too, so the values of a column load with the type -schematypes INFER found for them
+CSV_NA_VALUES = frozenset(
+    (
+        "",
+        "#N/A",
+        "#N/A N/A",
+        "#NA",
+        "-1.#IND",
+        "-1.#QNAN",
+        "-NaN",
+        "-nan",
+        "1.#IND",
+        "1.#QNAN",
+        "<NA>",
+        "N/A",
+        "NA",
+        "NULL",
+        "NaN",
+        "n/a",
+        "nan",
+        "null",
+    )
+)
+
 import json
 
-from db_assessment import import_db_assessment
+from db_assessment import (
+    collection_archive,
+    collection_index,
+    frame_liveness,
+    import_db_assessment,
+    parse_cache,
+)
+
+# Names that rule expressions from transformers.json can use besides the python built-ins
+RULE_EXPRESSION_NAMES = frozenset(("dataFrames", "np", "pd"))
+
+# iferror value for rules that have no fallback expression
+RULE_EXPRESSION_IGNORE = "IGNORE"
+
+# Rule types whose expressions are python code
+RULE_PYTHON_TYPES = ("NUMBER", "FREESTYLE")
 
 
 def createTransformersVariable(transformerRule):
@@ -75,12 +131,8 @@ def runRules(
     transformerResults = {}
     # Variable to keep track and make available all the variables from the JSON file
     transformersRulesVariables = {}
-
-    # Standardize Statuses
-    # Executed
-    EXECUTEDSTATUS = "EXECUTED"
-    FAILEDSTATUS = "FAILED"
-    SKIPPEDSTATUS = "SKIPPED"
+    # Views from CREATE VIEW rules to be created after all rules run
+    viewDefinitions = []
 
     if singleRule:
         # If parameter is set then we will run only 1 rule
@@ -92,420 +144,832 @@ def runRules(
             transformerRules, key=lambda x: (transformerRules[x]["priority"])
         )
 
-    # Looping on ALL rules from transformers.json
-    for ruleItem in sorted_keys:
+    ruleArguments = (
+        executionGroup,
+        transformerRules,
+        dataFrames,
+        args,
+        collectionKey,
+        transformersTablesSchema,
+        fileList,
+        rulesAlreadyExecuted,
+        transformersParameters,
+        gcpProjectName,
+        bqDataset,
+        transformerResults,
+        transformersRulesVariables,
+        viewDefinitions,
+    )
+
+    ruleWorkers = getRuleWorkers(args)
 
-        stringExpression = getParsedRuleExpr(
-            transformerRules[ruleItem]["action_details"]["expr1"]
+    # With -evictframes the dataframes are evicted as soon as no remaining rule of the group uses them
+    frameLiveness = None
+    if not singleRule:
+        frameLiveness = frame_liveness.getFrameLiveness(
+            sorted_keys, executionGroup, transformerRules, args
         )
-        iferrorExpression = getParsedRuleExpr(
-            transformerRules[ruleItem]["action_details"]["iferror"]
+        if frameLiveness is not None:
+            frameLiveness.evictDeadFrames(dataFrames)
+
+    if ruleWorkers > 1 and len(sorted_keys) > 1:
+        # Rules that do not share dataframes run at the same time
+        runRulesConcurrently(
+            sorted_keys,
+            executionGroup,
+            transformerRules,
+            ruleWorkers,
+            ruleArguments,
+            frameLiveness,
         )
 
-        if str(transformerRules[ruleItem]["status"]).upper() == "ENABLED":
+    else:
+        # Looping on ALL rules from transformers.json
+        for ruleItem in sorted_keys:
+            runRuleItem(ruleItem, *ruleArguments)
+            if frameLiveness is not None:
+                frameLiveness.ruleFinished(ruleItem, dataFrames)
+
+    if len(viewDefinitions) > 0:
+        import_db_assessment.createOptimusPrimeViewsInTiers(
+            gcpProjectName, bqDataset, viewDefinitions, args
+        )
+
+    return transformerResults, transformersRulesVariables, fileList, dataFrames
 
-            if (
-                str(transformerRules[ruleItem]["execution_group"]).upper()
-                == str(executionGroup).upper()
+
+def runRuleItem(
+    ruleItem,
+    executionGroup,
+    transformerRules,
+    dataFrames,
+    args,
+    collectionKey,
+    transformersTablesSchema,
+    fileList,
+    rulesAlreadyExecuted,
+    transformersParameters,
+    gcpProjectName,
+    bqDataset,
+    transformerResults,
+    transformersRulesVariables,
+    viewDefinitions,
+):
+    # Runs one rule from transformers.json. The results are stored in transformerResults, transformersRulesVariables, dataFrames and fileList.
+    # CREATE VIEW rules only add the view to viewDefinitions
+
+    # Standardize Statuses
+    # Executed
+    EXECUTEDSTATUS = "EXECUTED"
+    FAILEDSTATUS = "FAILED"
+    SKIPPEDSTATUS = "SKIPPED"
+
+    if str(transformerRules[ruleItem]["status"]).upper() == "ENABLED":
+
+        if (
+            str(transformerRules[ruleItem]["execution_group"]).upper()
+            == str(executionGroup).upper()
+        ):
+
+            if int(
+                str(transformersParameters["dbversion"]).replace(".", "")[:3]
+            ) in range(
+                int(
+                    str(transformerRules[ruleItem]["mindbversion"]).replace(
+                        ".", ""
+                    )[:3]
+                ),
+                int(
+                    str(transformerRules[ruleItem]["maxdbversion"]).replace(
+                        ".", ""
+                    )[:3]
+                )
+                + 1,
             ):
 
                 if int(
-                    str(transformersParameters["dbversion"]).replace(".", "")[:3]
+                    str(transformersParameters["optimuscollectionversion"]).replace(
+                        ".", ""
+                    )[:3]
                 ) in range(
                     int(
-                        str(transformerRules[ruleItem]["mindbversion"]).replace(
-                            ".", ""
-                        )[:3]
+                        str(
+                            transformerRules[ruleItem]["minsqlscriptversion"]
+                        ).replace(".", "")[:3]
                     ),
                     int(
-                        str(transformerRules[ruleItem]["maxdbversion"]).replace(
-                            ".", ""
-                        )[:3]
+                        str(
+                            transformerRules[ruleItem]["maxsqlscriptversion"]
+                        ).replace(".", "")[:3]
                     )
                     + 1,
                 ):
 
-                    if int(
-                        str(transformersParameters["optimuscollectionversion"]).replace(
-                            ".", ""
-                        )[:3]
-                    ) in range(
-                        int(
-                            str(
-                                transformerRules[ruleItem]["minsqlscriptversion"]
-                            ).replace(".", "")[:3]
-                        ),
-                        int(
-                            str(
-                                transformerRules[ruleItem]["maxsqlscriptversion"]
-                            ).replace(".", "")[:3]
-                        )
-                        + 1,
-                    ):
+                    if ruleItem not in rulesAlreadyExecuted:
 
-                        if ruleItem not in rulesAlreadyExecuted:
-
-                            print(
-                                '\nProcessing rule item: "{}"\nPriority: "{}"'.format(
-                                    ruleItem, transformerRules[ruleItem]["priority"]
-                                )
+                        print(
+                            '\nProcessing rule item: "{}"\nPriority: "{}"'.format(
+                                ruleItem, transformerRules[ruleItem]["priority"]
                             )
+                        )
 
-                            if (
-                                str(
-                                    transformerRules[ruleItem]["action_details"]["type"]
-                                ).upper()
-                                == "VARIABLE"
-                                and str(
+                        if (
+                            str(
+                                transformerRules[ruleItem]["action_details"]["type"]
+                            ).upper()
+                            == "VARIABLE"
+                            and str(
+                                transformerRules[ruleItem]["action_details"][
+                                    "action"
+                                ]
+                            ).upper()
+                            == "CREATE"
+                        ):
+                            # transformers.json asking to create a variable which is a dictionary
+
+                            try:
+                                transformerResults[ruleItem] = {
+                                    "Status": EXECUTEDSTATUS,
+                                    "Result Value": createTransformersVariable(
+                                        transformerRules[ruleItem]
+                                    ),
+                                }
+                                transformersRulesVariables[
                                     transformerRules[ruleItem]["action_details"][
-                                        "action"
+                                        "varname"
                                     ]
-                                ).upper()
-                                == "CREATE"
-                            ):
-                                # transformers.json asking to create a variable which is a dictionary
+                                ] = transformerResults[ruleItem]["Result Value"]
+
+                            except:
+                                # In case of any issue the rule will be marked as FAILEDSTATUS
+                                transformerResults[ruleItem] = {
+                                    "Status": FAILEDSTATUS,
+                                    "Result Value": None,
+                                }
+                                transformersRulesVariables[
+                                    transformerRules[ruleItem]["action_details"][
+                                        "varname"
+                                    ]
+                                ] = None
 
-                                try:
-                                    transformerResults[ruleItem] = {
-                                        "Status": EXECUTEDSTATUS,
-                                        "Result Value": createTransformersVariable(
-                                            transformerRules[ruleItem]
-                                        ),
-                                    }
-                                    transformersRulesVariables[
-                                        transformerRules[ruleItem]["action_details"][
-                                            "varname"
-                                        ]
-                                    ] = transformerResults[ruleItem]["Result Value"]
+                        elif (
+                            str(
+                                transformerRules[ruleItem]["action_details"]["type"]
+                            ).upper()
+                            in ("NUMBER", "FREESTYLE")
+                            and str(
+                                transformerRules[ruleItem]["action_details"][
+                                    "action"
+                                ]
+                            ).upper()
+                            == "ADD_OR_UPDATE_COLUMN"
+                        ):
+                            # transformers.json asking to add a column that is type number meaning it can be a calculation and the column to be added is NUMBER too
 
-                                except:
-                                    # In case of any issue the rule will be marked as FAILEDSTATUS
-                                    transformerResults[ruleItem] = {
-                                        "Status": FAILEDSTATUS,
-                                        "Result Value": None,
-                                    }
-                                    transformersRulesVariables[
-                                        transformerRules[ruleItem]["action_details"][
-                                            "varname"
-                                        ]
-                                    ] = None
-
-                            elif (
-                                str(
-                                    transformerRules[ruleItem]["action_details"]["type"]
-                                ).upper()
-                                in ("NUMBER", "FREESTYLE")
-                                and str(
+                            (
+                                stringExpression,
+                                iferrorExpression,
+                            ) = getCompiledRuleExprs(
+                                transformerRules[ruleItem]["action_details"]
+                            )
+
+                            # Where the result of expr1 will be saved initially
+                            dfTargetName = transformerRules[ruleItem][
+                                "action_details"
+                            ]["dataframe_name"]
+                            columnTargetName = transformerRules[ruleItem][
+                                "action_details"
+                            ]["column_name"]
+                            ruleCondition = True
+
+                            try:
+                                ruleConditionString = str(
                                     transformerRules[ruleItem]["action_details"][
-                                        "action"
+                                        "ifcondition1"
                                     ]
-                                ).upper()
-                                == "ADD_OR_UPDATE_COLUMN"
-                            ):
-                                # transformers.json asking to add a column that is type number meaning it can be a calculation and the column to be added is NUMBER too
+                                )
+                            except KeyError:
+                                ruleConditionString = None
 
-                                # Where the result of expr1 will be saved initially
-                                dfTargetName = transformerRules[ruleItem][
-                                    "action_details"
-                                ]["dataframe_name"]
-                                columnTargetName = transformerRules[ruleItem][
-                                    "action_details"
-                                ]["column_name"]
-                                ruleCondition = True
+                            # In case ifcondition1 (transformers.json) is set for the rule
+                            if (
+                                ruleConditionString is not None
+                                and ruleConditionString != ""
+                            ):
 
                                 try:
-                                    ruleConditionString = str(
-                                        transformerRules[ruleItem]["action_details"][
-                                            "ifcondition1"
-                                        ]
+                                    ruleCondition = eval(
+                                        compileRuleExpr(ruleConditionString)[0],
+                                        getRuleNamespace(dataFrames),
                                     )
-                                except KeyError:
-                                    ruleConditionString = None
-
-                                # In case ifcondition1 (transformers.json) is set for the rule
-                                if (
-                                    ruleConditionString is not None
-                                    and ruleConditionString != ""
-                                ):
-
-                                    try:
-                                        ruleCondition = eval(ruleConditionString)
-                                        print(
-                                            "ruleCondition = {}".format(ruleCondition)
-                                        )
-                                    except:
-                                        print(
-                                            '\n Error processing ifcondition1 "{}" for rule "{}". So, this rule will be skipped.\n'.format(
-                                                ruleConditionString, ruleItem
-                                            )
-                                        )
-                                        continue
-
-                                if not ruleCondition:
                                     print(
-                                        'WARNING: This rule "{}" will be skipped because of "ifcondition1" from transformers.json is FALSE.'.format(
-                                            ruleItem
-                                        )
-                                    )
-                                    continue
-
-                                try:
-                                    dataFrames[str(dfTargetName).upper()][
-                                        str(columnTargetName).upper()
-                                    ] = execStringExpression(
-                                        stringExpression, iferrorExpression, dataFrames
+                                        "ruleCondition = {}".format(ruleCondition)
                                     )
-                                    df = dataFrames[str(dfTargetName).upper()]
-                                except KeyError:
+                                except:
                                     print(
-                                        '\n WARNING: The rule "{}" could not be executed because the variable "{}" used in the transformers.json could not be found.\n'.format(
-                                            ruleItem, str(dfTargetName).upper()
+                                        '\n Error processing ifcondition1 "{}" for rule "{}". So, this rule will be skipped.\n'.format(
+                                            ruleConditionString, ruleItem
                                         )
                                     )
-                                    continue
+                                    return
 
-                                newTableName = str(
-                                    transformerRules[ruleItem]["action_details"][
-                                        "target_dataframe_name"
-                                    ]
-                                ).lower()
-                                fileName = (
-                                    str(getattr(args, "fileslocation"))
-                                    + "/opdbt__"
-                                    + newTableName
-                                    + "__"
-                                    + collectionKey
-                                )
-
-                                (
-                                    resCSVCreation,
-                                    transformersTablesSchema,
-                                ) = createCSVFromDataframe(
-                                    df,
-                                    transformerRules[ruleItem]["action_details"],
-                                    args,
-                                    fileName,
-                                    transformersTablesSchema,
-                                    newTableName,
-                                    False,
+                            if not ruleCondition:
+                                print(
+                                    'WARNING: This rule "{}" will be skipped because of "ifcondition1" from transformers.json is FALSE.'.format(
+                                        ruleItem
+                                    )
                                 )
+                                return
 
-                                # Creating the new dataframe
-                                dataFrames[str(newTableName).upper()] = df
-
-                                if resCSVCreation:
-                                    # If CSV creation was successfully then we will add this to the list of files to be imported
-                                    fileList.append(fileName)
-
-                            elif (
-                                str(
-                                    transformerRules[ruleItem]["action_details"]["type"]
-                                ).upper()
-                                == "FREESTYLE"
-                                and str(
-                                    transformerRules[ruleItem]["action_details"][
-                                        "action"
-                                    ]
-                                ).upper()
-                                == "CREATE_OR_REPLACE_DATAFRAME"
-                            ):
-                                #
-
-                                df = execStringExpression(
+                            try:
+                                dataFrames[str(dfTargetName).upper()][
+                                    str(columnTargetName).upper()
+                                ] = execStringExpression(
                                     stringExpression, iferrorExpression, dataFrames
                                 )
-
-                                if df is None:
-                                    print(
-                                        '\n WARNING: The rule "{}" could not be executed because the expression "{}" used in the transformers.json could not be executed.\n'.format(
-                                            ruleItem, stringExpression
-                                        )
+                                df = dataFrames[str(dfTargetName).upper()]
+                            except KeyError:
+                                print(
+                                    '\n WARNING: The rule "{}" could not be executed because the variable "{}" used in the transformers.json could not be found.\n'.format(
+                                        ruleItem, str(dfTargetName).upper()
                                     )
-                                    continue
-
-                                newTableName = str(
-                                    transformerRules[ruleItem]["action_details"][
-                                        "dataframe_name"
-                                    ]
-                                ).lower()
-                                fileName = (
-                                    str(getattr(args, "fileslocation"))
-                                    + "/opdbt__"
-                                    + newTableName
-                                    + "__"
-                                    + collectionKey
                                 )
+                                return
+
+                            newTableName = str(
+                                transformerRules[ruleItem]["action_details"][
+                                    "target_dataframe_name"
+                                ]
+                            ).lower()
+                            fileName = (
+                                str(getScratchLocation(args))
+                                + "/opdbt__"
+                                + newTableName
+                                + "__"
+                                + collectionKey
+                            )
 
-                                (
-                                    resCSVCreation,
-                                    transformersTablesSchema,
-                                ) = createCSVFromDataframe(
-                                    df,
-                                    transformerRules[ruleItem]["action_details"],
-                                    args,
-                                    fileName,
-                                    transformersTablesSchema,
-                                    newTableName,
-                                    False,
-                                )
+                            (
+                                resCSVCreation,
+                                transformersTablesSchema,
+                            ) = createCSVFromDataframe(
+                                df,
+                                transformerRules[ruleItem]["action_details"],
+                                args,
+                                fileName,
+                                transformersTablesSchema,
+                                newTableName,
+                                False,
+                            )
 
-                                # Creating the new dataframe
-                                dataFrames[
-                                    str(
-                                        transformerRules[ruleItem]["action_details"][
-                                            "dataframe_name"
-                                        ]
-                                    ).upper()
-                                ] = df
+                            # Creating the new dataframe
+                            dataFrames[str(newTableName).upper()] = df
 
-                                if resCSVCreation:
-                                    # If CSV creation was successfully then we will add this to the list of files to be imported
-                                    fileList.append(fileName)
+                            if resCSVCreation:
+                                # If CSV creation was successfully then we will add this to the list of files to be imported
+                                fileList.append(fileName)
 
-                            elif (
-                                str(
-                                    transformerRules[ruleItem]["action_details"]["type"]
-                                ).upper()
-                                == "FREESTYLE"
-                                and str(
-                                    transformerRules[ruleItem]["action_details"][
-                                        "action"
-                                    ]
-                                ).upper()
-                                == "FREESTYLE"
-                            ):
+                        elif (
+                            str(
+                                transformerRules[ruleItem]["action_details"]["type"]
+                            ).upper()
+                            == "FREESTYLE"
+                            and str(
+                                transformerRules[ruleItem]["action_details"][
+                                    "action"
+                                ]
+                            ).upper()
+                            == "CREATE_OR_REPLACE_DATAFRAME"
+                        ):
+                            #
 
-                                try:
-                                    eval(stringExpression)
-                                except KeyError:
-                                    print(
-                                        '\n WARNING: The rule "{}" could not be executed because the expr1 "{}" used in the transformers.json could not be executed.\n'.format(
-                                            ruleItem, stringExpression
-                                        )
-                                    )
-                                    continue
+                            (
+                                stringExpression,
+                                iferrorExpression,
+                            ) = getCompiledRuleExprs(
+                                transformerRules[ruleItem]["action_details"]
+                            )
 
-                                newTableName = str(
-                                    transformerRules[ruleItem]["action_details"][
-                                        "target_dataframe_name"
-                                    ]
-                                ).lower()
-                                fileName = (
-                                    str(getattr(args, "fileslocation"))
-                                    + "/opdbt__"
-                                    + newTableName
-                                    + "__"
-                                    + collectionKey
-                                )
+                            df = execStringExpression(
+                                stringExpression, iferrorExpression, dataFrames
+                            )
 
-                                (
-                                    resCSVCreation,
-                                    transformersTablesSchema,
-                                ) = createCSVFromDataframe(
-                                    df,
-                                    transformerRules[ruleItem]["action_details"],
-                                    args,
-                                    fileName,
-                                    transformersTablesSchema,
-                                    newTableName,
-                                    False,
+                            if df is None:
+                                print(
+                                    '\n WARNING: The rule "{}" could not be executed because the expression "{}" used in the transformers.json could not be executed.\n'.format(
+                                        ruleItem,
+                                        getParsedRuleExpr(
+                                            transformerRules[ruleItem][
+                                                "action_details"
+                                            ]["expr1"]
+                                        ),
+                                    )
                                 )
+                                return
+
+                            newTableName = str(
+                                transformerRules[ruleItem]["action_details"][
+                                    "dataframe_name"
+                                ]
+                            ).lower()
+                            fileName = (
+                                str(getScratchLocation(args))
+                                + "/opdbt__"
+                                + newTableName
+                                + "__"
+                                + collectionKey
+                            )
 
-                                # Creating the new dataframe
-                                dataFrames[str(newTableName).upper()] = df
-
-                                if resCSVCreation:
-                                    # If CSV creation was successfully then we will add this to the list of files to be imported
-                                    fileList.append(fileName)
+                            (
+                                resCSVCreation,
+                                transformersTablesSchema,
+                            ) = createCSVFromDataframe(
+                                df,
+                                transformerRules[ruleItem]["action_details"],
+                                args,
+                                fileName,
+                                transformersTablesSchema,
+                                newTableName,
+                                False,
+                            )
 
-                            elif (
+                            # Creating the new dataframe
+                            dataFrames[
                                 str(
-                                    transformerRules[ruleItem]["action_details"]["type"]
-                                ).upper()
-                                == "CREATE VIEW"
-                                and str(
                                     transformerRules[ruleItem]["action_details"][
-                                        "action"
+                                        "dataframe_name"
                                     ]
                                 ).upper()
-                                == "EXECUTE_SQL"
-                            ):
+                            ] = df
 
-                                view_name = transformerRules[ruleItem][
-                                    "action_details"
-                                ]["target_object_name"]
-                                view_sql_query = transformerRules[ruleItem][
-                                    "action_details"
-                                ]["expr1"]
-                                view_sql_query = "".join(view_sql_query)
+                            if resCSVCreation:
+                                # If CSV creation was successfully then we will add this to the list of files to be imported
+                                fileList.append(fileName)
+
+                        elif (
+                            str(
+                                transformerRules[ruleItem]["action_details"]["type"]
+                            ).upper()
+                            == "FREESTYLE"
+                            and str(
+                                transformerRules[ruleItem]["action_details"][
+                                    "action"
+                                ]
+                            ).upper()
+                            == "FREESTYLE"
+                        ):
+
+                            (
+                                stringExpression,
+                                iferrorExpression,
+                            ) = getCompiledRuleExprs(
+                                transformerRules[ruleItem]["action_details"]
+                            )
 
-                                import_db_assessment.createOptimusPrimeViewsTransformers(
-                                    gcpProjectName, bqDataset, view_name, view_sql_query
+                            try:
+                                df = eval(
+                                    stringExpression, getRuleNamespace(dataFrames)
                                 )
+                            except (KeyError, TypeError):
+                                print(
+                                    '\n WARNING: The rule "{}" could not be executed because the expr1 "{}" used in the transformers.json could not be executed.\n'.format(
+                                        ruleItem,
+                                        getParsedRuleExpr(
+                                            transformerRules[ruleItem][
+                                                "action_details"
+                                            ]["expr1"]
+                                        ),
+                                    )
+                                )
+                                return
+
+                            newTableName = str(
+                                transformerRules[ruleItem]["action_details"][
+                                    "target_dataframe_name"
+                                ]
+                            ).lower()
+                            fileName = (
+                                str(getScratchLocation(args))
+                                + "/opdbt__"
+                                + newTableName
+                                + "__"
+                                + collectionKey
+                            )
 
-                    else:
+                            (
+                                resCSVCreation,
+                                transformersTablesSchema,
+                            ) = createCSVFromDataframe(
+                                df,
+                                transformerRules[ruleItem]["action_details"],
+                                args,
+                                fileName,
+                                transformersTablesSchema,
+                                newTableName,
+                                False,
+                            )
 
-                        print(
-                            '\n    The rule "{}" is being skipped because of the Optimus Prime SQL Version is {} and not eligible for this rule based on transformers.json configuration file.\n'.format(
-                                str(ruleItem),
-                                str(
-                                    transformersParameters["optimuscollectionversion"]
-                                ).replace(".", "")[:3],
+                            # Creating the new dataframe
+                            dataFrames[str(newTableName).upper()] = df
+
+                            if resCSVCreation:
+                                # If CSV creation was successfully then we will add this to the list of files to be imported
+                                fileList.append(fileName)
+
+                        elif (
+                            str(
+                                transformerRules[ruleItem]["action_details"]["type"]
+                            ).upper()
+                            == "CREATE VIEW"
+                            and str(
+                                transformerRules[ruleItem]["action_details"][
+                                    "action"
+                                ]
+                            ).upper()
+                            == "EXECUTE_SQL"
+                        ):
+
+                            view_name = transformerRules[ruleItem][
+                                "action_details"
+                            ]["target_object_name"]
+                            view_sql_query = transformerRules[ruleItem][
+                                "action_details"
+                            ]["expr1"]
+                            view_sql_query = "".join(view_sql_query)
+
+                            # Views are created in tiers after all the rules of the group
+                            viewDefinitions.append(
+                                (ruleItem, view_name, view_sql_query)
                             )
-                        )
-                        transformerResults[ruleItem] = {
-                            "Status": SKIPPEDSTATUS,
-                            "Result Value": "Due to Optimus Prime SQL Version configurarion on transformers.json",
-                        }
 
                 else:
 
                     print(
-                        '\n    The rule "{}" is being skipped because of the Database Version is {} and not eligible for this rule based on transformers.json configuration file.\n'.format(
+                        '\n    The rule "{}" is being skipped because of the Optimus Prime SQL Version is {} and not eligible for this rule based on transformers.json configuration file.\n'.format(
                             str(ruleItem),
-                            str(transformersParameters["dbversion"]).replace(".", "")[
-                                :3
-                            ],
+                            str(
+                                transformersParameters["optimuscollectionversion"]
+                            ).replace(".", "")[:3],
                         )
                     )
                     transformerResults[ruleItem] = {
                         "Status": SKIPPEDSTATUS,
-                        "Result Value": "Due to the Database Version configurarion on transformers.json",
+                        "Result Value": "Due to Optimus Prime SQL Version configurarion on transformers.json",
                     }
+
             else:
-                # print ('\n    The rule "{}" is being skipped because it belongs to a different EXECUTION GROUP based on transformers.json configuration file.\n'.format(str(ruleItem)))
+
+                print(
+                    '\n    The rule "{}" is being skipped because of the Database Version is {} and not eligible for this rule based on transformers.json configuration file.\n'.format(
+                        str(ruleItem),
+                        str(transformersParameters["dbversion"]).replace(".", "")[
+                            :3
+                        ],
+                    )
+                )
                 transformerResults[ruleItem] = {
                     "Status": SKIPPEDSTATUS,
-                    "Result Value": "Due to the EXECUTION GROUP configurarion on transformers.json",
+                    "Result Value": "Due to the Database Version configurarion on transformers.json",
                 }
-
         else:
-            print(
-                '\n    The rule "{}" is being skipped because it is NOT ENABLED based on transformers.json configuration file.\n'.format(
-                    str(ruleItem)
-                )
-            )
+            # print ('\n    The rule "{}" is being skipped because it belongs to a different EXECUTION GROUP based on transformers.json configuration file.\n'.format(str(ruleItem)))
             transformerResults[ruleItem] = {
                 "Status": SKIPPEDSTATUS,
-                "Result Value": "Due to the STATUS configurarion on transformers.json",
+                "Result Value": "Due to the EXECUTION GROUP configurarion on transformers.json",
             }
 
-    return transformerResults, transformersRulesVariables, fileList, dataFrames
+    else:
+        print(
+            '\n    The rule "{}" is being skipped because it is NOT ENABLED based on transformers.json configuration file.\n'.format(
+                str(ruleItem)
+            )
+        )
+        transformerResults[ruleItem] = {
+            "Status": SKIPPEDSTATUS,
+            "Result Value": "Due to the STATUS configurarion on transformers.json",
+        }
+
+
+def getRuleWorkers(args):
+
+    return max(int(getattr(args, "ruleworkers", 1) or 1), 1)
+
+
+def runRulesConcurrently(
+    sorted_keys,
+    executionGroup,
+    transformerRules,
+    ruleWorkers,
+    ruleArguments,
+    frameLiveness=None,
+):
+    # Runs the rules in a thread pool following the dependency graph of the dataframes they read and write.
+    # Among the rules that are ready, the ones with the lowest priority are started first
+
+    ruleDependencies = getRuleDependencies(
+        sorted_keys, executionGroup, transformerRules
+    )
+
+    pendingRules = list(sorted_keys)
+    runningRules = {}
+    finishedRules = set()
+
+    with ThreadPoolExecutor(max_workers=ruleWorkers) as executor:
+
+        while len(pendingRules) > 0 or len(runningRules) > 0:
+
+            for ruleItem in list(pendingRules):
+
+                if len(runningRules) >= ruleWorkers:
+                    break
+
+                if ruleDependencies[ruleItem].issubset(finishedRules):
+                    pendingRules.remove(ruleItem)
+                    runningRules[
+                        executor.submit(runRuleItem, ruleItem, *ruleArguments)
+                    ] = ruleItem
+
+            doneRules, notDoneRules = wait(runningRules, return_when=FIRST_COMPLETED)
+
+            for future in doneRules:
+                ruleItem = runningRules.pop(future)
+                finishedRules.add(ruleItem)
+                # Errors are raised like in the serial execution
+                future.result()
+                if frameLiveness is not None:
+                    # ruleArguments[2] is the dataframes Hash Table
+                    frameLiveness.ruleFinished(ruleItem, ruleArguments[2])
+
+
+def getRuleDependencies(sorted_keys, executionGroup, transformerRules):
+    # Returns {rule: set of rules that must finish before it}. A rule depends on the previous rules (by priority)
+    # that write a dataframe it reads or writes, or that read a dataframe it writes.
+    # Rules whose dataframes are not known (views, variables, dynamic names) wait for all previous rules and are waited by all the next ones.
+    # Rules that are disabled or from other execution groups are only marked as SKIPPED, so they have no dependencies
+
+    ruleDependencies = {}
+    previousRules = []
+
+    # Dataframes that are the same object (ADD_OR_UPDATE_COLUMN target_dataframe_name is the updated dataframe)
+    dataFrameGroups = getRuleDataFrameGroups(sorted_keys, transformerRules)
+
+    for ruleItem in sorted_keys:
+
+        if (
+            str(transformerRules[ruleItem]["status"]).upper() != "ENABLED"
+            or str(transformerRules[ruleItem]["execution_group"]).upper()
+            != str(executionGroup).upper()
+        ):
+            ruleDependencies[ruleItem] = set()
+            continue
+
+        ruleDataFrames = getRuleDataFrameNames(transformerRules[ruleItem])
+
+        if ruleDataFrames is None:
+            ruleDependencies[ruleItem] = set(
+                previousRule for previousRule, previousReads, previousWrites in previousRules
+            )
+            previousRules.append((ruleItem, None, None))
+            continue
+
+        ruleReads = set(dataFrameGroups.get(name, name) for name in ruleDataFrames[0])
+        ruleWrites = set(dataFrameGroups.get(name, name) for name in ruleDataFrames[1])
+
+        ruleDependencies[ruleItem] = set()
+
+        for previousRule, previousReads, previousWrites in previousRules:
+
+            if previousReads is None:
+                ruleDependencies[ruleItem].add(previousRule)
+            elif len(previousWrites & (ruleReads | ruleWrites)) > 0:
+                ruleDependencies[ruleItem].add(previousRule)
+            elif len(previousReads & ruleWrites) > 0:
+                ruleDependencies[ruleItem].add(previousRule)
+
+        previousRules.append((ruleItem, ruleReads, ruleWrites))
+
+    return ruleDependencies
+
+
+def getRuleDataFrameGroups(sorted_keys, transformerRules):
+    # Returns {dataframe name: group name} for the dataframe names that reference the same dataframe
+
+    dataFrameGroups = {}
+
+    for ruleItem in sorted_keys:
+
+        actionDetails = transformerRules[ruleItem]["action_details"]
+
+        if (
+            str(actionDetails["type"]).upper() in RULE_PYTHON_TYPES
+            and str(actionDetails["action"]).upper() == "ADD_OR_UPDATE_COLUMN"
+        ):
+            sourceName = str(actionDetails["dataframe_name"]).upper()
+            targetName = str(actionDetails["target_dataframe_name"]).upper()
+
+            sourceGroup = dataFrameGroups.get(sourceName, sourceName)
+            targetGroup = dataFrameGroups.get(targetName, targetName)
+
+            for name, group in list(dataFrameGroups.items()):
+                if group == targetGroup:
+                    dataFrameGroups[name] = sourceGroup
+
+            dataFrameGroups[sourceName] = sourceGroup
+            dataFrameGroups[targetName] = sourceGroup
+
+    return dataFrameGroups
+
+
+def getRuleDataFrameNames(transformerRule):
+    # Returns (dataframes read, dataframes written) by a python rule. None when they cannot be known
+
+    actionDetails = transformerRule["action_details"]
+    ruleType = str(actionDetails["type"]).upper()
+    ruleAction = str(actionDetails["action"]).upper()
+
+    if ruleType not in RULE_PYTHON_TYPES:
+        return None
+
+    ruleReads = set()
+
+    for exprField in ("expr1", "iferror", "ifcondition1"):
+
+        if exprField not in actionDetails:
+            continue
+
+        exprNames = getRuleExprDataFrameNames(str(actionDetails[exprField]))
+
+        if exprNames is None:
+            return None
+
+        ruleReads.update(exprNames)
+
+    if ruleAction == "ADD_OR_UPDATE_COLUMN":
+        ruleWrites = {
+            str(actionDetails["dataframe_name"]).upper(),
+            str(actionDetails["target_dataframe_name"]).upper(),
+        }
+    elif ruleAction == "CREATE_OR_REPLACE_DATAFRAME":
+        ruleWrites = {str(actionDetails["dataframe_name"]).upper()}
+    elif ruleAction == "FREESTYLE":
+        ruleWrites = {str(actionDetails["target_dataframe_name"]).upper()}
+    else:
+        return None
+
+    return ruleReads, ruleWrites
+
+
+@lru_cache(maxsize=None)
+def getRuleExprDataFrameNames(ruleExpr):
+    # Returns the names X of the dataFrames["X"] used by an expression. None when dataFrames is used in any other way
+
+    stringExpression = getParsedRuleExpr(ruleExpr).strip()
+
+    if stringExpression == "" or stringExpression == RULE_EXPRESSION_IGNORE:
+        return frozenset()
+
+    try:
+        exprTree = ast.parse(stringExpression, mode="eval")
+    except SyntaxError:
+        return None
+
+    dataFrameNames = set()
+    subscriptedNodes = set()
+
+    for node in ast.walk(exprTree):
+        if (
+            isinstance(node, ast.Subscript)
+            and isinstance(node.value, ast.Name)
+            and node.value.id == "dataFrames"
+        ):
+            sliceNode = node.slice
+            # Python 3.8 wraps the subscript in ast.Index
+            if isinstance(sliceNode, getattr(ast, "Index", ())):
+                sliceNode = sliceNode.value
+
+            if isinstance(sliceNode, ast.Constant) and isinstance(
+                sliceNode.value, str
+            ):
+                dataFrameNames.add(sliceNode.value.upper())
+                subscriptedNodes.add(id(node.value))
+            else:
+                return None
+
+    for node in ast.walk(exprTree):
+        if (
+            isinstance(node, ast.Name)
+            and node.id == "dataFrames"
+            and id(node) not in subscriptedNodes
+        ):
+            return None
+
+    return frozenset(dataFrameNames)
 
 
 def execStringExpression(stringExpression, iferrorExpression, dataFrames):
+    # Expressions are the code objects from compileRuleExpr. None means the expression could not be compiled
+
+    ruleNamespace = getRuleNamespace(dataFrames)
 
     try:
-        res = eval(stringExpression)
+        res = eval(stringExpression, ruleNamespace)
     except:
         try:
-            res = eval(iferrorExpression)
+            res = eval(iferrorExpression, ruleNamespace)
         except:
             res = None
 
     return res
 
 
+def getRuleNamespace(dataFrames):
+    # Names available to the rule expressions
+
+    return {"dataFrames": dataFrames, "np": np, "pd": pd}
+
+
+def getCompiledRuleExprs(actionDetails):
+    # Returns the code objects of expr1 and iferror for a rule
+
+    return (
+        compileRuleExpr(str(actionDetails["expr1"]))[0],
+        compileRuleExpr(str(actionDetails["iferror"]))[0],
+    )
+
+
+@lru_cache(maxsize=None)
+def compileRuleExpr(ruleExpr):
+    # Parses, validates and compiles a rule expression from transformers.json. Returns (code object, error message)
+    # Results are kept for the whole process, so each expression is compiled once for all execution groups and API requests
+
+    stringExpression = getParsedRuleExpr(ruleExpr).strip()
+
+    if stringExpression == "" or stringExpression == RULE_EXPRESSION_IGNORE:
+        return None, None
+
+    try:
+        exprTree = ast.parse(stringExpression, mode="eval")
+    except SyntaxError as syntaxErr:
+        return None, "Invalid syntax: {}".format(syntaxErr)
+
+    unknownNames = getRuleExprUnknownNames(exprTree)
+
+    if len(unknownNames) > 0:
+        return None, "Unknown names {}. Expressions can only use {}".format(
+            unknownNames, sorted(RULE_EXPRESSION_NAMES)
+        )
+
+    return compile(exprTree, "<transformers.json>", "eval"), None
+
+
+def getRuleExprUnknownNames(exprTree):
+    # Names read by the expression that are not the rule namespace, python built-ins or lambda/comprehension variables
+
+    loadedNames = set()
+    boundNames = set()
+
+    for node in ast.walk(exprTree):
+        if isinstance(node, ast.Name):
+            if isinstance(node.ctx, ast.Load):
+                loadedNames.add(node.id)
+            else:
+                boundNames.add(node.id)
+        elif isinstance(node, ast.arg):
+            boundNames.add(node.arg)
+
+    return sorted(
+        loadedNames - boundNames - RULE_EXPRESSION_NAMES - set(dir(builtins))
+    )
+
+
+def validateRules(transformerRules):
+    # Compiles the expressions of all enabled python rules before any of them runs. Returns the list of errors found
+
+    ruleErrors = []
+
+    for ruleItem in transformerRules:
+
+        if str(transformerRules[ruleItem]["status"]).upper() != "ENABLED":
+            continue
+
+        actionDetails = transformerRules[ruleItem]["action_details"]
+
+        if str(actionDetails["type"]).upper() not in RULE_PYTHON_TYPES:
+            continue
+
+        for exprField in ("expr1", "iferror", "ifcondition1"):
+
+            if exprField not in actionDetails:
+                continue
+
+            codeObject, compileError = compileRuleExpr(str(actionDetails[exprField]))
+
+            if compileError is not None:
+                ruleErrors.append((ruleItem, exprField, compileError))
+
+    return ruleErrors
+
+
 def getParsedRuleExpr(ruleExpr):
     # Function to get a clean string to be executed in eval function. The input is a string with many components separated by ; coming from transformers.json
 
@@ -559,7 +1023,7 @@ def getDataFrameFromCSV(
                     )
                     tableHeaders = [header.upper() for header in tableHeaders]
                     # df = pd.read_csv(csvFileName, skiprows=skipRows+1, header=None, names=tableHeaders, keep_default_na=False, na_filter= False)
-                    df = pd.read_csv(
+                    df = collection_archive.readCollectionCSV(
                         csvFileName,
                         skiprows=skipRows + 1,
                         sep=str(fileSeparator),
@@ -579,7 +1043,7 @@ def getDataFrameFromCSV(
                     )
                     paramCleanDFHeaders = True
                     # df = pd.read_csv(csvFileName, skiprows=skipRows, keep_default_na=False, na_filter= False)
-                    df = pd.read_csv(
+                    df = collection_archive.readCollectionCSV(
                         csvFileName,
                         sep=str(fileSeparator),
                         skiprows=skipRows,
@@ -591,7 +1055,7 @@ def getDataFrameFromCSV(
             else:
 
                 # df = pd.read_csv(csvFileName, skiprows=skipRows, keep_default_na=False, na_filter= False)
-                df = pd.read_csv(
+                df = collection_archive.readCollectionCSV(
                     csvFileName,
                     sep=str(fileSeparator),
                     skiprows=skipRows,
@@ -611,123 +1075,434 @@ def getDataFrameFromCSV(
             columList = [column.strip() for column in columList]
             df.columns = columList
 
-    except Exception as generalErr:
-        print("\nThe filename {} is most likely empty.\n".format(csvFileName))
-        return False
+    except Exception as generalErr:
+        print("\nThe filename {} is most likely empty.\n".format(csvFileName))
+        return False
+
+    return df
+
+
+def getDFHeadersFromTransformers(tableName, transformersTablesSchema):
+
+    tableConfig = transformersTablesSchema.get(tableName)
+
+    tableHeaders = [header[0] for header in tableConfig]
+
+    return tableHeaders
+
+
+def getAllDataFrames(
+    fileList,
+    skipRows,
+    collectionKey,
+    args,
+    transformersTablesSchema,
+    dbAssessmentDataframes,
+    transformersParameters,
+    invalidfiles,
+    skipvalidations,
+    requiredTables=None,
+    inferredSchemaTypes=None,
+):
+    # Fuction to read from CSVs and store the data into a dataframe. The dataframe is placed then into a Hash Table.
+    # This function returns a dictionary with dataframes from CSVs
+    # With requiredTables (-lazyload) only the files of those tables are read into dataframes. The other files are only validated
+    # inferredSchemaTypes keeps the column types found by -schematypes INFER across the calls of the same run
+
+    separatorString = args.sep
+
+    # Hash table to store dataframes after being loaded from CSVs
+    dataFrames = dbAssessmentDataframes
+
+    fileList.sort()
+
+    # Files to be parsed into dataframes as (fileName, tableName)
+    parseFiles = []
+    # Files to be validated only as (fileName, tableName)
+    validateFiles = []
+
+    for fileName in fileList:
+
+        # Verifying if the file is a file that came from the SQL Script or is this is a result of a previous execution from transformers.json in which a file had been saved. I.E: Reshaped Dataframes
+        collectionType = import_db_assessment.getObjNameFromFiles(
+            str(fileName), "__", 0
+        )
+        collectionType = collectionType.split("/")[-1]
+
+        if collectionType == "opdbt":
+            # This file is not from SQL Script. Meaning this is a file generated by Optimus Prime in a prior execution. Skipping CSV files that are result of a previous transformation execution
+
+            continue
+
+        # Final table name from the CSV file names
+        tableName = collection_index.getTableName(fileName)
+
+        if str(tableName).lower() in transformersParameters["do_not_import"]:
+
+            print(
+                "\n This table name {} for filename {} is being SKIPPED due to do_not_import parameter in transformers.json configuration file".format(
+                    tableName, fileName
+                )
+            )
+
+            continue
+
+        if (
+            requiredTables is not None
+            and str(tableName).upper() not in requiredTables
+            and transformersTablesSchema.get(str(tableName).lower()) is not None
+        ):
+            # No rule uses this table, so the file is imported to Big Query straight from the OS
+            validateFiles.append((fileName, tableName))
+            continue
+
+        parseFiles.append((fileName, tableName))
+
+    if len(validateFiles) > 0:
+        print(
+            "\n {} files are not read into dataframes because no rule uses their tables (-lazyload)".format(
+                len(validateFiles)
+            )
+        )
+
+        if not skipvalidations:
+            for fileName, fileError in getValidatedFiles(
+                validateFiles, args, transformersTablesSchema
+            ):
+                if fileError is not None:
+                    print(
+                        "File {} is skipped because of error -> {} ".format(
+                            os.path.basename(fileName), fileError
+                        )
+                    )
+                    invalidfiles[fileName] = fileError
+
+    # Tables with dataframes read in this call
+    parsedTables = set()
+    # Dataframes of each table to be consolidated by -consolidatedataframes, in file order
+    tableParts = {}
+
+    # The results always come back in the parseFiles order, so the dataframes are consolidated in the same order no matter which file is parsed first
+    for fileName, tableName, df, fileError in getParsedDataFrames(
+        parseFiles, skipRows, args, transformersTablesSchema, skipvalidations
+    ):
+
+        if fileError is not None:
+            basename = os.path.basename(fileName)
+            print(
+                "File {} is skipped because of error -> {} ".format(
+                    basename, fileError
+                )
+            )
+            invalidfiles[fileName] = fileError
+            continue
+
+        # Checking if no error was found during loading CSV from OS
+        if df is not False:
+
+            if args.consolidatedataframes:
+
+                # The dataframes of the same table are concatenated once after all files are read, so every row is copied only once
+                if str(tableName).upper() not in tableParts:
+                    tableParts[str(tableName).upper()] = (
+                        [dataFrames[str(tableName).upper()]]
+                        if str(tableName).upper() in dataFrames
+                        else []
+                    )
+                tableParts[str(tableName).upper()].append(df)
+
+            else:
+                # The dataframe was already trimmed by readDataFrameFromFile
+                dataFrames[str(tableName).upper()] = df
+
+            transformersTablesSchema = processSchemaDetection(
+                args.schemadetection,
+                transformersTablesSchema,
+                transformersParameters,
+                tableName,
+                df,
+            )
+
+            transformersTablesSchema = processSchemaTypeInference(
+                args,
+                transformersTablesSchema,
+                inferredSchemaTypes,
+                tableName,
+                df,
+            )
+
+            parsedTables.add(str(tableName).upper())
+
+    for consolidatedTable, dfParts in tableParts.items():
+
+        try:
+            # The dataframes were already trimmed by readDataFrameFromFile
+            dataFrames[consolidatedTable] = pd.concat(dfParts, axis=0)
+            if len(dfParts) > 1:
+                print(
+                    " Concatenated {} dataframes for table name {}".format(
+                        len(dfParts), consolidatedTable.lower()
+                    )
+                )
+
+        except Exception as concatErr:
+            print(
+                "\nWARNING: The dataframes for table name {} could not be concatenated. Only the last file is kept. Error: {}".format(
+                    consolidatedTable.lower(), concatErr
+                )
+            )
+            dataFrames[consolidatedTable] = dfParts[-1]
+
+    # The parts are no longer needed once the tables are consolidated
+    tableParts.clear()
+
+    if isCompactFrames(args):
+        # Compacting after the files are consolidated, so every table is converted only once
+        categoricalColumns = getCategoricalColumns(transformersParameters)
+        for parsedTable in sorted(parsedTables):
+            dataFrames[parsedTable] = compactDataframe(
+                dataFrames[parsedTable], categoricalColumns
+            )
+
+    if parse_cache.isCacheEnabled(args):
+        # Keeping the parse cache under -parsecachemaxmb
+        parse_cache.evictCache(args)
+
+    return dataFrames, transformersTablesSchema
+
+
+def getScratchLocation(args):
+    # Directory of the opdbt__ files generated by Optimus Prime. AssessmentRun sets it to the run directory in the options of the run
+
+    return getattr(
+        args, "scratchlocation", None
+    ) or collection_archive.getWritableLocation(getattr(args, "fileslocation"))
+
+
+def isLazyLoad(args):
+
+    return bool(getattr(args, "lazyload", False))
+
+
+def getRequiredTableNames(transformerRules, transformersParameters):
+    # Tables read into dataframes by -lazyload: the tables used by the enabled python rules, the op_enable_reshape_for tables and OPKEYLOG.
+    # Returns None when a rule uses dataframes that cannot be known from its expressions, so all tables are read
+
+    requiredTables = {"OPKEYLOG"}
+
+    for ruleItem in transformerRules.keys():
+
+        if str(transformerRules[ruleItem]["status"]).upper() != "ENABLED":
+            continue
+
+        if (
+            str(transformerRules[ruleItem]["action_details"]["type"]).upper()
+            not in RULE_PYTHON_TYPES
+        ):
+            continue
+
+        ruleDataFrames = getRuleDataFrameNames(transformerRules[ruleItem])
+
+        if ruleDataFrames is None:
+            print(
+                '\nWARNING: The dataframes used by the rule "{}" could not be found from its expressions. All tables will be read into dataframes.\n'.format(
+                    ruleItem
+                )
+            )
+            return None
+
+        requiredTables.update(ruleDataFrames[0])
+        requiredTables.update(ruleDataFrames[1])
+
+    if transformersParameters.get("op_enable_reshape_for") is not None:
+        for tableName_RuleID in str(
+            transformersParameters.get("op_enable_reshape_for")
+        ).split(","):
+            requiredTables.add(str(tableName_RuleID).split(":")[0].upper())
+
+    return requiredTables
 
-    return df
 
+def getValidatedFiles(validateFiles, args, transformersTablesSchema):
+    # Returns (fileName, fileError) for all (fileName, tableName) in validateFiles. The files are validated by -parseworkers threads
 
-def getDFHeadersFromTransformers(tableName, transformersTablesSchema):
+    with ThreadPoolExecutor(max_workers=getParseWorkers(args)) as executor:
+        return list(
+            executor.map(
+                validateFileOnly,
+                [fileName for fileName, tableName in validateFiles],
+                [tableName for fileName, tableName in validateFiles],
+                repeat(args),
+                repeat(transformersTablesSchema),
+            )
+        )
 
-    tableConfig = transformersTablesSchema.get(tableName)
 
-    tableHeaders = [header[0] for header in tableConfig]
+def validateFileOnly(fileName, tableName, args, transformersTablesSchema):
 
-    return tableHeaders
+    tableHeaders = getDFHeadersFromTransformers(tableName, transformersTablesSchema)
+    tableHeader = [header.upper() for header in tableHeaders]
 
+    return fileName, validateInputcsv(fileName, tableHeader, args)
 
-def getAllDataFrames(
-    fileList,
-    skipRows,
-    collectionKey,
-    args,
-    transformersTablesSchema,
-    dbAssessmentDataframes,
-    transformersParameters,
-    invalidfiles,
-    skipvalidations,
-):
-    # Fuction to read from CSVs and store the data into a dataframe. The dataframe is placed then into a Hash Table.
-    # This function returns a dictionary with dataframes from CSVs
 
-    separatorString = args.sep
+def getParseWorkers(args):
+    # Number of processes used to parse the CSV files into dataframes. -parseworkers 1 parses them in the main process
 
-    # Hash table to store dataframes after being loaded from CSVs
-    dataFrames = dbAssessmentDataframes
+    try:
+        return max(int(getattr(args, "parseworkers", 1)), 1)
+    except (TypeError, ValueError):
+        return 1
 
-    fileList.sort()
-    for fileName in fileList:
 
-        # Verifying if the file is a file that came from the SQL Script or is this is a result of a previous execution from transformers.json in which a file had been saved. I.E: Reshaped Dataframes
-        collectionType = import_db_assessment.getObjNameFromFiles(
-            str(fileName), "__", 0
-        )
-        collectionType = collectionType.split("/")[-1]
+def getParsedDataFrames(
+    parseFiles, skipRows, args, transformersTablesSchema, skipvalidations
+):
+    # Generator returning (fileName, tableName, df, fileError) for all (fileName, tableName) in parseFiles and in the same order.
+    # When -parseworkers is greater than 1 the files are read, validated and trimmed by a pool of processes
 
-        if collectionType == "opdbt":
-            # This file is not from SQL Script. Meaning this is a file generated by Optimus Prime in a prior execution. Skipping CSV files that are result of a previous transformation execution
+    parseWorkers = getParseWorkers(args)
 
-            continue
+    if parseWorkers <= 1 or len(parseFiles) <= 1:
 
-        # Final table name from the CSV file names
-        tableName = import_db_assessment.getObjNameFromFiles(fileName, "__", 1)
+        for fileName, tableName in parseFiles:
+            yield readDataFrameFromFile(
+                fileName,
+                tableName,
+                skipRows,
+                args,
+                transformersTablesSchema,
+                skipvalidations,
+            )
 
-        if str(tableName).lower() in transformersParameters["do_not_import"]:
+    else:
 
-            print(
-                "\n This table name {} for filename {} is being SKIPPED due to do_not_import parameter in transformers.json configuration file".format(
-                    tableName, fileName
-                )
+        print(
+            "\n Parsing {} files into dataframes using {} processes".format(
+                len(parseFiles), parseWorkers
             )
+        )
 
-            continue
+        with ProcessPoolExecutor(max_workers=parseWorkers) as executor:
+
+            if str(args.schemadetection).upper() == "AUTO":
+                yield from getParsedDataFramesInWaves(
+                    executor,
+                    parseFiles,
+                    skipRows,
+                    args,
+                    transformersTablesSchema,
+                    skipvalidations,
+                )
+                return
+
+            # executor.map returns the results in the same order as the input
+            yield from executor.map(
+                readDataFrameFromFile,
+                [fileName for fileName, tableName in parseFiles],
+                [tableName for fileName, tableName in parseFiles],
+                repeat(skipRows),
+                repeat(args),
+                repeat(transformersTablesSchema),
+                repeat(skipvalidations),
+            )
 
-        print("\n Processing {} into a dataframe {}".format(fileName, tableName))
 
-        # Validate the CSV file
-        tableHeaders = getDFHeadersFromTransformers(tableName, transformersTablesSchema)
-        tableHeader = [header.upper() for header in tableHeaders]
-        if not skipvalidations:
-            fileError = validateInputcsv(fileName, tableHeader, args)
-            if fileError is not None:
-                basename = os.path.basename(fileName)
-                print(
-                    "File {} is skipped because of error -> {} ".format(
-                        basename, fileError
-                    )
+def getParsedDataFramesInWaves(
+    executor, parseFiles, skipRows, args, transformersTablesSchema, skipvalidations
+):
+    # With -schemadetection AUTO each parsed file replaces the schema of its table and the next files of the table are read
+    # with it, like in the serial parse. Until a file of a table is parsed, its files are parsed one per wave. After that the
+    # schema does not change anymore (the files are read with its column names), so the remaining files are parsed together
+
+    readSchema = dict(transformersTablesSchema)
+    settledTables = set()
+    results = {}
+    pendingFiles = list(range(len(parseFiles)))
+
+    while len(pendingFiles) > 0:
+
+        waveFiles = []
+        waveTables = set()
+        for fileIndex in pendingFiles:
+            tableName = parseFiles[fileIndex][1]
+            if tableName in settledTables or tableName not in waveTables:
+                waveFiles.append(fileIndex)
+                waveTables.add(tableName)
+
+        for fileIndex, result in zip(
+            waveFiles,
+            executor.map(
+                readDataFrameFromFile,
+                [parseFiles[fileIndex][0] for fileIndex in waveFiles],
+                [parseFiles[fileIndex][1] for fileIndex in waveFiles],
+                repeat(skipRows),
+                repeat(args),
+                repeat(readSchema),
+                repeat(skipvalidations),
+            ),
+        ):
+            results[fileIndex] = result
+            fileName, tableName, df, fileError = result
+
+            if fileError is None and df is not False and tableName not in settledTables:
+                readSchema = processSchemaDetection(
+                    args.schemadetection, readSchema, None, tableName, df
                 )
-                invalidfiles[fileName] = fileError
-                continue
-        # Storing Dataframe in a Hash Table using as a key the final Table name coming from CSV filename
-        df = getDataFrameFromCSV(
-            fileName, tableName, skipRows, args, transformersTablesSchema
-        )
+                settledTables.add(tableName)
 
-        # Checking if no error was found during loading CSV from OS
-        if df is not False:
+        pendingFiles = [
+            fileIndex for fileIndex in pendingFiles if fileIndex not in results
+        ]
 
-            if args.consolidatedataframes:
+    # The results come back in the parseFiles order, like executor.map
+    for fileIndex in range(len(parseFiles)):
+        yield results.pop(fileIndex)
 
-                try:
-                    df_concat = pd.concat(
-                        [dataFrames[str(tableName).upper()], df], axis=0
-                    )
-                    # Trimming the data before storing it
-                    dataFrames[str(tableName).upper()] = trimDataframe(df_concat)
-                    print(
-                        " Concatenated into an existing dataframe for table name {}".format(
-                            tableName
-                        )
-                    )
 
-                except:
-                    # Trimming the data before storing it
-                    dataFrames[str(tableName).upper()] = trimDataframe(df)
+def readDataFrameFromFile(
+    fileName, tableName, skipRows, args, transformersTablesSchema, skipvalidations
+):
+    # Validates, reads and trims one CSV file. It runs in the parse worker processes, so it only uses its parameters.
+    # Returns (fileName, tableName, df, fileError). df is False when the file could not be read and fileError is not None for invalid files
 
-            else:
-                # Trimming the data before storing it
-                dataFrames[str(tableName).upper()] = trimDataframe(df)
+    print("\n Processing {} into a dataframe {}".format(fileName, tableName))
 
-            transformersTablesSchema = processSchemaDetection(
-                args.schemadetection,
-                transformersTablesSchema,
-                transformersParameters,
-                tableName,
-                df,
-            )
+    tableHeaders = getDFHeadersFromTransformers(tableName, transformersTablesSchema)
+    tableHeader = [header.upper() for header in tableHeaders]
 
-    return dataFrames, transformersTablesSchema
+    cacheKey = None
+    if parse_cache.isCacheEnabled(args):
+        # Unchanged files are loaded from the parse cache
+        cacheKey = parse_cache.getCacheKey(
+            fileName, tableHeader, skipRows, skipvalidations, args
+        )
+        df = parse_cache.loadCachedDataFrame(args, cacheKey)
+        if df is not None:
+            print(" Loaded {} from the parse cache".format(fileName))
+            return fileName, tableName, df, None
+
+    if not skipvalidations:
+        # Validating the CSV file while it is read, so the file is opened only once
+        df, fileError = readValidatedDataFrame(
+            fileName, tableName, tableHeader, skipRows, args
+        )
+        if fileError is not None:
+            return fileName, tableName, False, fileError
+
+    else:
+        df = getDataFrameFromCSV(
+            fileName, tableName, skipRows, args, transformersTablesSchema
+        )
+
+    if df is not False:
+        # Trimming the data before storing it
+        df = trimDataframe(df)
+
+        if cacheKey is not None:
+            parse_cache.storeCachedDataFrame(args, cacheKey, df)
+
+    return fileName, tableName, df, None
 
 
 def processSchemaDetection(
@@ -758,11 +1533,160 @@ def processSchemaDetection(
     return transformersTablesSchema
 
 
+def isSchemaTypeInference(args):
+
+    return str(getattr(args, "schematypes", "STRING")).upper() == "INFER"
+
+
+def processSchemaTypeInference(
+    args, transformersTablesSchema, inferredSchemaTypes, tableName, df
+):
+    # With -schematypes INFER the STRING types of the table schema are replaced by the types found in the parsed dataframe.
+    # inferredSchemaTypes ({table: {COLUMN: type}}) has the columns inferred so far in the run. The files of the same table
+    # are widened together (I.E: INT64 + NUMERIC = NUMERIC, anything + STRING = STRING)
+
+    if not isSchemaTypeInference(args) or inferredSchemaTypes is None:
+        return transformersTablesSchema
+
+    tableName = str(tableName).lower()
+
+    if transformersTablesSchema.get(tableName) is None:
+        return transformersTablesSchema
+
+    transformersTablesSchema[tableName] = applyInferredBQDataTypes(
+        transformersTablesSchema[tableName],
+        df,
+        inferredSchemaTypes.setdefault(tableName, {}),
+    )
+
+    return transformersTablesSchema
+
+
+def applyInferredBQDataTypes(tableSchema, df, inferredTypes=None):
+    # Returns the table schema ([column, type] list) with the types inferred from the dataframe columns (matched ignoring case).
+    # Only STRING columns from the configuration are inferred, typed columns from transformers.json are kept as they are.
+    # inferredTypes ({COLUMN: type}) has the columns already inferred from other files of the table, which are widened. It is updated.
+    # Columns without values in any file so far have the type None in inferredTypes and are STRING in the schema
+
+    if inferredTypes is None:
+        inferredTypes = {}
+
+    dfColumns = {str(column).upper(): column for column in df.columns}
+
+    newTableSchema = []
+
+    for schemaField in tableSchema:
+
+        columnName, dataType = schemaField[0], str(schemaField[1]).upper()
+        column = dfColumns.get(str(columnName).upper())
+
+        if column is not None and str(columnName).upper() in inferredTypes:
+            dataType = widenBQDataType(
+                inferredTypes[str(columnName).upper()], inferBQDataType(df[column])
+            )
+            inferredTypes[str(columnName).upper()] = dataType
+
+        elif column is not None and dataType == "STRING":
+            dataType = inferBQDataType(df[column])
+            inferredTypes[str(columnName).upper()] = dataType
+
+        newTableSchema.append([columnName, dataType or "STRING"])
+
+    return newTableSchema
+
+
+def mergeInferredBQDataTypes(
+    transformersTablesSchema, inferredSchemaTypes, tableName, tableInferredTypes
+):
+    # Widens the types inferred for a table somewhere else (I.E: by a partition) with the types inferred so far
+
+    tableName = str(tableName).lower()
+    inferredTypes = inferredSchemaTypes.setdefault(tableName, {})
+
+    for columnName, dataType in tableInferredTypes.items():
+        # Columns without values (None) do not change the types found in the other files
+        inferredTypes[columnName] = widenBQDataType(
+            inferredTypes.get(columnName), dataType
+        )
+
+    transformersTablesSchema[tableName] = [
+        [
+            schemaField[0],
+            (inferredTypes[str(schemaField[0]).upper()] or "STRING")
+            if str(schemaField[0]).upper() in inferredTypes
+            else schemaField[1],
+        ]
+        for schemaField in transformersTablesSchema[tableName]
+    ]
+
+    return transformersTablesSchema
+
+
+def inferBQDataType(series):
+    # Big Query type for a dataframe column: INT64, NUMERIC, BOOL, TIMESTAMP or STRING. None when the column has no values,
+    # so a file where a sparse column is empty does not decide its type
+
+    values = series.dropna()
+
+    if len(values) == 0:
+        return None
+
+    if pd.api.types.is_bool_dtype(values):
+        return "BOOL"
+
+    if pd.api.types.is_integer_dtype(values):
+        return "INT64"
+
+    if pd.api.types.is_float_dtype(values):
+
+        if not np.isfinite(values).all():
+            return "STRING"
+
+        # Integer values in a float column come from columns with missing values
+        if (values == np.floor(values)).all() and values.abs().max() < 2 ** 63:
+            return "INT64"
+
+        # Big Query NUMERIC has 29 integer digits
+        if values.abs().max() < 1e29:
+            return "NUMERIC"
+
+        return "STRING"
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return "TIMESTAMP"
+
+    if values.dtype == object:
+        if values.astype(str).str.strip().str.match(TIMESTAMP_PATTERN).all():
+            return "TIMESTAMP"
+
+    return "STRING"
+
+
+def widenBQDataType(currentType, newType):
+    # Type that can hold the values of both types. None is a column without values so far
+
+    if currentType is None:
+        return newType
+
+    if newType is None or currentType == newType:
+        return currentType
+
+    if {currentType, newType} == {"INT64", "NUMERIC"}:
+        return "NUMERIC"
+
+    return "STRING"
+
+
 def validateInputcsv(fileName, tableHeader, args):
+    # The first rows are parsed to find empty files and the rest of the file is only scanned for the messages, in a single read
     fileerror = None
+    try:
+        reader = ValidatingCSVReader(fileName)
+    except Exception as otherErr:
+        return "File has Errors - {}".format(otherErr)
     try:
         df = pd.read_csv(
-            fileName,
+            reader,
             sep=str(args.sep),
             skiprows=2,
             na_values="n/a",
@@ -776,14 +1700,13 @@ def validateInputcsv(fileName, tableHeader, args):
             ## If file has header but no rows
             fileerror = "File seems to be Empty"
         else:
-            with open(fileName, "r") as f:
-                lines = f.readlines()
-                last_line = lines[-1]
-                # if 'ORA-' in f.read():
-                if any(line.startswith("ORA-") for line in lines):
-                    fileerror = "File has ORA-Errors"
-                if last_line.startswith("Elapsed:"):
-                    fileerror = "File has Elapsed time message from Oracle, Please remove the message and reprocess"
+            # Lines not parsed by pandas
+            for line in reader:
+                pass
+            if reader.hasOraErrors:
+                fileerror = "File has ORA-Errors"
+            if reader.lastLineHead.startswith("Elapsed:"):
+                fileerror = "File has Elapsed time message from Oracle, Please remove the message and reprocess"
     except pd.errors.EmptyDataError:
         ## If file has no records
         fileerror = "File seems to be Empty"
@@ -791,10 +1714,170 @@ def validateInputcsv(fileName, tableHeader, args):
         fileerror = "File seems to be of improper format"
     except Exception as otherErr:
         fileerror = "File has Errors - {}".format(otherErr)
+    finally:
+        reader.close()
 
     return fileerror
 
 
+class ValidatingCSVReader:
+    # Text file wrapper given to pd.read_csv. While pandas reads the file, every line is checked for the messages
+    # of Oracle (ORA- errors and the Elapsed: message in the last line), so the file is read only once
+
+    # Only the beginning of each line is needed to find the messages
+    LINE_HEAD_SIZE = 16
+
+    def __init__(self, fileName):
+        self._file = collection_archive.openCollectionFile(fileName, "r")
+        self._currentLineHead = ""
+        self.lastLineHead = ""
+        self.hasOraErrors = False
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+
+        if data:
+            self._scan(data)
+        else:
+            # End of file
+            self._finishLine()
+
+        return data
+
+    def readline(self, size=-1):
+        line = self._file.readline(size)
+
+        if line:
+            self._scan(line)
+        else:
+            self._finishLine()
+
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+    def close(self):
+        self._file.close()
+
+    def _scan(self, data):
+        lines = data.split("\n")
+
+        for index, line in enumerate(lines):
+
+            if index > 0:
+                # A new line started in this chunk of data
+                self._finishLine()
+
+            if len(self._currentLineHead) < self.LINE_HEAD_SIZE:
+                self._currentLineHead = (
+                    self._currentLineHead
+                    + line[: self.LINE_HEAD_SIZE - len(self._currentLineHead)]
+                )
+
+    def _finishLine(self):
+        if self._currentLineHead.startswith("ORA-"):
+            self.hasOraErrors = True
+
+        if self._currentLineHead.strip() != "":
+            self.lastLineHead = self._currentLineHead
+
+        self._currentLineHead = ""
+
+
+def readValidatedDataFrame(csvFileName, tableName, tableHeader, skipRows, args):
+    # Reads the CSV file into a dataframe and validates it in the same pass (empty files, header mismatches, ORA- errors and Elapsed: messages).
+    # Returns (df, fileError). fileError is None for valid files
+
+    # Configuration files always will be ,
+    if "opConfig" in csvFileName:
+        fileSeparator = ","
+    else:
+        fileSeparator = args.sep
+
+    df, fileerror, parseErr = readValidatingCSV(
+        csvFileName,
+        fileSeparator,
+        skiprows=skipRows + 1,
+        header=None,
+        names=tableHeader,
+        index_col=False,
+    )
+
+    if parseErr is not None:
+        # Like getDataFrameFromCSV, the file is read again using its own header row
+        print(
+            "\nThe filename {} for the table {} could not be imported using the column names {}.\n".format(
+                csvFileName, tableName, tableHeader
+            )
+        )
+        df, fileerror, parseErr = readValidatingCSV(
+            csvFileName, fileSeparator, skiprows=skipRows
+        )
+
+        if parseErr is not None:
+            fileerror = "File has Errors - {}".format(parseErr)
+
+        elif fileerror is None:
+            # Cleaning the headers read from the file
+            columList = df.columns.values.tolist()
+            columList = cleanCSVHeaders(columList)
+            columList = str(columList).strip().split(",")
+            columList = [column.strip() for column in columList]
+            df.columns = columList
+
+    if fileerror is not None:
+        return None, fileerror
+
+    # Removing index from dataframe
+    df.reset_index(drop=True, inplace=True)
+
+    return df, None
+
+
+def readValidatingCSV(csvFileName, fileSeparator, **readArgs):
+    # Reads the CSV file with a ValidatingCSVReader. Returns (df, fileError, parseError).
+    # parseError is the exception raised by pandas when the file does not match the columns it was read with
+
+    df = None
+    fileerror = None
+    parseErr = None
+
+    try:
+        reader = ValidatingCSVReader(csvFileName)
+    except Exception as otherErr:
+        return None, "File has Errors - {}".format(otherErr), None
+
+    try:
+        df = pd.read_csv(
+            reader,
+            sep=str(fileSeparator),
+            na_values="n/a",
+            keep_default_na=True,
+            skipinitialspace=True,
+            **readArgs
+        )
+        if df.empty:
+            ## If file has header but no rows
+            fileerror = "File seems to be Empty"
+        else:
+            if reader.hasOraErrors:
+                fileerror = "File has ORA-Errors"
+            if reader.lastLineHead.startswith("Elapsed:"):
+                fileerror = "File has Elapsed time message from Oracle, Please remove the message and reprocess"
+    except pd.errors.EmptyDataError:
+        ## If file has no records
+        fileerror = "File seems to be Empty"
+    except UnicodeDecodeError:
+        fileerror = "File seems to be of improper format"
+    except Exception as otherErr:
+        parseErr = otherErr
+    finally:
+        reader.close()
+
+    return df, fileerror, parseErr
+
+
 def addBQDataType(columList, dataType):
 
     newColumnList = []
@@ -828,22 +1911,86 @@ def cleanCSVHeaders(headerString):
 
 def trimDataframe(df):
 
-    # Removing spaces (TRIM/Strip) for ALL columns
+    # Removing spaces (TRIM/Strip) from the column names and from the string columns.
+    # Only object columns can hold strings, so numeric columns are neither scanned nor copied
     df.columns = df.columns.str.replace(" ", "")
-    cols = list(df.columns)
-    # df[cols] = df[cols].apply(lambda x: x.str.strip())
-    # df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
 
-    for column in cols:
+    for column in df.select_dtypes(include="object").columns:
         try:
             df[column] = df[column].str.strip()
-        except:
-            None
+        except AttributeError:
+            # Object columns without any string value. I.E: all values are null
+            continue
 
     # trimmed dataframe
     return df
 
 
+def isCompactFrames(args):
+
+    return bool(getattr(args, "compactframes", False))
+
+
+def getCategoricalColumns(transformersParameters):
+    # Low cardinality columns stored as categoricals by -compactframes. I.E: PKEY, OWNER, CON_ID, METRIC_NAME
+
+    return set(
+        str(column).upper()
+        for column in transformersParameters.get("op_categorical_columns", [])
+    )
+
+
+def compactDataframe(df, categoricalColumns):
+    # Stores the string columns of a trimmed dataframe as pyarrow backed strings and the low cardinality ones as categoricals.
+    # Python string objects are replaced by Arrow buffers, so fleet wide AWR tables take a fraction of the memory.
+    # The categoricals are ordered by value, so min/max aggregations of the rules give the same results as with strings
+
+    for column in df.select_dtypes(include="object").columns:
+
+        try:
+            if str(column).upper() in categoricalColumns:
+                df[column] = df[column].astype(
+                    pd.CategoricalDtype(
+                        sorted(df[column].dropna().unique()), ordered=True
+                    )
+                )
+            else:
+                df[column] = df[column].astype("string[pyarrow]")
+        except (TypeError, ValueError, ImportError):
+            # Columns with values that are not strings are kept as they are
+            continue
+
+    return df
+
+
+def concatCompactDataframes(dfParts):
+    # pd.concat of the parts of a table. The categoricals of -compactframes get the same categories in all parts first,
+    # otherwise pandas concatenates them as Python strings
+
+    dfParts = list(dfParts)
+
+    for column in dfParts[0].columns:
+
+        if not all(
+            column in dfPart.columns
+            and isinstance(dfPart[column].dtype, pd.CategoricalDtype)
+            for dfPart in dfParts
+        ):
+            continue
+
+        categoricalType = pd.CategoricalDtype(
+            sorted(set().union(*[dfPart[column].cat.categories for dfPart in dfParts])),
+            ordered=True,
+        )
+
+        dfParts = [
+            dfPart.assign(**{column: dfPart[column].astype(categoricalType)})
+            for dfPart in dfParts
+        ]
+
+    return pd.concat(dfParts, axis=0)
+
+
 def rewriteTrimmedCSVData(
     dataFrames, transformersParameters, transformersTablesSchema, fileList
 ):
@@ -861,7 +2008,7 @@ def rewriteTrimmedCSVData(
 
                 # collectionKey already contains .log
                 fileName = (
-                    str(getattr(args, "fileslocation"))
+                    str(getScratchLocation(args))
                     + "/opdbt__"
                     + reshapedTableName
                     + "__"
@@ -964,7 +2111,7 @@ def getAllReShapedDataframes(
 
                         # collectionKey already contains .log
                         fileName = (
-                            str(getattr(args, "fileslocation"))
+                            str(getScratchLocation(args))
                             + "/opdbt__"
                             + reshapedTableName
                             + "__"
@@ -1070,6 +2217,13 @@ def createCSVFromDataframe(
             df,
         )
 
+        if isSchemaTypeInference(args):
+            transformersTablesSchema[
+                str(tableName).lower()
+            ] = applyInferredBQDataTypes(
+                transformersTablesSchema[str(tableName).lower()], df
+            )
+
         # STEP: Writing dataframe to CSV in append mode
 
         df.to_csv(fileName, sep=str(args.sep), header=True, index=False, mode="a")
@@ -1140,6 +2294,11 @@ def getReShapedDataframe(df, transformersParameters):
                 )
             )
 
+    # Categoricals (-compactframes) would add the categories that are not in the rows as columns
+    for column in list(frozenIndex) + [targetColumn]:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df = df.assign(**{column: df[column].cat.remove_unused_categories()})
+
     # Pivoting daframe following the parameters given
     pivoted_df = df.pivot(
         index=frozenIndex, columns=targetColumn, values=targetStatsColumn
@@ -0,0 +1,385 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Journal of an Optimus Prime run, used by -resume.
+# With -resumable (or -resume) each run has a private directory <fileslocation>/.opruns/<runid> with journal.json (finished
+# stages and files imported to Big Query) and state/ (the dataframes as Parquet files and the schemas and file lists as JSON
+# after the last finished stage). A resumed run loads the state and skips the finished stages and the files already imported.
+# The state is deleted when the run finishes. Without -resumable the journal is only kept in memory and the run directory
+# is a temporary directory deleted at the end of the run.
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+import pandas as pd
+
+from db_assessment import frame_liveness
+
+RUNS_DIRECTORY = ".opruns"
+JOURNAL_FILE_NAME = "journal.json"
+STATE_DIRECTORY = "state"
+STATE_FILE_NAME = "state.json"
+
+# Fields of the state saved as JSON, besides the dataframes
+STATE_FIELDS = [
+    "tablesschema",
+    "parameters",
+    "invalidfiles",
+    "filelist",
+    "rulesalreadyexecuted",
+]
+
+# Pipeline stages in execution order
+STAGE_DATASET = "dataset"
+STAGE_PARSE = "parse"
+STAGE_RESHAPE = "reshape"
+STAGE_RULES = "rules"
+STAGE_ERRORS = "errors"
+STAGE_LOAD = "load"
+STAGE_VIEWS = "views"
+
+PIPELINE_STAGES = [
+    STAGE_DATASET,
+    STAGE_PARSE,
+    STAGE_RESHAPE,
+    STAGE_RULES,
+    STAGE_ERRORS,
+    STAGE_LOAD,
+    STAGE_VIEWS,
+]
+
+
+class RunMismatchError(ValueError):
+    # The run given to -resume was started for another dataset, project or collection
+    pass
+
+
+def isResumable(args):
+
+    return bool(getattr(args, "resumable", False)) or (
+        getattr(args, "resume", None) is not None
+    )
+
+
+def newRunId():
+
+    return "{}-{}".format(
+        datetime.datetime.now().strftime("%Y%m%d%H%M%S"), uuid.uuid4().hex[:6]
+    )
+
+
+def getRunDir(filesLocation, runId):
+
+    return os.path.join(str(filesLocation), RUNS_DIRECTORY, str(runId))
+
+
+def readJournal(filesLocation, runId):
+    # Returns the journal of a run or None if it does not exist
+
+    journalFileName = os.path.join(getRunDir(filesLocation, runId), JOURNAL_FILE_NAME)
+
+    if not os.path.exists(journalFileName):
+        return None
+
+    with open(journalFileName, "r") as journalFile:
+        return json.load(journalFile)
+
+
+def checkStateValue(stateName, stateValue):
+    # Only JSON values are saved, so a resumed run gets the same types as the original run (I.E: a tuple would come back
+    # as a list and a datetime as a string). Raises TypeError for anything else
+
+    if stateValue is None or isinstance(stateValue, (str, bool, int, float)):
+        return
+
+    if isinstance(stateValue, list):
+        for item in stateValue:
+            checkStateValue(stateName, item)
+        return
+
+    if isinstance(stateValue, dict):
+        for key, item in stateValue.items():
+            if not isinstance(key, str):
+                raise TypeError(
+                    'The state "{}" of the run has the key {!r} of type {}, which cannot be saved as JSON'.format(
+                        stateName, key, type(key).__name__
+                    )
+                )
+            checkStateValue(stateName, item)
+        return
+
+    raise TypeError(
+        'The state "{}" of the run has the value {!r} of type {}, which cannot be saved as JSON'.format(
+            stateName, stateValue, type(stateValue).__name__
+        )
+    )
+
+
+def getStateJSON(state):
+    # The state fields written to STATE_FILE_NAME. Unknown fields and values that are not JSON raise an error instead of being
+    # saved as something else
+
+    unknownFields = sorted(set(state) - set(STATE_FIELDS) - {"dataframes"})
+
+    if len(unknownFields) > 0:
+        raise ValueError(
+            "Unknown state fields of the run: {}".format(", ".join(unknownFields))
+        )
+
+    stateJSON = {}
+
+    for stateName in STATE_FIELDS:
+        checkStateValue(stateName, state[stateName])
+        stateJSON[stateName] = state[stateName]
+
+    return stateJSON
+
+
+def getResumedStages(journal):
+    # Finished stages that can be skipped. The stages after the last saved state are run again
+
+    stateStage = journal.get("statestage")
+    lastStage = PIPELINE_STAGES.index(stateStage) if stateStage is not None else 0
+
+    return [
+        stage
+        for stage in journal["stages"]
+        if stage == STAGE_DATASET
+        or PIPELINE_STAGES.index(stage) <= lastStage
+        or (
+            PIPELINE_STAGES.index(stage) > PIPELINE_STAGES.index(STAGE_RULES)
+            and stateStage == STAGE_RULES
+        )
+    ]
+
+
+class RunJournal:
+    # Finished stages and imported files of a run. When persistent every change is written to disk right away
+
+    def __init__(self, filesLocation, runId=None, runDescription=None, persistent=True):
+
+        self.persistent = persistent
+        self.resumed = runId is not None
+        self.runId = str(runId) if runId is not None else newRunId()
+        self.lock = threading.Lock()
+
+        if not persistent:
+            # Private scratch directory of the run
+            self.runDir = tempfile.mkdtemp(prefix="oprun_")
+        else:
+            self.runDir = getRunDir(filesLocation, self.runId)
+
+        self.journalFileName = os.path.join(self.runDir, JOURNAL_FILE_NAME)
+        self.stateDir = os.path.join(self.runDir, STATE_DIRECTORY)
+
+        if self.resumed:
+
+            journal = readJournal(filesLocation, self.runId)
+
+            if journal is None:
+                raise ValueError(
+                    'The run id "{}" was not found in {}'.format(
+                        self.runId, os.path.dirname(self.runDir)
+                    )
+                )
+
+            if journal.get("finished") is not None:
+                raise ValueError(
+                    'The run id "{}" already finished on {}'.format(
+                        self.runId, journal["finished"]
+                    )
+                )
+
+            for optionName, optionValue in (runDescription or {}).items():
+                if str(journal["description"].get(optionName)) != str(optionValue):
+                    raise RunMismatchError(
+                        'The run id "{}" was started with {} "{}", not "{}"'.format(
+                            self.runId,
+                            optionName,
+                            journal["description"].get(optionName),
+                            optionValue,
+                        )
+                    )
+
+            journal["stages"] = getResumedStages(journal)
+            self.journal = journal
+
+        else:
+
+            if persistent:
+                # Only the user running Optimus Prime can read the state of its runs
+                os.makedirs(self.runDir, mode=0o700, exist_ok=True)
+
+            self.journal = {
+                "runid": self.runId,
+                "started": datetime.datetime.now().isoformat(),
+                "description": runDescription or {},
+                "stages": [],
+                "statestage": None,
+                "loadedfiles": {},
+            }
+            self.writeJournal()
+
+    def writeJournal(self):
+
+        if not self.persistent:
+            return
+
+        tmpJournalFileName = self.journalFileName + ".tmp"
+
+        with open(tmpJournalFileName, "w") as journalFile:
+            json.dump(self.journal, journalFile, indent=1)
+
+        # The journal is replaced only when it is complete
+        os.replace(tmpJournalFileName, self.journalFileName)
+
+    def isStageDone(self, stage):
+
+        return stage in self.journal["stages"]
+
+    def markStageDone(self, stage, state=None):
+        # Records a finished stage. The state, if any, is what a resumed run needs to continue after this stage
+
+        stateSaved = self.persistent and state is not None and self.writeState(state)
+
+        with self.lock:
+            if stage not in self.journal["stages"]:
+                self.journal["stages"].append(stage)
+            if stateSaved:
+                self.journal["statestage"] = stage
+            self.writeJournal()
+
+    def writeState(self, state):
+        # Writes the dataframes as Parquet files and the rest of the state as JSON. Returns False if the dataframes could not be
+        # written. A state that cannot be saved as JSON is an error of Optimus Prime, so it stops the run
+
+        stateJSON = getStateJSON(state)
+
+        tmpStateDir = self.stateDir + ".tmp"
+        shutil.rmtree(tmpStateDir, ignore_errors=True)
+        os.makedirs(tmpStateDir, mode=0o700)
+
+        # {dataframe name: Parquet file name or spilled Feather file}
+        dataFrameFiles = {}
+
+        try:
+            for frameNumber, (dataFrameName, df) in enumerate(
+                state["dataframes"].items()
+            ):
+
+                if isinstance(df, frame_liveness.SpilledDataFrame):
+                    dataFrameFiles[dataFrameName] = {
+                        "spilled": df.fileName,
+                        "rows": df.rows,
+                    }
+                    continue
+
+                frameFileName = "{}.parquet".format(frameNumber)
+                df.to_parquet(os.path.join(tmpStateDir, frameFileName))
+                dataFrameFiles[dataFrameName] = {"file": frameFileName}
+
+            with open(os.path.join(tmpStateDir, STATE_FILE_NAME), "w") as stateFile:
+                json.dump(dict(stateJSON, dataframes=dataFrameFiles), stateFile)
+
+        except (ImportError, NotImplementedError, TypeError, ValueError) as stateErr:
+            print(
+                "\nWARNING: The state of the run could not be saved. A resumed run starts again after the last saved stage. Error: {}\n".format(
+                    stateErr
+                )
+            )
+            shutil.rmtree(tmpStateDir, ignore_errors=True)
+            return False
+
+        shutil.rmtree(self.stateDir, ignore_errors=True)
+        os.replace(tmpStateDir, self.stateDir)
+
+        return True
+
+    def loadState(self):
+        # State saved by the last finished stage
+
+        stateFileName = os.path.join(self.stateDir, STATE_FILE_NAME)
+
+        if not os.path.exists(stateFileName):
+            return None
+
+        with open(stateFileName, "r") as stateFile:
+            stateJSON = json.load(stateFile)
+
+        state = {stateName: stateJSON[stateName] for stateName in STATE_FIELDS}
+        dataFrames = {}
+
+        for dataFrameName, dataFrameFile in stateJSON["dataframes"].items():
+            if "spilled" in dataFrameFile:
+                dataFrames[dataFrameName] = frame_liveness.SpilledDataFrame(
+                    dataFrameFile["spilled"], dataFrameFile["rows"]
+                )
+            else:
+                dataFrames[dataFrameName] = pd.read_parquet(
+                    os.path.join(self.stateDir, dataFrameFile["file"])
+                )
+
+        state["dataframes"] = dataFrames
+
+        return state
+
+    def finishRun(self, succeeded):
+        # Deletes the files of the run that are not needed anymore. A persistent run keeps only its journal once it succeeds
+        # and everything while it can still be resumed
+
+        if not self.persistent:
+            shutil.rmtree(self.runDir, ignore_errors=True)
+            return
+
+        if not succeeded:
+            return
+
+        for entry in os.scandir(self.runDir):
+
+            if entry.name == JOURNAL_FILE_NAME:
+                continue
+
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+
+        with self.lock:
+            self.journal["finished"] = datetime.datetime.now().isoformat()
+            self.writeJournal()
+
+    def getLoadedFileKey(self, fileName):
+
+        return os.path.basename(str(fileName))
+
+    def isFileLoaded(self, fileName):
+
+        return self.getLoadedFileKey(fileName) in self.journal["loadedfiles"]
+
+    def getLoadedRows(self, fileName):
+
+        return self.journal["loadedfiles"].get(self.getLoadedFileKey(fileName), 0)
+
+    def recordLoadedFile(self, fileName, rowsimported):
+
+        with self.lock:
+            self.journal["loadedfiles"][self.getLoadedFileKey(fileName)] = int(
+                rowsimported or 0
+            )
+            self.writeJournal()
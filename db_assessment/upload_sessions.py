@@ -0,0 +1,368 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Resumable uploads of the collections sent by -remote.
+# The client sends the collection as a single tar.gz in parts (PUT at their byte offsets, in any order and in parallel).
+# The parts are written to a spool file at their offsets and, while the upload goes on, the bytes received without gaps are
+# decompressed and the files are extracted into the job directory. Parts already received can be asked for to resume an upload.
+# Uploads are limited in size (OP_API_MAX_UPLOAD_MB) and number (OP_API_MAX_UPLOADS), and an upload that receives nothing for
+# OP_API_UPLOAD_IDLE_SECONDS is aborted.
+
+import os
+import shutil
+import tarfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from werkzeug.utils import secure_filename
+
+# Size of the parts the clients are asked to send
+UPLOAD_PART_SIZE = 8 * 1024 * 1024
+# Largest part accepted
+MAX_UPLOAD_PART_SIZE = 64 * 1024 * 1024
+SPOOL_FILE_NAME = ".upload.tar.gz"
+# Largest upload, uploads in progress and seconds without requests before an upload is aborted. OP_API_* override them
+DEFAULT_MAX_UPLOAD_MB = 4096
+DEFAULT_MAX_UPLOADS = 16
+DEFAULT_UPLOAD_IDLE_SECONDS = 3600
+# Most seconds between two checks for idle uploads
+IDLE_CHECK_SECONDS = 60
+# Outcomes of the last completed uploads, kept to answer a repeated complete request (I.E: a retry after a lost response)
+MAX_COMPLETED_UPLOADS = 100
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadLimitError(UploadError):
+    # The upload is larger than OP_API_MAX_UPLOAD_MB or there are already OP_API_MAX_UPLOADS uploads in progress
+    pass
+
+
+def getEnvInt(name, default):
+
+    try:
+        return max(int(os.getenv(name, default)), 1)
+    except ValueError:
+        return default
+
+
+class UploadStream:
+    # Read only file object over the bytes of an upload received without gaps. read() waits for the next parts
+
+    def __init__(self, uploadSession):
+
+        self.uploadSession = uploadSession
+        self.position = 0
+
+    def read(self, size=-1):
+
+        data = self.uploadSession.readReceived(self.position, size)
+        self.position += len(data)
+
+        return data
+
+
+class UploadSession:
+    def __init__(self, jobDir, size, form):
+
+        self.uploadId = uuid.uuid4().hex
+        self.jobDir = jobDir
+        self.size = int(size)
+        self.form = dict(form)
+        self.spoolFileName = os.path.join(jobDir, SPOOL_FILE_NAME)
+
+        # {offset: length} of the parts received
+        self.parts = {}
+        # Bytes received from the beginning without gaps
+        self.received = 0
+        self.aborted = False
+        self.completing = False
+        self.lastActivity = time.monotonic()
+        self.extracted = False
+        self.extractedFiles = []
+        self.error = None
+        self.condition = threading.Condition()
+
+        with open(self.spoolFileName, "wb") as spoolFile:
+            spoolFile.truncate(self.size)
+
+        self.extractor = threading.Thread(
+            target=self.extract, name="opupload-" + self.uploadId, daemon=True
+        )
+        self.extractor.start()
+
+    def addPart(self, offset, data):
+
+        if offset < 0 or offset + len(data) > self.size:
+            raise UploadError(
+                "The part at {} with {} bytes is out of the upload size {}".format(
+                    offset, len(data), self.size
+                )
+            )
+
+        if len(data) == 0 or len(data) > MAX_UPLOAD_PART_SIZE:
+            raise UploadError("Invalid part size {}".format(len(data)))
+
+        with self.condition:
+            if self.aborted:
+                raise UploadError("The upload was aborted")
+            self.lastActivity = time.monotonic()
+
+        try:
+            with open(self.spoolFileName, "r+b") as spoolFile:
+                spoolFile.seek(offset)
+                spoolFile.write(data)
+        except FileNotFoundError:
+            # Aborted while the part was received
+            raise UploadError("The upload was aborted")
+
+        with self.condition:
+            self.parts[offset] = len(data)
+            while self.received in self.parts and self.received < self.size:
+                self.received += self.parts[self.received]
+            self.condition.notify_all()
+
+    def readReceived(self, position, size):
+        # Bytes from position on, up to size. Waits until they are received. Returns b"" at the end of the upload
+
+        with self.condition:
+            while (
+                position >= self.received
+                and position < self.size
+                and not self.aborted
+            ):
+                self.condition.wait()
+
+            if self.aborted or position >= self.size:
+                return b""
+
+            available = self.received - position
+
+        if size is None or size < 0 or size > available:
+            size = available
+
+        with open(self.spoolFileName, "rb") as spoolFile:
+            spoolFile.seek(position)
+            return spoolFile.read(size)
+
+    def extract(self):
+        # Decompresses the upload while it is received. Only regular files are extracted and directories are flattened
+
+        try:
+            with tarfile.open(fileobj=UploadStream(self), mode="r|gz") as archive:
+                for member in archive:
+
+                    if not member.isfile():
+                        continue
+
+                    fileName = secure_filename(os.path.basename(member.name))
+
+                    if fileName == "" or fileName == SPOOL_FILE_NAME:
+                        continue
+
+                    with open(
+                        os.path.join(self.jobDir, fileName), "wb"
+                    ) as extractedFile:
+                        shutil.copyfileobj(archive.extractfile(member), extractedFile)
+
+                    self.extractedFiles.append(fileName)
+
+        except Exception as extractErr:
+            self.error = "The upload could not be extracted: {}".format(extractErr)
+
+        finally:
+            with self.condition:
+                self.extracted = True
+                self.condition.notify_all()
+
+    def getStatus(self):
+
+        with self.condition:
+            self.lastActivity = time.monotonic()
+            return {
+                "uploadId": self.uploadId,
+                "size": self.size,
+                "received": self.received,
+                "receivedParts": sorted(
+                    [offset, length] for offset, length in self.parts.items()
+                ),
+                "extractedFiles": len(self.extractedFiles),
+            }
+
+    def complete(self):
+        # Waits for the extraction. Raises UploadError if parts are missing or the upload is not a valid tar.gz
+
+        with self.condition:
+            if self.received < self.size:
+                raise UploadError(
+                    "The upload is incomplete. {} of {} bytes were received without gaps".format(
+                        self.received, self.size
+                    )
+                )
+
+        self.extractor.join()
+
+        try:
+            os.remove(self.spoolFileName)
+        except OSError:
+            None
+
+        if self.error is not None:
+            raise UploadError(self.error)
+
+        # With a manifest every file can already be in the blob store, so the archive can be empty
+        if len(self.extractedFiles) == 0 and "manifest" not in self.form:
+            raise UploadError("The upload has no files")
+
+    def abort(self):
+
+        with self.condition:
+            self.aborted = True
+            self.condition.notify_all()
+
+        self.extractor.join()
+        shutil.rmtree(self.jobDir, ignore_errors=True)
+
+
+class UploadSessions:
+    # Uploads in progress in this API process. A background thread aborts the idle ones
+
+    def __init__(self, maxUploadBytes=None, maxSessions=None, idleSeconds=None):
+
+        self.maxUploadBytes = maxUploadBytes or (
+            getEnvInt("OP_API_MAX_UPLOAD_MB", DEFAULT_MAX_UPLOAD_MB) * 1024 * 1024
+        )
+        self.maxSessions = maxSessions or getEnvInt(
+            "OP_API_MAX_UPLOADS", DEFAULT_MAX_UPLOADS
+        )
+        self.idleSeconds = idleSeconds or getEnvInt(
+            "OP_API_UPLOAD_IDLE_SECONDS", DEFAULT_UPLOAD_IDLE_SECONDS
+        )
+        self.sessions = {}
+        # {uploadId: outcome} of the completed uploads, oldest first
+        self.completedUploads = OrderedDict()
+        self.lock = threading.Lock()
+        # Notified when a completion finishes or is cancelled
+        self.completion = threading.Condition(self.lock)
+
+        self.idleChecker = threading.Thread(
+            target=self.checkIdleSessions, name="opupload-idle", daemon=True
+        )
+        self.idleChecker.start()
+
+    def newSession(self, jobDir, size, form):
+        # Raises UploadLimitError if the upload is too large or there are too many uploads in progress
+
+        if int(size) > self.maxUploadBytes:
+            raise UploadLimitError(
+                "The upload of {} bytes is larger than the {} bytes allowed".format(
+                    size, self.maxUploadBytes
+                )
+            )
+
+        self.abortIdleSessions()
+
+        with self.lock:
+            if len(self.sessions) >= self.maxSessions:
+                raise UploadLimitError(
+                    "There are already {} uploads in progress".format(
+                        len(self.sessions)
+                    )
+                )
+            uploadSession = UploadSession(jobDir, size, form)
+            self.sessions[uploadSession.uploadId] = uploadSession
+
+        return uploadSession
+
+    def getSession(self, uploadId):
+
+        with self.lock:
+            return self.sessions.get(uploadId)
+
+    def startCompletion(self, uploadId):
+        # Returns (upload to be completed by the caller, None), or (None, outcome) if the upload was already completed.
+        # A request for an upload that another request is completing waits for its outcome. (None, None) if it does not exist
+
+        with self.completion:
+            while True:
+
+                if uploadId in self.completedUploads:
+                    return None, self.completedUploads[uploadId]
+
+                uploadSession = self.sessions.get(uploadId)
+
+                if uploadSession is None:
+                    return None, None
+
+                if not uploadSession.completing:
+                    uploadSession.completing = True
+                    return uploadSession, None
+
+                self.completion.wait()
+
+    def cancelCompletion(self, uploadSession):
+        # The upload could not be completed yet (I.E: missing parts). The client can send them and complete it again
+
+        with self.completion:
+            uploadSession.completing = False
+            uploadSession.lastActivity = time.monotonic()
+            self.completion.notify_all()
+
+    def finishCompletion(self, uploadSession, outcome):
+        # Removes a completed upload. Its outcome is the answer to the repeated complete requests
+
+        with self.completion:
+            self.sessions.pop(uploadSession.uploadId, None)
+            self.completedUploads[uploadSession.uploadId] = outcome
+            while len(self.completedUploads) > MAX_COMPLETED_UPLOADS:
+                self.completedUploads.popitem(last=False)
+            self.completion.notify_all()
+
+    def removeSession(self, uploadId):
+
+        with self.completion:
+            uploadSession = self.sessions.pop(uploadId, None)
+            self.completion.notify_all()
+
+        return uploadSession
+
+    def abortIdleSessions(self):
+        # Aborts the uploads that received no request for idleSeconds
+
+        now = time.monotonic()
+
+        with self.lock:
+            idleSessions = [
+                uploadSession
+                for uploadSession in self.sessions.values()
+                if not uploadSession.completing
+                and now - uploadSession.lastActivity > self.idleSeconds
+            ]
+            for uploadSession in idleSessions:
+                del self.sessions[uploadSession.uploadId]
+
+        for uploadSession in idleSessions:
+            uploadSession.abort()
+
+        return idleSessions
+
+    def checkIdleSessions(self):
+
+        while True:
+            time.sleep(min(self.idleSeconds, IDLE_CHECK_SECONDS))
+            self.abortIdleSessions()
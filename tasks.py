@@ -24,8 +24,7 @@ def push(ctx, tag="latest"):
 
 @task
 def test(ctx, base_url=None, local=False):
-    with ctx.cd("./sample/datacollection"):
-        ctx.run(f"tar -xvf {ctx.test_file}")
+    # The collected files are read from the tar.gz files in the directory
     if not base_url:
         base_url = get_beta_url(ctx)
     print(base_url)
@@ -0,0 +1,140 @@
+# Copyright 2021 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# The rules of the execution group 1 give the same dataframes with and without -compactframes.
+# The collection has two databases (sample19c and a copy of it with another collection key and DBID), so the categorical
+# keys have values that are not in every group
+
+import os
+import sys
+import tarfile
+
+import pandas as pd
+import pytest
+
+from db_assessment import assessment_run, optimusprime, rules_engine
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_ARCHIVE = os.path.join(
+    REPOSITORY_DIR, "sample", "datacollection", "sample19c.tar.gz"
+)
+SAMPLE_COLLECTION_ID = "020222210706"
+SAMPLE_DBID = "2218961670"
+
+
+@pytest.fixture(scope="module")
+def collectionDir(tmp_path_factory):
+    # sample19c and a second database made from it
+
+    collectionDir = tmp_path_factory.mktemp("collection")
+
+    with tarfile.open(SAMPLE_ARCHIVE, "r:gz") as sampleArchive:
+        for member in sampleArchive.getmembers():
+
+            if not member.isfile():
+                continue
+
+            fileName = os.path.basename(member.name)
+            content = sampleArchive.extractfile(member).read()
+
+            (collectionDir / fileName).write_bytes(content)
+            (
+                collectionDir / fileName.replace(SAMPLE_COLLECTION_ID, "030222210706")
+            ).write_bytes(
+                content.replace(
+                    SAMPLE_COLLECTION_ID.encode(), b"030222210706"
+                ).replace(SAMPLE_DBID.encode(), b"2218961671")
+            )
+
+    return collectionDir
+
+
+def getRulesDataFrames(monkeypatch, collectionDir, options):
+
+    monkeypatch.chdir(REPOSITORY_DIR)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "optimusprime",
+            "-dataset",
+            "compactframestest",
+            "-collectionid",
+            "",
+            "-fileslocation",
+            str(collectionDir),
+            "-fromdataframe",
+            "-consolidatedataframes",
+        ]
+        + options,
+    )
+
+    assessmentRun = assessment_run.AssessmentRun(optimusprime.argumentsParser())
+    assessmentRun.rulesOnly = True
+    assessmentRun.run()
+
+    return assessmentRun.rulesDataFrames
+
+
+def getComparableDataFrame(df):
+    # Categoricals, Arrow strings and Python strings are compared by their values
+
+    return df.astype(object).where(df.notna(), None).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("partitionWorkers", ["1", "2"])
+def test_compact_frames_rules_results(monkeypatch, collectionDir, partitionWorkers):
+
+    options = ["-partitionworkers", partitionWorkers]
+
+    dataFrames = getRulesDataFrames(monkeypatch, collectionDir, options)
+    compactDataFrames = getRulesDataFrames(
+        monkeypatch, collectionDir, options + ["-compactframes"]
+    )
+
+    assert sorted(compactDataFrames) == sorted(dataFrames)
+    assert dataFrames["DBSUMMARY"]["PKEY"].nunique() == 2
+
+    for dataFrameName, df in dataFrames.items():
+        pd.testing.assert_frame_equal(
+            getComparableDataFrame(compactDataFrames[dataFrameName]),
+            getComparableDataFrame(df),
+            obj=dataFrameName,
+        )
+
+    # The keys are kept as categoricals through the rules
+    assert isinstance(
+        compactDataFrames["DBSUMMARY"]["PKEY"].dtype, pd.CategoricalDtype
+    )
+
+
+def test_concat_compact_dataframes_keeps_categoricals():
+
+    categoricalColumns = rules_engine.getCategoricalColumns(
+        {"op_categorical_columns": ["PKEY"]}
+    )
+    dfParts = [
+        rules_engine.compactDataframe(
+            pd.DataFrame({"PKEY": [pkey, pkey], "VALUE": ["1", "2"]}),
+            categoricalColumns,
+        )
+        for pkey in ("db2", "db1")
+    ]
+
+    df = rules_engine.concatCompactDataframes(dfParts)
+
+    assert isinstance(df["PKEY"].dtype, pd.CategoricalDtype)
+    assert list(df["PKEY"].cat.categories) == ["db1", "db2"]
+    assert list(df["PKEY"]) == ["db2", "db2", "db1", "db1"]
+    assert list(df.groupby("PKEY", observed=True)["VALUE"].max()) == ["2", "2"]